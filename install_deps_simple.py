@@ -28,6 +28,8 @@ def main():
         "flask",
         "flask-cors",
         "pandas",
+        "pyarrow",
+        "uvicorn",
         "requests"
     ]
 
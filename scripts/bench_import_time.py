@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+入口模块导入耗时测试
+每个入口在全新的解释器中导入若干次，取中位数；同时用 -X importtime 统计累计耗时最高的依赖模块，
+用于确认 API 和命令行工具启动时没有加载用不到的大型依赖（pandas、streamlit 等）。
+
+用法: python scripts/bench_import_time.py [重复次数，默认5]
+"""
+
+import os
+import sys
+import time
+import statistics
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+SRC = os.path.join(ROOT, 'src')
+
+# (名称, 工作目录, 导入语句)
+ENTRY_POINTS = [
+    ("python (基准)", SRC, "pass"),
+    ("sqlite3 (基准)", SRC, "import sqlite3"),
+    ("pandas (参考)", SRC, "import pandas"),
+    ("api/search_api", SRC, "import sys; sys.path.insert(0, 'api'); import search_api"),
+    ("database_query", SRC, "import database_query"),
+    ("database_validation", SRC, "import database_validation"),
+    ("category_analysis", SRC, "import category_analysis"),
+    ("start_search_system", ROOT, "import start_search_system"),
+]
+
+# 每个入口列出的最耗时依赖数
+TOP_IMPORTS = 3
+
+
+def time_import(cwd: str, statement: str) -> float:
+    """在新解释器中执行导入语句，返回耗时（毫秒）"""
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", statement], cwd=cwd, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return (time.perf_counter() - started) * 1000
+
+
+def top_imports(cwd: str, statement: str, limit: int = TOP_IMPORTS):
+    """-X importtime 输出中入口模块的直接依赖，按累计耗时排序: [(模块, 毫秒), ...]"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], cwd=cwd,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    modules, entry_modules = [], []
+    for line in result.stderr.splitlines():
+        # 格式: "import time: self [us] | cumulative | imported package"，子模块按层级缩进两个空格
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 1:
+            modules.append((name.strip(), int(cumulative) / 1000))
+        elif depth == 0:
+            # 输出按导入完成的顺序排列，依赖出现在导入它的模块之前；最后一个顶层模块就是入口
+            entry_modules, modules = modules, []
+    modules = modules or entry_modules
+    modules.sort(key=lambda item: item[1], reverse=True)
+    return modules[:limit]
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f"入口模块导入耗时（全新解释器，{repeat} 次取中位数）")
+    print("=" * 60)
+
+    for name, cwd, statement in ENTRY_POINTS:
+        try:
+            timings = [time_import(cwd, statement) for _ in range(repeat)]
+        except subprocess.CalledProcessError:
+            print(f"{name:<24} 导入失败（缺少依赖？）")
+            continue
+        heaviest = ", ".join(f"{module} {ms:.0f}ms" for module, ms in top_imports(cwd, statement))
+        print(f"{name:<24} {statistics.median(timings):8.1f} ms   {heaviest}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,100 +3,172 @@
 """
 产品分类数据导入脚本
 从CSNEW.csv文件导入数据到product_categories表
+
+CSV先整列校验一遍（见 category_keys.read_category_csv），再与表中现有数据按分类码比较，
+只插入新增、更新名称变化、删除已移除的分类码，全部在一个事务中用 executemany 完成：
+导入期间其他连接看到的始终是完整的旧表或新表。未变化的记录保持不动，
+created_at 保留，updated_at 只在名称变化时更新。
+
+同一事务中还会：
+- 把旧数据库中的文本分类码（如 '008'，cat_code TEXT(3) 列）统一为整数，与 products.cat_code 一致
+- 按新的分类码集合重新计算 products.cat_code（新增的分类码被关联，删除的置为 NULL），只更新变化的记录
 """
 
 import sqlite3
-import csv
 import os
+import sys
 from datetime import datetime
 
-def import_categories():
-    # 数据库文件路径
-    db_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'inventory.db')
-    csv_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'raw', 'CSNEW.csv')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from category_keys import product_cat_codes, read_category_csv  # noqa: E402
+
+DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'inventory.db')
+CSV_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'raw', 'CSNEW.csv')
+
+CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS product_categories (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    cat_code INTEGER NOT NULL UNIQUE,
+    ncategory TEXT NOT NULL,
+    nsubcategory TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+
+def diff_categories(existing, incoming):
+    """比较现有分类与CSV中的分类
+
+    existing 和 incoming 都为 {分类码: (ncategory, nsubcategory)}；
+    返回 (新增, 更新, 删除) 三个列表，可直接用于 executemany。
+    """
+    inserts = [(code, category, subcategory)
+               for code, (category, subcategory) in sorted(incoming.items()) if code not in existing]
+    updates = [(category, subcategory, code)
+               for code, (category, subcategory) in sorted(incoming.items())
+               if code in existing and existing[code] != (category, subcategory)]
+    deletes = [(code,) for code in sorted(existing) if code not in incoming]
+    return inserts, updates, deletes
+
+
+def normalize_category_codes(cursor):
+    """把 product_categories.cat_code 统一为整数（在写事务内调用），返回转换的记录数
+
+    旧数据库中该列为 TEXT(3)，保存的是 '008' 这样的文本，整数写入后仍会按文本保存，
+    因此按 CREATE_TABLE_SQL 重建表并复制数据（保留 id、created_at、updated_at）。
+    同一分类码有多条记录时保留 id 最小的一条；不是数字的分类码不复制（CSV中也不可能有效）。
+    """
+    declared = {row[1]: row[2].upper() for row in cursor.execute("PRAGMA table_info(product_categories)")}
+    legacy = cursor.execute(
+        "SELECT COUNT(*) FROM product_categories WHERE typeof(cat_code) != 'integer'"
+    ).fetchone()[0]
+    if declared.get('cat_code') == 'INTEGER' and not legacy:
+        return 0
+
+    rows, seen = [], set()
+    for row in cursor.execute(
+        "SELECT id, cat_code, ncategory, nsubcategory, created_at, updated_at FROM product_categories ORDER BY id"
+    ).fetchall():
+        text = str(row[1]).strip()
+        if not text.isdigit() or int(text) in seen:
+            continue
+        seen.add(int(text))
+        rows.append((row[0], int(text)) + tuple(row[2:]))
+
+    cursor.execute("DROP TABLE product_categories")
+    cursor.execute(CREATE_TABLE_SQL)
+    cursor.executemany(
+        "INSERT INTO product_categories (id, cat_code, ncategory, nsubcategory, created_at, updated_at) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        rows
+    )
+    create_indexes(cursor)
+    return legacy
+
+
+def create_indexes(cursor):
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ncategory ON product_categories(ncategory);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_nsubcategory ON product_categories(nsubcategory);")
+
+
+def relink_products(cursor):
+    """按当前分类表重新计算 products.cat_code，返回更新的记录数；没有 cat_code 列的旧数据库不处理"""
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(products)")}
+    if 'cat_code' not in columns:
+        return 0
+    codes = {row[0] for row in cursor.execute("SELECT cat_code FROM product_categories")}
+    products = cursor.execute("SELECT id, CatCode, SKU, cat_code FROM products").fetchall()
+    new_codes = product_cat_codes([row[1] for row in products], [row[2] for row in products], codes)
+    changed = [(code, row[0]) for row, code in zip(products, new_codes) if code != row[3]]
+    cursor.executemany("UPDATE products SET cat_code = ? WHERE id = ?", changed)
+    return len(changed)
+
+
+def import_categories(db_path=DB_PATH, csv_path=CSV_PATH):
+    print(f"连接到数据库: {db_path}")
+    print(f"CSV文件路径: {csv_path}")
+
+    # 检查CSV文件是否存在
+    if not os.path.exists(csv_path):
+        print(f"错误: CSV文件不存在 {csv_path}")
+        return False
 
     try:
-        # 连接到数据库
-        conn = sqlite3.connect(db_path)
+        # 先校验CSV，有问题的行不导入
+        categories, invalid = read_category_csv(csv_path)
+        for row in invalid.itertuples(index=False):
+            print(f"跳过无效行 ({row.reason}): {row.cat_code}, {row.ncategory}, {row.nsubcategory}")
+        incoming = {int(code): (category, subcategory) for code, category, subcategory in categories.values}
+
+        conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
         cursor = conn.cursor()
 
-        print(f"连接到数据库: {db_path}")
-        print(f"CSV文件路径: {csv_path}")
-
-        # 检查CSV文件是否存在
-        if not os.path.exists(csv_path):
-            print(f"错误: CSV文件不存在 {csv_path}")
-            return False
-
-        # 首先创建product_categories表（如果不存在）
-        create_table_sql = """
-        CREATE TABLE IF NOT EXISTS product_categories (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            cat_code TEXT(3) NOT NULL UNIQUE,
-            ncategory TEXT NOT NULL,
-            nsubcategory TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-        """
-        cursor.execute(create_table_sql)
-
-        # 创建索引
-        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_cat_code ON product_categories(cat_code);")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_ncategory ON product_categories(ncategory);")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_nsubcategory ON product_categories(nsubcategory);")
-
-        # 清空现有数据（可选，根据需求选择是否保留现有数据）
-        print("正在清空现有分类数据...")
-        cursor.execute("DELETE FROM product_categories;")
-
-        # 读取CSV文件并导入数据
-        with open(csv_path, 'r', encoding='utf-8') as file:
-            csv_reader = csv.DictReader(file)
-
-            imported_count = 0
-            skipped_count = 0
-
-            for row in csv_reader:
-                try:
-                    cat_code = row['CatCode'].strip()
-                    ncategory = row['nCategory'].strip()
-                    nsubcategory = row['nSubCategory'].strip()
-
-                    # 验证数据
-                    if not cat_code or not ncategory or not nsubcategory:
-                        print(f"跳过无效行: {row}")
-                        skipped_count += 1
-                        continue
-
-                    # 插入数据
-                    insert_sql = """
-                    INSERT INTO product_categories (cat_code, ncategory, nsubcategory, updated_at)
-                    VALUES (?, ?, ?, ?)
-                    """
-                    cursor.execute(insert_sql, (cat_code, ncategory, nsubcategory, datetime.now()))
-                    imported_count += 1
-
-                except Exception as e:
-                    print(f"处理行时出错 {row}: {e}")
-                    skipped_count += 1
-                    continue
-
-        # 提交事务
-        conn.commit()
+        cursor.execute(CREATE_TABLE_SQL)
+        create_indexes(cursor)
+
+        # 写事务内统一分类码、读取现有数据并应用差异，再重新关联产品
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            normalized = normalize_category_codes(cursor)
+            existing = {code: (category, subcategory) for code, category, subcategory
+                        in cursor.execute("SELECT cat_code, ncategory, nsubcategory FROM product_categories")}
+            inserts, updates, deletes = diff_categories(existing, incoming)
+
+            now = datetime.now()
+            cursor.executemany(
+                "INSERT INTO product_categories (cat_code, ncategory, nsubcategory, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [row + (now, now) for row in inserts]
+            )
+            cursor.executemany(
+                "UPDATE product_categories SET ncategory = ?, nsubcategory = ?, updated_at = ? WHERE cat_code = ?",
+                [(category, subcategory, now, code) for category, subcategory, code in updates]
+            )
+            cursor.executemany("DELETE FROM product_categories WHERE cat_code = ?", deletes)
+            relinked = relink_products(cursor)
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
 
         # 验证导入结果
         cursor.execute("SELECT COUNT(*) FROM product_categories")
         total_count = cursor.fetchone()[0]
 
         print(f"\n导入完成!")
-        print(f"成功导入: {imported_count} 条记录")
-        print(f"跳过记录: {skipped_count} 条")
+        print(f"新增: {len(inserts)} 条，更新: {len(updates)} 条，删除: {len(deletes)} 条，"
+              f"未变化: {len(incoming) - len(inserts) - len(updates)} 条")
+        print(f"跳过记录: {len(invalid)} 条")
+        if normalized:
+            print(f"文本分类码转换为整数: {normalized} 条")
+        print(f"重新关联产品分类码: {relinked} 条")
         print(f"数据库中总记录数: {total_count}")
 
         # 显示前几条记录作为验证
         print("\n前5条记录预览:")
-        cursor.execute("SELECT cat_code, ncategory, nsubcategory FROM product_categories LIMIT 5")
+        cursor.execute("SELECT cat_code, ncategory, nsubcategory FROM product_categories ORDER BY cat_code LIMIT 5")
         for row in cursor.fetchall():
             print(f"  {row[0]} - {row[1]} - {row[2]}")
 
@@ -120,4 +192,4 @@ if __name__ == "__main__":
     if success:
         print("导入成功完成!")
     else:
-        print("导入失败!")
\ No newline at end of file
+        print("导入失败!")
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+检索系统预热脚本
+服务启动后、用户访问前执行一组有代表性的请求，让首个用户请求不再承担冷启动开销：
+- API：供应商/分类/子分类列表（分面扫描）、常用关键词和筛选条件的批量搜索、搜索建议
+- 数据库：直接执行 Streamlit 界面加载时的同类查询，把数据库文件读入操作系统页缓存
+
+用法: python scripts/warm_up.py [API地址，默认 http://localhost:5000]
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import urllib.request
+import urllib.error
+from urllib.parse import urlencode
+
+# 每个预热请求的超时（秒）
+WARM_UP_TIMEOUT = 30
+
+# 有代表性的搜索（与 POST /api/products/search 的查询对象相同）
+WARM_UP_QUERIES = [
+    {},
+    {"q": "flower"},
+    {"q": "rose"},
+    {"q": "tree"},
+    {"q": "plant + pot"},
+    {"q": "spray -white"},
+    {"q": "green or gn"},
+    {"min_price": 10, "max_price": 50},
+    {"min_height": 100},
+]
+
+# 搜索建议的前缀
+WARM_UP_SUGGESTIONS = ["fl", "ro", "tr"]
+
+
+def request_json(url: str, payload=None):
+    """发送请求并解析JSON；payload 不为空时以 POST 发送"""
+    data = None
+    headers = {}
+    if payload is not None:
+        data = json.dumps(payload).encode("utf-8")
+        headers["Content-Type"] = "application/json"
+    req = urllib.request.Request(url, data=data, headers=headers)
+    with urllib.request.urlopen(req, timeout=WARM_UP_TIMEOUT) as response:
+        return json.loads(response.read().decode("utf-8"))
+
+
+def warm_up_api(base_url: str = "http://localhost:5000", verbose: bool = True) -> dict:
+    """对API执行预热请求，返回 {"requests": 请求数, "failures": 失败数, "elapsed": 秒}"""
+    base_url = base_url.rstrip("/")
+    stats = {"requests": 0, "failures": 0}
+    started = time.monotonic()
+
+    def call(label, path, payload=None):
+        stats["requests"] += 1
+        step_started = time.monotonic()
+        try:
+            result = request_json(base_url + path, payload)
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            stats["failures"] += 1
+            if verbose:
+                print(f"  ❌ {label}: {e}")
+            return None
+        if verbose:
+            print(f"  ✅ {label} ({(time.monotonic() - step_started) * 1000:.0f}ms)")
+        return result
+
+    suppliers = (call("供应商列表", "/api/suppliers") or {}).get("suppliers", [])
+    categories = (call("分类列表", "/api/categories") or {}).get("categories", [])
+    for category in categories:
+        call(f"子分类: {category}", "/api/subcategories?" + urlencode({"category": category}))
+
+    queries = list(WARM_UP_QUERIES)
+    queries += [{"category": category} for category in categories]
+    queries += [{"suppliers": [supplier]} for supplier in suppliers[:3]]
+    result = call(f"批量搜索 ({len(queries)} 个查询)", "/api/products/search/batch", {"queries": queries})
+    if result is not None:
+        failed = sum(1 for item in result.get("results", []) if "error" in item)
+        stats["failures"] += failed
+
+    for prefix in WARM_UP_SUGGESTIONS:
+        call(f"搜索建议: {prefix}", "/api/products/suggestions?" + urlencode({"q": prefix}))
+
+    stats["elapsed"] = round(time.monotonic() - started, 2)
+    return stats
+
+
+def warm_up_database(db_path: str, verbose: bool = True) -> dict:
+    """直接查询数据库文件（Streamlit 界面直接读取数据库，无法通过HTTP预热）"""
+    started = time.monotonic()
+    conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+    try:
+        queries = [
+            "SELECT DISTINCT SU FROM products WHERE SU IS NOT NULL AND SU != '' ORDER BY SU",
+            "SELECT DISTINCT nCategory, nSubCategory FROM products ORDER BY nCategory, nSubCategory",
+            "SELECT * FROM products",
+        ]
+        rows = sum(len(conn.execute(sql).fetchall()) for sql in queries)
+    finally:
+        conn.close()
+    elapsed = round(time.monotonic() - started, 2)
+    if verbose:
+        print(f"  ✅ 数据库预热: 读取 {rows} 行 ({elapsed}s)")
+    return {"rows": rows, "elapsed": elapsed}
+
+
+if __name__ == "__main__":
+    url = sys.argv[1] if len(sys.argv) > 1 else "http://localhost:5000"
+    print(f"开始预热: {url}")
+    stats = warm_up_api(url)
+    print(f"预热完成: {stats['requests']} 个请求, {stats['failures']} 个失败, 用时 {stats['elapsed']}s")
+    sys.exit(1 if stats["failures"] else 0)
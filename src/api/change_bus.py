@@ -0,0 +1,189 @@
+"""
+变更事件总线
+将产品变更（库存调整、数据库重建）推送给订阅者（/api/stream/changes 的SSE连接）。
+
+事件来源统一为变更序号 (change_seq)：后台线程定期读取 sync_state，发现序号前进后按序号读取变化的记录并发布。
+这样库存写线程的修改、其他进程（数据库重建脚本、其他API进程）的修改都能被发现；
+本进程的库存写线程提交后调用 notify() 立即唤醒轮询，不必等到下一个周期。
+
+每个订阅者有一个有界队列，消费过慢导致队列满时按订阅时选择的策略处理：
+- resync:     清空队列，只保留一个 resync 事件，客户端应通过增量同步接口从上次收到的令牌补齐
+- drop:       丢弃新事件（只关心最新状态、可以容忍遗漏的看板类客户端）
+- disconnect: 断开连接，客户端（EventSource）重连时带上 Last-Event-ID，由服务端从数据库补发
+"""
+
+import os
+import threading
+import logging
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 轮询 sync_state 的间隔（秒）
+CHANGE_POLL_INTERVAL = float(os.environ.get("IMS_CHANGE_POLL_INTERVAL", 1))
+
+# 每个订阅者队列的默认长度
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+# 每次从数据库读取的变更记录数
+POLL_BATCH_SIZE = 1000
+
+OVERFLOW_POLICIES = ("resync", "drop", "disconnect")
+
+
+class Subscription:
+    """一个订阅者的有界事件队列"""
+
+    def __init__(self, skus: Optional[Iterable[str]] = None,
+                 max_queue: int = SUBSCRIBER_QUEUE_SIZE, policy: str = "resync"):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"policy must be one of {', '.join(OVERFLOW_POLICIES)}")
+        self.skus = set(skus) if skus else None
+        self.max_queue = max_queue
+        self.policy = policy
+        self.events = deque()
+        self.dropped = 0
+        self.closed = False
+        self.listener = None  # 有新事件或订阅关闭时调用（在投递线程中），供异步消费者唤醒等待
+        self._condition = threading.Condition()
+
+    def wants(self, event: Dict) -> bool:
+        """是否订阅了该事件（按SKU过滤；非记录事件总是投递）"""
+        sku = event.get("SKU")
+        return self.skus is None or sku is None or sku in self.skus
+
+    def offer(self, event: Dict):
+        """投递事件，队列满时按策略处理"""
+        with self._condition:
+            if self.closed:
+                return
+            if len(self.events) >= self.max_queue:
+                self.dropped += 1
+                if self.policy == "drop":
+                    return
+                if self.policy == "disconnect":
+                    self.closed = True
+                    self._condition.notify_all()
+                    self._notify_listener()
+                    return
+                # resync: 之前的事件已不完整，全部丢弃，让客户端从数据库补齐
+                self.events.clear()
+                event = {"type": "resync"}
+            self.events.append(event)
+            self._condition.notify_all()
+        self._notify_listener()
+
+    def _notify_listener(self):
+        if self.listener is not None:
+            self.listener()
+
+    def get(self, timeout: float) -> Optional[Dict]:
+        """取出下一个事件；超时返回None，订阅已关闭时抛出 EOFError"""
+        with self._condition:
+            if not self.events and not self.closed:
+                self._condition.wait(timeout)
+            if self.events:
+                return self.events.popleft()
+            if self.closed:
+                raise EOFError("subscription closed")
+            return None
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+        self._notify_listener()
+
+
+class ChangeBus:
+    """进程内变更事件总线
+
+    position() 返回数据库当前的 (代数, 变更序号)；
+    fetch(generation, since, limit) 返回与 ProductSearchAPI.get_changes 相同结构的结果。
+    """
+
+    def __init__(self, position: Callable[[], Optional[Tuple[int, int]]],
+                 fetch: Callable[[int, int, int], Dict],
+                 poll_interval: float = CHANGE_POLL_INTERVAL):
+        self.position = position
+        self.fetch = fetch
+        self.poll_interval = poll_interval
+        self.last = None  # 已发布到的 (代数, 序号)
+        self._subscribers: List[Subscription] = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def subscribe(self, **kwargs) -> Subscription:
+        """新增订阅者；首次订阅时启动轮询线程"""
+        subscription = Subscription(**kwargs)
+        with self._lock:
+            self._subscribers.append(subscription)
+            if self._thread is None:
+                self.last = self.position()
+                self._thread = threading.Thread(target=self._run, name="change-bus", daemon=True)
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscription.close()
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+
+    def close_all(self):
+        """关闭全部订阅（进程退出前调用，SSE连接随之结束，客户端会自动重连到其他进程）"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.close()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def notify(self):
+        """有新提交时调用，立即唤醒轮询"""
+        self._wakeup.set()
+
+    def publish(self, event: Dict):
+        """向所有关心该事件的订阅者投递"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            if subscription.wants(event):
+                subscription.offer(event)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"读取变更失败: {e}")
+
+    def poll(self):
+        """读取上次发布之后的变更并发布"""
+        position = self.position()
+        if position is None or position == self.last:
+            return
+
+        if self.last is None or position[0] != self.last[0]:
+            # 开始了新的一代（数据库在没有变更跟踪信息的情况下重建），客户端需要全量同步
+            self.last = position
+            self.publish({"type": "reset", "id": f"{position[0]}.0"})
+            return
+
+        generation, since = self.last
+        while True:
+            result = self.fetch(generation, since, POLL_BATCH_SIZE)
+            rows = [("change", row) for row in result["changes"]] + [("delete", row) for row in result["deleted"]]
+            rows.sort(key=lambda item: item[1]["change_seq"])
+            for kind, row in rows:
+                self.publish(dict(row, type=kind, id=f"{generation}.{row['change_seq']}"))
+            since = result["last_seq"]
+            self.last = (generation, since)
+            if not result["has_more"]:
+                break
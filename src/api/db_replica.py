@@ -0,0 +1,127 @@
+"""
+数据库内存副本
+启动时通过 sqlite3 backup API 将 inventory.db 复制到共享缓存的内存数据库，
+API 的所有读请求都从内存副本读取；磁盘文件变化（data_version 或 文件身份/mtime）时
+在后台重新加载新副本并原子切换，旧副本在最后一个连接关闭后自动释放。
+"""
+
+import os
+import sqlite3
+import threading
+import itertools
+import logging
+from pathlib import Path
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 后台检查磁盘文件变化的间隔（秒）
+REPLICA_CHECK_INTERVAL = float(os.environ.get("IMS_REPLICA_CHECK_INTERVAL", 2))
+
+_replica_names = itertools.count(1)
+
+
+def file_identity(path: Path) -> Optional[Tuple[int, int, int, int]]:
+    """文件身份：(设备, inode, 修改时间, 大小)；文件被替换或修改时会变化"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+class DatabaseReplica:
+    """inventory.db 的只读内存副本"""
+
+    def __init__(self, db_path: Path, check_interval: float = REPLICA_CHECK_INTERVAL):
+        self.db_path = Path(db_path)
+        self.check_interval = check_interval
+        self.generation = 0
+        self.uri = None
+        self._anchor = None      # 保持内存数据库存活的连接
+        self._watcher = None     # 监视磁盘文件 data_version 的连接
+        self._identity = None
+        self._data_version = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.uri is not None
+
+    def load(self):
+        """从磁盘复制一份新的内存副本并切换过去"""
+        with self._lock:
+            identity = file_identity(self.db_path)
+            if identity is None:
+                raise FileNotFoundError(f"数据库文件不存在: {self.db_path}")
+
+            name = f"ims_replica_{os.getpid()}_{next(_replica_names)}"
+            uri = f"file:{name}?mode=memory&cache=shared"
+            anchor = sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+            source = sqlite3.connect(f"file:{self.db_path.resolve()}?mode=ro", uri=True)
+            try:
+                source.backup(anchor)
+            finally:
+                source.close()
+
+            # 文件被整体替换时需要重新打开监视连接
+            if self._watcher is None or self._identity is None or identity[:2] != self._identity[:2]:
+                if self._watcher is not None:
+                    self._watcher.close()
+                self._watcher = sqlite3.connect(f"file:{self.db_path.resolve()}?mode=ro", uri=True,
+                                                check_same_thread=False)
+
+            old_anchor = self._anchor
+            self.uri, self._anchor = uri, anchor
+            self._identity = identity
+            self._data_version = self._read_data_version()
+            self.generation += 1
+
+        if old_anchor is not None:
+            old_anchor.close()
+        logger.info(f"已加载数据库内存副本 (第 {self.generation} 代): {self.db_path}")
+
+    def _read_data_version(self) -> int:
+        return self._watcher.execute("PRAGMA data_version").fetchone()[0]
+
+    def changed(self) -> bool:
+        """磁盘文件自上次加载后是否有变化"""
+        identity = file_identity(self.db_path)
+        if identity is None:
+            return False  # 文件暂时不存在（如正在替换），保持当前副本
+        if identity != self._identity:
+            return True
+        # 其他连接的提交（包括WAL模式下尚未checkpoint的写入）会改变 data_version
+        return self._read_data_version() != self._data_version
+
+    def refresh_if_changed(self) -> bool:
+        """磁盘文件有变化时重新加载，返回是否重新加载"""
+        try:
+            if self.changed():
+                self.load()
+                return True
+        except Exception as e:
+            logger.error(f"刷新数据库内存副本失败: {e}")
+        return False
+
+    def connect(self, **kwargs) -> sqlite3.Connection:
+        """连接当前内存副本"""
+        return sqlite3.connect(self.uri, uri=True, **kwargs)
+
+    def start_watcher(self):
+        """启动后台线程，定期检查磁盘文件变化"""
+        if self._thread is not None:
+            return
+
+        def watch():
+            while not self._stop.wait(self.check_interval):
+                self.refresh_if_changed()
+
+        self._thread = threading.Thread(target=watch, name="db-replica-watcher", daemon=True)
+        self._thread.start()
+
+    def stop_watcher(self):
+        self._stop.set()
@@ -3,16 +3,41 @@
 提供RESTful API来支持产品检索功能
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import sqlite3
-import pandas as pd
-import re
 import os
+import io
+import csv
+import json
+import math
+import zlib
+import time
+import itertools
+import hashlib
+import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from pathlib import Path
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Iterator, TYPE_CHECKING
+import sys
 import logging
 
+# 共享模块位于上级 src 目录
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from search_query import compile_query, SEARCHABLE_FIELDS, FIELD_PREFIXES
+from db_replica import DatabaseReplica, file_identity
+from stock_writer import StockWriter, StockAdjustmentError, parse_adjustments
+from change_bus import ChangeBus, OVERFLOW_POLICIES
+from catalog_stats import catalog_summary
+from category_keys import category_filter, has_category_keys, list_categories, list_subcategories
+from dimensions import DIMENSION_COLUMNS, DIMENSION_FILTERS, dimension_filter, has_dimension_columns
+
+# pandas 只在加载快照和关键词搜索时按需导入，健康检查、库存调整、增量同步等接口不需要
+if TYPE_CHECKING:
+    import pandas as pd
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -23,216 +48,409 @@ CORS(app)  # 启用跨域支持
 # 数据库路径
 DB_PATH = Path("../data/inventory.db")
 
+# 数据库读取模式: disk（直接读磁盘文件，使用mmap）或 memory（读取内存副本）
+DB_MODE = os.environ.get("IMS_DB_MODE", "disk")
+
+# 磁盘模式下每个连接的 mmap 大小（字节）
+SQLITE_MMAP_SIZE = int(os.environ.get("IMS_MMAP_SIZE", 256 * 1024 * 1024))
+
+# 搜索结果返回的字段
+SEARCH_COLUMNS = [
+    "Code", "SKU", "Description", "ListPrice", "HL", "Qty", "Stock", "Sold", "StockStatus",
+    "nCategory", "nSubCategory", "Comment", "SU"
+]
+
+# 关键词匹配需要用到的字段
+KEYWORD_COLUMNS = list(SEARCHABLE_FIELDS)
+
+# 导出接口允许投影的字段
+EXPORT_COLUMNS = SEARCH_COLUMNS + [
+    "Barcode", "Price", "RegularPrice", "SalePrice", "Location", "Color", "Cluster",
+    "CatCode", "ModelCode", "Name", "PNDesc", "Image"
+] + list(DIMENSION_COLUMNS.values())
+
+# product_content 表中的大字段（与 database_setup.CONTENT_FIELDS 一致），详情接口按需返回
+CONTENT_COLUMNS = [
+    "PostTitle", "PostSlug", "PostContent", "PostShortDesc", "ProductCat", "ProductTag",
+    "ProductStyle", "FocusKW", "MetaTitle", "MetaDesc", "ProductPage", "Images"
+]
+
+# 增量同步接口每页的默认和最大记录数
+CHANGES_DEFAULT_LIMIT = 500
+CHANGES_MAX_LIMIT = 5000
+
+# 变更推送 (SSE) 事件中的字段、最大连接数、心跳间隔（秒）和重连时从数据库补发的最大记录数
+STREAM_COLUMNS = ["SKU", "Description", "Stock", "Sold", "StockStatus", "Price", "ListPrice"]
+STREAM_MAX_CLIENTS = int(os.environ.get("IMS_STREAM_MAX_CLIENTS", 100))
+STREAM_HEARTBEAT = 15
+STREAM_REPLAY_LIMIT = 1000
+
+# 连接池大小，以及每个连接缓存的预编译语句数
+# 筛选SQL只有有限的几种形状（每种筛选条件出现与否），列表参数以一个JSON数组绑定，
+# 因此复用连接时语句的解析和查询计划可以跨请求复用
+CONNECTION_POOL_SIZE = 8
+SQLITE_CACHED_STATEMENTS = 256
+
+# 导出时每次从游标读取的行数
+EXPORT_FETCH_SIZE = 500
+
+# 各接口的查询时限（秒），可通过环境变量单独配置，如 IMS_TIMEOUT_SEARCH=5；0 表示不限制
+QUERY_TIMEOUTS = {
+    "search": float(os.environ.get("IMS_TIMEOUT_SEARCH", 3)),
+    "export": float(os.environ.get("IMS_TIMEOUT_EXPORT", 300)),
+    "suggestions": float(os.environ.get("IMS_TIMEOUT_SUGGESTIONS", 1)),
+    "batch": float(os.environ.get("IMS_TIMEOUT_BATCH", 10)),
+    "stock": float(os.environ.get("IMS_TIMEOUT_STOCK", 5)),
+    "changes": float(os.environ.get("IMS_TIMEOUT_CHANGES", 10)),
+    "stats": float(os.environ.get("IMS_TIMEOUT_STATS", 5)),
+}
+
+# 批量搜索单次请求的最大查询数和并行线程数
+BATCH_MAX_QUERIES = 50
+BATCH_MAX_WORKERS = 4
+
+# SQLite 每执行多少条虚拟机指令检查一次时限
+PROGRESS_HANDLER_STEPS = 10000
+
+# 关键词筛选按块向量化计算，每处理多少行检查一次时限
+DEADLINE_CHECK_ROWS = 5000
+
+class ChangeTokenExpired(Exception):
+    """同步令牌属于已失效的变更序号代，客户端需要从 generation 代的开头全量同步"""
+
+    def __init__(self, message: str, generation: Optional[int] = None):
+        super().__init__(message)
+        self.generation = generation
+
+class QueryTimeout(Exception):
+    """查询超过时限"""
+
+class Deadline:
+    """请求级别的查询时限
+
+    同时用于 SQLite 进度回调（中断执行中的语句）和 Python 筛选循环中的检查。
+    """
+
+    def __init__(self, seconds: Optional[float]):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds if seconds else None
+
+    @classmethod
+    def for_endpoint(cls, endpoint: str, requested: Optional[float] = None) -> "Deadline":
+        """按接口配置创建时限；客户端可以请求更短（不能更长）的时限"""
+        seconds = QUERY_TIMEOUTS.get(endpoint) or None
+        if requested is not None and requested > 0:
+            seconds = min(seconds, requested) if seconds else requested
+        return cls(seconds)
+
+    def expired(self) -> bool:
+        """是否已超时"""
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def check(self):
+        """超时则抛出 QueryTimeout"""
+        if self.expired():
+            raise QueryTimeout(f"查询超过时限 {self.seconds}s")
+
+    def install(self, conn: sqlite3.Connection):
+        """在连接上注册进度回调，超时后SQLite会以 'interrupted' 中断当前语句"""
+        if self.expires_at is not None:
+            conn.set_progress_handler(lambda: 1 if self.expired() else 0, PROGRESS_HANDLER_STEPS)
+
+class CatalogSnapshot:
+    """无筛选条件时的候选集（全部产品）及其标准化关键词字段
+
+    多进程部署时由主进程在 fork 之前加载，各工作进程通过写时复制共享同一份内存；
+    stamp 为加载时的 (文件身份, 变更位置)，数据库变化后快照失效，搜索回退到逐次查询。
+    """
+
+    # 预热时使用的查询，覆盖所有字段前缀，使各字段组合的标准化结果都预先计算好
+    WARM_QUERY = "w " + " ".join(f"{prefix}:w" for prefix in FIELD_PREFIXES)
+
+    def __init__(self, df: "pd.DataFrame", stamp: Tuple):
+        self.df = df
+        self.stamp = stamp
+        self.normalized_chunks = {}
+        self.loaded_at = time.time()
+        compiled = compile_query(self.WARM_QUERY)
+        for start in range(0, len(df), DEADLINE_CHECK_ROWS):
+            chunk = df.iloc[start:start + DEADLINE_CHECK_ROWS]
+            compiled.mask(chunk, self.normalized_chunks.setdefault(start, {}))
+
 class ProductSearchAPI:
     """产品检索API类"""
 
-    def __init__(self, db_path: Path):
+    def __init__(self, db_path: Path, mode: str = "disk"):
         self.db_path = db_path
+        self.mode = mode
+        self.replica = DatabaseReplica(db_path) if mode == "memory" else None
+        self.replica_lock = threading.Lock()
+        self.pool = queue.LifoQueue(maxsize=CONNECTION_POOL_SIZE)
+        self.pool_generations = {}
+        self.snapshot = None
+
+    def generation(self):
+        """当前数据库版本标识；变化后连接池中的旧连接会被丢弃
 
-    def connect(self):
+        内存模式为副本的代数；磁盘模式为文件身份，数据库文件被整体替换后旧连接仍指向旧文件。
+        """
+        if self.replica is not None:
+            return self.replica.generation
+        identity = file_identity(self.db_path)
+        return identity[:2] if identity else None
+
+    def start_replica(self):
+        """内存模式下加载内存副本并启动后台刷新"""
+        with self.replica_lock:
+            if not self.replica.loaded:
+                self.replica.load()
+                self.replica.start_watcher()
+
+    def connect(self, deadline: Deadline = None, check_same_thread: bool = True):
         """连接数据库"""
-        return sqlite3.connect(self.db_path)
+        if self.replica is not None:
+            if not self.replica.loaded:
+                self.start_replica()
+            conn = self.replica.connect(check_same_thread=check_same_thread,
+                                        cached_statements=SQLITE_CACHED_STATEMENTS)
+        else:
+            conn = sqlite3.connect(self.db_path, check_same_thread=check_same_thread,
+                                   cached_statements=SQLITE_CACHED_STATEMENTS)
+            conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+        conn.execute("PRAGMA query_only = 1")
+        if deadline is not None:
+            deadline.install(conn)
+        return conn
+
+    def acquire(self, deadline: Deadline = None):
+        """从连接池取出一个连接（池为空时新建），用完后需调用 release 归还"""
+        generation = self.generation()
+        conn = None
+        while conn is None:
+            try:
+                conn = self.pool.get_nowait()
+            except queue.Empty:
+                conn = self.connect(check_same_thread=False)
+                self.pool_generations[id(conn)] = generation
+                break
+            if self.pool_generations.get(id(conn)) != generation:
+                # 数据库已刷新或被替换，丢弃旧连接
+                self.pool_generations.pop(id(conn), None)
+                conn.close()
+                conn = None
+        if deadline is not None:
+            deadline.install(conn)
+        return conn
+
+    def release(self, conn: sqlite3.Connection):
+        """归还连接；池已满或连接已过期时关闭"""
+        conn.set_progress_handler(None, 0)
+        conn.row_factory = None
+        if conn.in_transaction:
+            conn.rollback()
+        if self.pool_generations.get(id(conn)) == self.generation():
+            try:
+                self.pool.put_nowait(conn)
+                return
+            except queue.Full:
+                pass
+        self.pool_generations.pop(id(conn), None)
+        conn.close()
+
+    def data_stamp(self, conn: sqlite3.Connection) -> Tuple:
+        """数据版本：磁盘文件身份 + 变更位置（库存写入不改变文件身份，但会推进变更序号）
+
+        两种读取模式下结果一致，内存副本刷新到与磁盘相同的内容后与磁盘的版本相等。
+        """
+        try:
+            position = conn.execute("SELECT generation, change_seq FROM sync_state WHERE id = 1").fetchone()
+        except sqlite3.OperationalError:
+            position = None
+        identity = file_identity(self.db_path)
+        return (identity[:2] if identity else None, position)
+
+    def load_snapshot(self) -> CatalogSnapshot:
+        """从磁盘文件加载全部产品的候选集快照
+
+        使用临时连接且用完即关闭，不启动内存副本或后台线程，因此可以在 fork 之前调用。
+        """
+        import pandas as pd
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            stamp = self.data_stamp(conn)
+            df = pd.read_sql_query(f"SELECT {', '.join(SEARCH_COLUMNS)} FROM products WHERE 1=1", conn)
+        finally:
+            conn.close()
+        self.snapshot = CatalogSnapshot(df, stamp)
+        logger.info(f"已加载候选集快照: {len(df)} 条记录")
+        return self.snapshot
+
+    def snapshot_state(self, conn: sqlite3.Connection) -> str:
+        """快照状态：warm 与数据库一致；stale 为同一数据库文件（同一代），加载后只有库存写入；
+        cold 为没有快照，或数据库已被重建
+
+        stale 时搜索对无筛选条件的查询回退为逐次查询，结果仍是最新的，服务可以正常处理请求。
+        """
+        snapshot = self.snapshot
+        if snapshot is None:
+            return "cold"
+        stamp = self.data_stamp(conn)
+        if stamp == snapshot.stamp:
+            return "warm"
+        generation = stamp[1][0] if stamp[1] else None
+        loaded_generation = snapshot.stamp[1][0] if snapshot.stamp[1] else None
+        return "stale" if stamp[0] == snapshot.stamp[0] and generation == loaded_generation else "cold"
+
+    def current_snapshot(self, conn: sqlite3.Connection) -> Optional[CatalogSnapshot]:
+        """快照与数据库一致时返回快照"""
+        snapshot = self.snapshot
+        if snapshot is not None and snapshot.stamp == self.data_stamp(conn):
+            return snapshot
+        return None
 
     def get_suppliers(self) -> List[str]:
         """获取所有供应商列表"""
-        conn = self.connect()
+        conn = self.acquire()
         query = "SELECT DISTINCT SU FROM products WHERE SU IS NOT NULL AND SU != '' ORDER BY SU"
         cursor = conn.cursor()
         cursor.execute(query)
         suppliers = [row[0] for row in cursor.fetchall()]
-        conn.close()
+        self.release(conn)
         return ["ALL"] + suppliers
 
     def get_categories(self) -> List[str]:
         """获取所有主分类列表"""
-        conn = self.connect()
-        query = "SELECT DISTINCT nCategory FROM products WHERE nCategory IS NOT NULL AND nCategory != '' ORDER BY nCategory"
-        cursor = conn.cursor()
-        cursor.execute(query)
-        categories = [row[0] for row in cursor.fetchall()]
-        conn.close()
+        conn = self.acquire()
+        categories = list_categories(conn)
+        self.release(conn)
         return categories
 
     def get_subcategories(self, category: str) -> List[str]:
         """根据主分类获取子分类列表"""
-        conn = self.connect()
-        query = """
-        SELECT DISTINCT nSubCategory FROM products
-        WHERE nCategory = ? AND nSubCategory IS NOT NULL AND nSubCategory != ''
-        ORDER BY nSubCategory
-        """
-        cursor = conn.cursor()
-        cursor.execute(query, (category,))
-        subcategories = [row[0] for row in cursor.fetchall()]
-        conn.close()
+        conn = self.acquire()
+        subcategories = list_subcategories(conn, category)
+        self.release(conn)
         return subcategories
 
-    def normalize_text(self, text: str) -> str:
-        """标准化文本：移除标点符号、空格，转为小写"""
-        if not text or pd.isna(text):
-            return ""
-        # 移除所有非字母数字字符，转为小写
-        return re.sub(r'[^\w]', '', str(text).lower())
-
-    def parse_search_query(self, query: str) -> Dict:
-        """解析搜索查询字符串"""
-        if not query or not query.strip():
-            return {"type": "simple", "terms": []}
-
-        query = query.strip()
-
-        # 检查 OR 操作符
-        if re.search(r'\bor\b', query, flags=re.IGNORECASE):
-            parts = re.split(r'\s+or\s+', query, flags=re.IGNORECASE)
-            return {
-                "type": "or",
-                "terms": [part.strip() for part in parts if part.strip()]
-            }
-
-        # 检查 AND 操作符 (+)
-        if '+' in query:
-            parts = query.split('+')
-            return {
-                "type": "and",
-                "terms": [part.strip() for part in parts if part.strip()]
-            }
-
-        # 检查 NOT 操作符 (-)
-        if '-' in query:
-            parts = query.split('-', 1)  # 只分割第一个-
-            include = parts[0].strip()
-            exclude = parts[1].strip() if len(parts) > 1 else ""
-            return {
-                "type": "not",
-                "include": include,
-                "exclude": exclude
-            }
-
-        # 简单搜索
-        return {
-            "type": "simple",
-            "terms": [query]
-        }
-
-    def matches_search_terms(self, product_data: Dict, search_info: Dict) -> bool:
-        """检查产品是否匹配搜索条件"""
-        # 要搜索的文本字段
-        searchable_fields = [
-            product_data.get('SKU', ''),
-            product_data.get('Code', ''),
-            product_data.get('Description', ''),
-            product_data.get('nSubCategory', '')
-        ]
-
-        # 将所有搜索文本合并为一个字符串
-        combined_text = ' '.join(searchable_fields)
-        normalized_text = self.normalize_text(combined_text)
-
-        search_type = search_info["type"]
-
-        if search_type == "simple":
-            # 简单搜索：任何匹配即可
-            for term in search_info["terms"]:
-                normalized_term = self.normalize_text(term)
-                if normalized_term and normalized_term in normalized_text:
-                    return True
-            return len(search_info["terms"]) == 0
-
-        elif search_type == "or":
-            # OR搜索：任何条件匹配即可
-            for term in search_info["terms"]:
-                normalized_term = self.normalize_text(term)
-                if normalized_term and normalized_term in normalized_text:
-                    return True
-            return False
-
-        elif search_type == "and":
-            # AND搜索：所有条件都必须匹配
-            for term in search_info["terms"]:
-                normalized_term = self.normalize_text(term)
-                if not normalized_term or normalized_term not in normalized_text:
-                    return False
-            return True
-
-        elif search_type == "not":
-            # NOT搜索：包含include但不包含exclude
-            include_term = self.normalize_text(search_info["include"])
-            exclude_term = self.normalize_text(search_info["exclude"])
-
-            if include_term and include_term in normalized_text:
-                if exclude_term and exclude_term in normalized_text:
-                    return False
-                return True
-            return False
-
-        return False
+    def build_filter_clause(self, suppliers: List[str] = None,
+                            min_height: float = None, max_height: float = None,
+                            min_price: float = None, max_price: float = None,
+                            category: str = None, subcategories: List[str] = None,
+                            conn: sqlite3.Connection = None,
+                            dimensions: Dict[str, float] = None) -> Tuple[str, List]:
+        """根据筛选条件构建WHERE子句（不含关键词），返回SQL片段和参数
+
+        SQL文本只取决于哪些条件存在，而与列表长度和取值无关：供应商、子分类列表
+        各自作为一个JSON数组参数绑定，通过 json_each 展开。
+        分类名称解析为整数名称键后筛选；传入的 conn 指向没有 name_id 的旧数据库时按名称文本筛选。
+        dimensions 为尺寸范围 {min_w: ..., max_h: ...}（厘米），按有索引的 dim_* 列筛选；
+        没有尺寸列的旧数据库抛出 ValueError。
+        """
+        clause = ""
+        params = []
+
+        # 供应商筛选
+        if suppliers and "ALL" not in suppliers and len(suppliers) > 0:
+            clause += " AND SU IN (SELECT value FROM json_each(?))"
+            params.append(json.dumps(list(suppliers)))
+
+        # 高度/长度筛选
+        if min_height is not None:
+            clause += " AND CAST(COALESCE(NULLIF(HL, ''), '0') AS REAL) >= ?"
+            params.append(min_height)
+
+        if max_height is not None:
+            clause += " AND CAST(COALESCE(NULLIF(HL, ''), '999999') AS REAL) <= ?"
+            params.append(max_height)
+
+        # 价格筛选
+        if min_price is not None:
+            clause += " AND COALESCE(ListPrice, 0) >= ?"
+            params.append(min_price)
+
+        if max_price is not None:
+            clause += " AND COALESCE(ListPrice, 999999) <= ?"
+            params.append(max_price)
+
+        # 类别筛选（子分类只在选择了主分类时生效）
+        if category:
+            category_clause, category_params = category_filter(
+                category, subcategories, keyed=conn is None or has_category_keys(conn)
+            )
+            clause += category_clause
+            params.extend(category_params)
+
+        # 尺寸范围筛选（导入时解析出的数值列）
+        dimension_clause, dimension_params = dimension_filter(dimensions or {})
+        if dimension_clause:
+            if conn is not None and not has_dimension_columns(conn):
+                raise ValueError("数据库没有尺寸列，请重新运行 database_setup.py 后再按尺寸筛选")
+            clause += dimension_clause
+            params.extend(dimension_params)
+
+        return clause, params
 
     def search_products(self, search_query: str = "", suppliers: List[str] = None,
                        min_height: float = None, max_height: float = None,
                        min_price: float = None, max_price: float = None,
                        category: str = None, subcategories: List[str] = None,
-                       page: int = 1, per_page: int = 10) -> Dict:
-        """搜索产品"""
+                       page: int = 1, per_page: int = 10,
+                       deadline: Deadline = None, allow_partial: bool = False,
+                       conn: sqlite3.Connection = None, candidate_cache: Dict = None,
+                       dimensions: Dict[str, float] = None) -> Dict:
+        """搜索产品
+
+        超过 deadline 时抛出 QueryTimeout；若 allow_partial 为真且已进入关键词筛选阶段，
+        则返回已筛选部分的结果并标记 partial。
+        批量搜索时可传入共享的连接 conn，以及按筛选条件缓存候选记录的 candidate_cache。
+        """
+        import pandas as pd
 
-        conn = self.connect()
+        own_conn = conn is None
+        if own_conn:
+            conn = self.acquire(deadline)
+        partial = False
 
         try:
             # 构建基础查询
-            base_query = """
-            SELECT Code, SKU, Description, ListPrice, HL, Qty, Stock, Sold, StockStatus,
-                   nCategory, nSubCategory, Comment, SU
+            filter_clause, params = self.build_filter_clause(
+                suppliers, min_height, max_height, min_price, max_price, category, subcategories, conn,
+                dimensions
+            )
+            base_query = f"""
+            SELECT {', '.join(SEARCH_COLUMNS)}
             FROM products
-            WHERE 1=1
+            WHERE 1=1{filter_clause}
             """
 
-            params = []
-
-            # 供应商筛选
-            if suppliers and "ALL" not in suppliers and len(suppliers) > 0:
-                placeholders = ','.join(['?' for _ in suppliers])
-                base_query += f" AND SU IN ({placeholders})"
-                params.extend(suppliers)
-
-            # 高度/长度筛选
-            if min_height is not None:
-                base_query += " AND CAST(COALESCE(NULLIF(HL, ''), '0') AS REAL) >= ?"
-                params.append(min_height)
-
-            if max_height is not None:
-                base_query += " AND CAST(COALESCE(NULLIF(HL, ''), '999999') AS REAL) <= ?"
-                params.append(max_height)
-
-            # 价格筛选
-            if min_price is not None:
-                base_query += " AND COALESCE(ListPrice, 0) >= ?"
-                params.append(min_price)
-
-            if max_price is not None:
-                base_query += " AND COALESCE(ListPrice, 999999) <= ?"
-                params.append(max_price)
-
-            # 类别筛选
-            if category:
-                base_query += " AND nCategory = ?"
-                params.append(category)
-
-                if subcategories and len(subcategories) > 0:
-                    placeholders = ','.join(['?' for _ in subcategories])
-                    base_query += f" AND nSubCategory IN ({placeholders})"
-                    params.extend(subcategories)
-
-            # 执行查询获取所有匹配的记录
-            df = pd.read_sql_query(base_query, conn, params=params)
-
-            # 应用关键词搜索筛选
-            if search_query and search_query.strip():
-                search_info = self.parse_search_query(search_query)
-
-                def search_filter(row):
-                    product_data = row.to_dict()
-                    return self.matches_search_terms(product_data, search_info)
-
-                df = df[df.apply(search_filter, axis=1)]
+            # 执行查询获取所有匹配的记录（筛选条件相同的查询共享候选集及其标准化字段）
+            cache_key = (filter_clause, tuple(params))
+            snapshot = self.current_snapshot(conn) if not filter_clause and self.snapshot is not None else None
+            if candidate_cache is not None and cache_key in candidate_cache:
+                df, normalized_chunks = candidate_cache[cache_key]
+            elif snapshot is not None:
+                df, normalized_chunks = snapshot.df, snapshot.normalized_chunks
+            else:
+                df = pd.read_sql_query(base_query, conn, params=params)
+                normalized_chunks = {}
+                if candidate_cache is not None:
+                    candidate_cache[cache_key] = (df, normalized_chunks)
+
+            # 应用关键词搜索筛选（编译后的查询按块计算向量化掩码）
+            compiled = compile_query(search_query or "")
+            if not compiled.is_empty:
+                matched = []
+                for start in range(0, len(df), DEADLINE_CHECK_ROWS):
+                    if deadline and deadline.expired():
+                        if not allow_partial:
+                            deadline.check()
+                        partial = True
+                        break
+                    chunk = df.iloc[start:start + DEADLINE_CHECK_ROWS]
+                    matched.append(chunk[compiled.mask(chunk, normalized_chunks.setdefault(start, {}))])
+
+                df = pd.concat(matched) if matched else df.iloc[0:0]
 
             # 计算总记录数
             total_count = len(df)
@@ -248,15 +466,24 @@ class ProductSearchAPI:
             # 转换为字典列表
             products = df_page.to_dict('records')
 
-            return {
+            result = {
                 "products": products,
                 "total_count": total_count,
                 "page": page,
                 "per_page": per_page,
                 "total_pages": (total_count + per_page - 1) // per_page if per_page > 0 else 1
             }
+            if partial:
+                # 部分结果：total_count 只是已扫描部分的匹配数
+                result["partial"] = True
+            return result
+
+        except QueryTimeout:
+            raise
 
         except Exception as e:
+            if deadline and deadline.expired():
+                raise QueryTimeout(f"查询超过时限 {deadline.seconds}s") from e
             logger.error(f"搜索产品时出错: {e}")
             return {
                 "products": [],
@@ -267,15 +494,278 @@ class ProductSearchAPI:
                 "error": str(e)
             }
         finally:
-            conn.close()
+            if own_conn:
+                self.release(conn)
+
+    def iter_products(self, search_query: str = "", suppliers: List[str] = None,
+                      min_height: float = None, max_height: float = None,
+                      min_price: float = None, max_price: float = None,
+                      category: str = None, subcategories: List[str] = None,
+                      columns: List[str] = None, deadline: Deadline = None,
+                      dimensions: Dict[str, float] = None) -> Iterator[Dict]:
+        """逐行产出匹配的产品，用于流式导出
+
+        通过游标分批读取，内存占用与结果总数无关。超过 deadline 时抛出 QueryTimeout。
+        """
+        columns = columns or SEARCH_COLUMNS
+        select_columns = columns + [c for c in KEYWORD_COLUMNS if c not in columns]
+
+        compiled = compile_query(search_query or "")
+
+        conn = self.acquire(deadline)
+        try:
+            filter_clause, params = self.build_filter_clause(
+                suppliers, min_height, max_height, min_price, max_price, category, subcategories, conn,
+                dimensions
+            )
+        except Exception:
+            self.release(conn)
+            raise
+        query = f"""
+        SELECT {', '.join(select_columns)}
+        FROM products
+        WHERE 1=1{filter_clause}
+        ORDER BY id
+        """
+
+        cursor = conn.cursor()
+        try:
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+                if not rows:
+                    break
+                if deadline:
+                    deadline.check()
+                for row in rows:
+                    product_data = dict(zip(select_columns, row))
+                    if not compiled.matches(product_data):
+                        continue
+                    yield {column: product_data[column] for column in columns}
+        except sqlite3.OperationalError as e:
+            if deadline and deadline.expired():
+                raise QueryTimeout(f"查询超过时限 {deadline.seconds}s") from e
+            raise
+        finally:
+            # 提前结束（如客户端断开）时也要释放语句，再归还连接
+            cursor.close()
+            self.release(conn)
+
+    def get_product(self, sku: str) -> Optional[Dict]:
+        """按SKU获取产品的完整热字段记录（不含大字段）"""
+        conn = self.acquire()
+        try:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM products WHERE SKU = ?", (sku,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            product = dict(row)
+            product.pop('row_hash', None)  # 仅供重建时比较内容
+            return product
+        finally:
+            self.release(conn)
+
+    def get_product_content(self, product_id: int, fields: List[str]) -> Dict:
+        """按产品id读取指定的大字段"""
+        conn = self.acquire()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT {', '.join(fields)} FROM product_content WHERE product_id = ?",
+                (product_id,)
+            )
+            row = cursor.fetchone()
+            if row is None:
+                return {field: None for field in fields}
+            return dict(zip(fields, row))
+        finally:
+            self.release(conn)
+
+    def get_catalog_stats(self, deadline: Deadline = None) -> Dict:
+        """目录统计：读取 catalog_stats 汇总表（旧数据库没有该表时扫描一次 products）"""
+        conn = self.acquire(deadline)
+        try:
+            return catalog_summary(conn)
+        except sqlite3.OperationalError as e:
+            if deadline and deadline.expired():
+                raise QueryTimeout(f"查询超过时限 {deadline.seconds}s") from e
+            raise
+        finally:
+            self.release(conn)
+
+    def get_change_position(self) -> Optional[Tuple[int, int]]:
+        """数据库当前的 (代数, 变更序号)；没有变更跟踪表时返回None"""
+        conn = self.acquire()
+        try:
+            return conn.execute("SELECT generation, change_seq FROM sync_state WHERE id = 1").fetchone()
+        except sqlite3.OperationalError:
+            return None
+        finally:
+            self.release(conn)
+
+    def get_changes(self, generation: Optional[int], since: int, limit: int,
+                    columns: List[str], content_columns: List[str] = None,
+                    deadline: Deadline = None) -> Dict:
+        """按变更序号读取 since 之后变化的产品和被删除的SKU
+
+        generation 与数据库当前代数不一致时抛出 ChangeTokenExpired。
+        返回 {"generation", "changes", "deleted", "last_seq", "has_more"}，
+        changes 和 deleted 合并后按序号截取前 limit 条。
+        """
+        conn = self.acquire(deadline)
+        try:
+            try:
+                state = conn.execute("SELECT generation, change_seq FROM sync_state WHERE id = 1").fetchone()
+            except sqlite3.OperationalError:
+                state = None  # 旧版本 database_setup 构建的数据库没有变更跟踪表
+            if state is None:
+                raise ChangeTokenExpired("change tracking is not initialised, rebuild the database")
+            current_generation, current_seq = state
+            if generation is not None and (generation != current_generation or since > current_seq):
+                raise ChangeTokenExpired(f"token generation {generation} is no longer valid", current_generation)
+
+            select_columns = [f"p.{column}" for column in columns]
+            join = ""
+            if content_columns:
+                select_columns += [f"c.{column}" for column in content_columns]
+                join = "LEFT JOIN product_content c ON c.product_id = p.id"
+            cursor = conn.execute(
+                f"""
+                SELECT p.change_seq, p.updated_at, {', '.join(select_columns)}
+                FROM products p {join}
+                WHERE p.change_seq > ?
+                ORDER BY p.change_seq
+                LIMIT ?
+                """,
+                (since, limit + 1)
+            )
+            names = ["change_seq", "updated_at"] + columns + (content_columns or [])
+            changes = [dict(zip(names, row)) for row in cursor.fetchall()]
+
+            deleted = [
+                {"SKU": row[0], "change_seq": row[1], "deleted_at": row[2]}
+                for row in conn.execute(
+                    "SELECT SKU, change_seq, deleted_at FROM deleted_products WHERE change_seq > ? ORDER BY change_seq LIMIT ?",
+                    (since, limit + 1)
+                )
+            ]
+        finally:
+            self.release(conn)
+
+        # 合并两个序列，只返回序号最小的 limit 条，保证下一页从截断处继续
+        merged = sorted([("change", row) for row in changes] + [("delete", row) for row in deleted],
+                        key=lambda item: item[1]["change_seq"])
+        has_more = len(merged) > limit
+        merged = merged[:limit]
+        last_seq = merged[-1][1]["change_seq"] if merged else max(since, 0)
+
+        return {
+            "generation": current_generation,
+            "changes": [row for kind, row in merged if kind == "change"],
+            "deleted": [row for kind, row in merged if kind == "delete"],
+            "last_seq": last_seq,
+            "has_more": has_more,
+        }
 
 # 创建API实例
-search_api = ProductSearchAPI(DB_PATH)
+search_api = ProductSearchAPI(DB_PATH, DB_MODE)
+stock_writer = StockWriter(DB_PATH)
+change_bus = ChangeBus(
+    position=search_api.get_change_position,
+    fetch=lambda generation, since, limit: search_api.get_changes(generation, since, limit, STREAM_COLUMNS)
+)
+stock_writer.listeners.append(change_bus.notify)
+
+def use_stock_writer(writer):
+    """替换处理库存调整的写入器（多进程部署时工作进程改为转发给唯一的写进程，见 api/serve.py）"""
+    global stock_writer
+    writer.listeners.append(change_bus.notify)
+    stock_writer = writer
+
+def timeout_response(error: QueryTimeout):
+    """查询超时的统一响应 (503)"""
+    logger.warning(f"查询超时: {error}")
+    response = jsonify({"error": "Query timed out", "detail": str(error)})
+    response.status_code = 503
+    response.headers["Retry-After"] = "1"
+    return response
+
+def normalize_paging(page, per_page) -> Tuple[int, int]:
+    """验证分页参数"""
+    if not isinstance(page, int) or page < 1:
+        page = 1
+    if not isinstance(per_page, int) or per_page < 1 or per_page > 100:
+        per_page = 10
+    return page, per_page
+
+def normalize_timeout(value) -> Optional[float]:
+    """验证请求体中的 timeout（秒）：省略或非正数为未指定，不是有限数字时抛出 ValueError
+
+    上限由 Deadline.for_endpoint 按接口配置截断。
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ValueError("timeout must be a number of seconds")
+    return float(value) if value > 0 else None
+
+def parse_filter_body(data: Dict) -> Dict:
+    """从JSON请求体中解析搜索关键词和筛选条件"""
+    return {
+        "search_query": data.get('q', ''),
+        "suppliers": data.get('suppliers', []),
+        "min_height": data.get('min_height'),
+        "max_height": data.get('max_height'),
+        "min_price": data.get('min_price'),
+        "max_price": data.get('max_price'),
+        "category": data.get('category'),
+        "subcategories": data.get('subcategories', []),
+        "dimensions": {name: data.get(name) for name in DIMENSION_FILTERS}
+    }
+
+def parse_filter_args(args) -> Dict:
+    """从URL查询参数中解析搜索关键词和筛选条件"""
+    return {
+        "search_query": args.get('q', ''),
+        "suppliers": args.getlist('suppliers'),
+        "min_height": args.get('min_height', type=float),
+        "max_height": args.get('max_height', type=float),
+        "min_price": args.get('min_price', type=float),
+        "max_price": args.get('max_price', type=float),
+        "category": args.get('category'),
+        "subcategories": args.getlist('subcategories'),
+        "dimensions": {name: args.get(name, type=float) for name in DIMENSION_FILTERS}
+    }
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """健康检查接口"""
-    return jsonify({"status": "healthy", "message": "Product Search API is running"})
+    return jsonify({"status": "healthy", "message": "Product Search API is running", "db_mode": search_api.mode})
+
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    """就绪检查接口：快照已加载且对应当前数据库文件时返回200，status 为 warm（与数据库一致）
+    或 stale（加载后有库存写入，无筛选条件的搜索暂时逐次查询，等待主进程重载）；
+    没有快照或数据库已被重建时为 cold (503)
+    """
+    conn = search_api.acquire()
+    try:
+        status = search_api.snapshot_state(conn)
+    finally:
+        search_api.release(conn)
+
+    body = {
+        "status": status,
+        "pid": os.getpid(),
+        "db_mode": search_api.mode,
+    }
+    snapshot = search_api.snapshot
+    if snapshot is not None:
+        body["snapshot_rows"] = len(snapshot.df)
+        body["snapshot_age"] = round(time.time() - snapshot.loaded_at, 1)
+    return jsonify(body), 503 if status == "cold" else 200
 
 @app.route('/api/suppliers', methods=['GET'])
 def get_suppliers():
@@ -311,48 +801,350 @@ def get_subcategories():
         logger.error(f"获取子分类列表时出错: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/stats', methods=['GET'])
+def get_catalog_stats():
+    """目录统计接口：产品总数、库存状态和分类分布、库存与价格统计"""
+    try:
+        deadline = Deadline.for_endpoint('stats', request.args.get('timeout', type=float))
+        return jsonify(search_api.get_catalog_stats(deadline))
+    except QueryTimeout as e:
+        return timeout_response(e)
+    except Exception as e:
+        logger.error(f"获取目录统计时出错: {e}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/products/search', methods=['GET'])
 def search_products():
     """搜索产品接口"""
     try:
         # 获取查询参数
-        search_query = request.args.get('q', '')
-        suppliers = request.args.getlist('suppliers')
-        min_height = request.args.get('min_height', type=float)
-        max_height = request.args.get('max_height', type=float)
-        min_price = request.args.get('min_price', type=float)
-        max_price = request.args.get('max_price', type=float)
-        category = request.args.get('category')
-        subcategories = request.args.getlist('subcategories')
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 10, type=int)
-
-        # 验证分页参数
-        if page < 1:
-            page = 1
-        if per_page < 1 or per_page > 100:
-            per_page = 10
+        filters = parse_filter_args(request.args)
+        page, per_page = normalize_paging(request.args.get('page', 1, type=int),
+                                          request.args.get('per_page', 10, type=int))
+
+        # 查询时限；partial=1 时超时返回已筛选的部分结果
+        deadline = Deadline.for_endpoint('search', request.args.get('timeout', type=float))
+        allow_partial = request.args.get('partial', '').lower() in ('1', 'true', 'yes')
 
         # 执行搜索
-        result = search_api.search_products(
-            search_query=search_query,
-            suppliers=suppliers,
-            min_height=min_height,
-            max_height=max_height,
-            min_price=min_price,
-            max_price=max_price,
-            category=category,
-            subcategories=subcategories,
-            page=page,
-            per_page=per_page
-        )
+        result = search_api.search_products(page=page, per_page=per_page, deadline=deadline,
+                                            allow_partial=allow_partial, **filters)
 
         return jsonify(result)
 
+    except QueryTimeout as e:
+        return timeout_response(e)
+
     except Exception as e:
         logger.error(f"搜索产品时出错: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/products/export', methods=['GET'])
+def export_products():
+    """导出全部搜索结果 (流式输出 NDJSON 或 CSV)
+
+    与搜索接口使用相同的筛选参数，不分页。
+    可选参数: format=ndjson|csv, fields=SKU,Description,... (列投影), gzip=1 (压缩输出)
+    首批数据前超时返回503；输出过程中超时则中断连接，客户端会收到不完整的传输。
+    """
+    export_format = request.args.get('format', 'ndjson').lower()
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({"error": "format must be 'ndjson' or 'csv'"}), 400
+
+    # 列投影
+    fields = request.args.get('fields', '')
+    columns = [field.strip() for field in fields.split(',') if field.strip()] or SEARCH_COLUMNS
+    invalid_columns = [column for column in columns if column not in EXPORT_COLUMNS]
+    if invalid_columns:
+        return jsonify({
+            "error": f"Unknown fields: {', '.join(invalid_columns)}",
+            "allowed_fields": EXPORT_COLUMNS
+        }), 400
+
+    use_gzip = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+    filters = parse_filter_args(request.args)
+    deadline = Deadline.for_endpoint('export', request.args.get('timeout', type=float))
+    rows = search_api.iter_products(columns=columns, deadline=deadline, **filters)
+
+    # 先取第一行，使查询阶段的超时和错误能以正常的HTTP状态返回
+    try:
+        first_row = next(rows, None)
+    except QueryTimeout as e:
+        return timeout_response(e)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if first_row is not None:
+        rows = itertools.chain([first_row], rows)
+
+    if export_format == 'csv':
+        chunks = iter_csv_chunks(rows, columns)
+        mimetype = 'text/csv'
+    else:
+        chunks = iter_ndjson_chunks(rows)
+        mimetype = 'application/x-ndjson'
+
+    headers = {"Content-Disposition": f"attachment; filename=products.{export_format}"}
+    if use_gzip:
+        chunks = iter_gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
+
+def iter_ndjson_chunks(rows: Iterator[Dict]) -> Iterator[str]:
+    """将产品行编码为NDJSON，每 EXPORT_FETCH_SIZE 行输出一块"""
+    buffer = []
+    for row in rows:
+        buffer.append(json.dumps(row, ensure_ascii=False))
+        if len(buffer) >= EXPORT_FETCH_SIZE:
+            yield '\n'.join(buffer) + '\n'
+            buffer = []
+    if buffer:
+        yield '\n'.join(buffer) + '\n'
+
+def iter_csv_chunks(rows: Iterator[Dict], columns: List[str]) -> Iterator[str]:
+    """将产品行编码为CSV（含表头），每 EXPORT_FETCH_SIZE 行输出一块"""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(columns)
+    count = 0
+    for row in rows:
+        writer.writerow([row[column] for column in columns])
+        count += 1
+        if count % EXPORT_FETCH_SIZE == 0:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate(0)
+    yield output.getvalue()
+
+def iter_gzip_chunks(chunks: Iterator[str]) -> Iterator[bytes]:
+    """对文本块进行流式gzip压缩"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def parse_change_token(token: str) -> Tuple[Optional[int], int]:
+    """解析同步令牌 "<代数>.<序号>"；为空时从头开始"""
+    if not token:
+        return None, 0
+    generation, sep, seq = token.partition('.')
+    if not sep:
+        raise ValueError("since must look like '<generation>.<seq>'")
+    return int(generation), int(seq)
+
+@app.route('/api/products/changes', methods=['GET'])
+def get_product_changes():
+    """增量同步接口
+
+    参数: since=<上次响应的 next 令牌>（首次同步省略）, limit=500, fields=SKU,Stock,...（可含大字段）
+    按变更序号返回 since 之后变化的产品 (changes) 和被删除的SKU (deleted)，以及下一次请求使用的 next 令牌；
+    has_more 为真时应立即用 next 继续请求。令牌失效（数据库重建了变更跟踪）时返回410，
+    响应中的 reset 令牌表示从头全量同步。
+    """
+    try:
+        try:
+            generation, since = parse_change_token(request.args.get('since', '').strip())
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        limit = request.args.get('limit', CHANGES_DEFAULT_LIMIT, type=int)
+        limit = max(1, min(limit, CHANGES_MAX_LIMIT))
+
+        fields = request.args.get('fields', '')
+        requested = [field.strip() for field in fields.split(',') if field.strip()]
+        columns = [field for field in requested if field in EXPORT_COLUMNS] if requested else list(EXPORT_COLUMNS)
+        content_columns = [field for field in requested if field in CONTENT_COLUMNS]
+        invalid_fields = [field for field in requested if field not in EXPORT_COLUMNS and field not in CONTENT_COLUMNS]
+        if invalid_fields:
+            return jsonify({
+                "error": f"Unknown fields: {', '.join(invalid_fields)}",
+                "allowed_fields": EXPORT_COLUMNS + CONTENT_COLUMNS
+            }), 400
+        if "SKU" not in columns:
+            columns.insert(0, "SKU")
+
+        deadline = Deadline.for_endpoint('changes', request.args.get('timeout', type=float))
+        try:
+            result = search_api.get_changes(generation, since, limit, columns, content_columns, deadline)
+        except ChangeTokenExpired as e:
+            return jsonify({
+                "error": f"Sync token expired: {e}",
+                "reset": f"{e.generation}.0" if e.generation is not None else None
+            }), 410
+        except QueryTimeout as e:
+            return timeout_response(e)
+
+        return jsonify({
+            "changes": result["changes"],
+            "deleted": result["deleted"],
+            "next": f"{result['generation']}.{result['last_seq']}",
+            "has_more": result["has_more"],
+        })
+
+    except Exception as e:
+        logger.error(f"获取增量变更时出错: {e}")
+        return jsonify({"error": str(e)}), 500
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+def format_sse(event: Dict) -> str:
+    """格式化为一条SSE消息；记录事件的 id 为同步令牌，供断线重连时使用"""
+    lines = []
+    if event.get("id") and event["type"] in ("change", "delete", "reset"):
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['type']}")
+    lines.append(f"data: {json.dumps(event, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+class StreamRejected(Exception):
+    """变更推送请求被拒绝（参数错误或连接数已满）"""
+
+    def __init__(self, status: int, body: Dict, headers: Dict = None):
+        super().__init__(body.get("error"))
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+
+class ChangeStream:
+    """一个变更推送连接：总线订阅，以及断线重连时从数据库补发的事件"""
+
+    def __init__(self, subscription, replay: List[Dict], generation: Optional[int], since: int):
+        self.subscription = subscription
+        self.replay = replay
+        self.generation = generation
+        self.since = since
+
+    def should_send(self, event: Dict) -> bool:
+        """补发与实时事件重叠的部分按序号去重"""
+        return not (self.generation is not None and event["type"] in ("change", "delete")
+                    and event["id"].startswith(f"{self.generation}.") and event["change_seq"] <= self.since)
+
+    def close(self):
+        change_bus.unsubscribe(self.subscription)
+
+def open_change_stream(args, headers) -> ChangeStream:
+    """校验参数、订阅变更总线并准备重连补发的事件；请求无效时抛出 StreamRejected"""
+    policy = args.get('overflow', 'resync')
+    if policy not in OVERFLOW_POLICIES:
+        raise StreamRejected(400, {"error": f"overflow must be one of {', '.join(OVERFLOW_POLICIES)}"})
+    skus = [sku.strip() for sku in args.get('skus', '').split(',') if sku.strip()] or None
+
+    try:
+        generation, since = parse_change_token(
+            headers.get('Last-Event-ID', '').strip() or args.get('since', '').strip()
+        )
+    except ValueError as e:
+        raise StreamRejected(400, {"error": str(e)})
+
+    if change_bus.subscriber_count >= STREAM_MAX_CLIENTS:
+        raise StreamRejected(503, {"error": "Too many stream clients"}, {"Retry-After": "5"})
+
+    # 先订阅再补发，补发与实时事件重叠的部分由 ChangeStream.should_send 去重
+    subscription = change_bus.subscribe(skus=skus, policy=policy)
+    replay = []
+    if generation is not None:
+        try:
+            result = search_api.get_changes(generation, since, STREAM_REPLAY_LIMIT, STREAM_COLUMNS)
+            rows = [("change", row) for row in result["changes"]] + [("delete", row) for row in result["deleted"]]
+            rows.sort(key=lambda item: item[1]["change_seq"])
+            replay = [dict(row, type=kind, id=f"{generation}.{row['change_seq']}") for kind, row in rows]
+            replay = [event for event in replay if subscription.wants(event)]
+            if result["has_more"]:
+                replay = [{"type": "resync"}]
+            since = result["last_seq"]
+        except ChangeTokenExpired as e:
+            replay = [{"type": "reset", "id": f"{e.generation}.0" if e.generation is not None else None}]
+        except Exception:
+            change_bus.unsubscribe(subscription)
+            raise
+
+    return ChangeStream(subscription, replay, generation, since)
+
+@app.route('/api/stream/changes', methods=['GET'])
+def stream_changes():
+    """变更推送接口 (Server-Sent Events)
+
+    参数: skus=A55310637,A74320435（只推送这些SKU，通常为页面上可见的行）,
+          overflow=resync|drop|disconnect（客户端处理过慢时的策略，默认 resync）,
+          since=<同步令牌>（也可由 EventSource 重连时的 Last-Event-ID 请求头提供）
+    事件类型: change（记录变化，含 STREAM_COLUMNS 字段）、delete（SKU被删除）、
+    resync（事件有遗漏，应通过 /api/products/changes 从上次的令牌补齐）、reset（需要全量刷新）。
+    """
+    try:
+        stream = open_change_stream(request.args, request.headers)
+    except StreamRejected as e:
+        response = jsonify(e.body)
+        response.status_code = e.status
+        response.headers.update(e.headers)
+        return response
+
+    def generate():
+        try:
+            yield "retry: 3000\n\n"
+            for event in stream.replay:
+                yield format_sse(event)
+            while True:
+                try:
+                    event = stream.subscription.get(timeout=STREAM_HEARTBEAT)
+                except EOFError:
+                    break  # 按 disconnect 策略断开，客户端会带着 Last-Event-ID 重连
+                if event is None:
+                    yield ": keepalive\n\n"
+                elif stream.should_send(event):
+                    yield format_sse(event)
+        finally:
+            stream.close()
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+@app.route('/api/products/<sku>', methods=['GET'])
+def get_product_detail(sku):
+    """产品详情接口
+
+    默认只返回 products 表中的字段；大字段需通过 fields 参数显式请求，
+    如 ?fields=PostContent,Images 或 ?fields=all。
+    响应带有由 updated_at 派生的强 ETag，支持 If-None-Match 条件请求 (304)。
+    """
+    try:
+        fields_arg = request.args.get('fields', '')
+        if fields_arg.strip().lower() == 'all':
+            content_fields = list(CONTENT_COLUMNS)
+        else:
+            content_fields = [field.strip() for field in fields_arg.split(',') if field.strip()]
+            invalid_fields = [field for field in content_fields if field not in CONTENT_COLUMNS]
+            if invalid_fields:
+                return jsonify({
+                    "error": f"Unknown fields: {', '.join(invalid_fields)}",
+                    "allowed_fields": CONTENT_COLUMNS
+                }), 400
+
+        product = search_api.get_product(sku)
+        if product is None:
+            return jsonify({"error": "Product not found"}), 404
+
+        # ETag 取决于记录版本和所请求的字段集合（updated_at 精度为秒，同一秒内多次修改靠 change_seq 区分）
+        etag_source = (f"{product['id']}|{product.get('change_seq')}|{product.get('updated_at')}|"
+                       f"{','.join(sorted(content_fields))}")
+        etag = hashlib.sha1(etag_source.encode('utf-8')).hexdigest()
+
+        # 命中缓存时不再读取大字段
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            if content_fields:
+                product.update(search_api.get_product_content(product['id'], content_fields))
+            response = jsonify({"product": product})
+
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+        return response
+
+    except Exception as e:
+        logger.error(f"获取产品详情时出错: {e}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/products/search', methods=['POST'])
 def search_products_post():
     """搜索产品接口 (POST方式，支持复杂查询)"""
@@ -362,43 +1154,136 @@ def search_products_post():
             return jsonify({"error": "No JSON data provided"}), 400
 
         # 获取JSON参数
-        search_query = data.get('q', '')
-        suppliers = data.get('suppliers', [])
-        min_height = data.get('min_height')
-        max_height = data.get('max_height')
-        min_price = data.get('min_price')
-        max_price = data.get('max_price')
-        category = data.get('category')
-        subcategories = data.get('subcategories', [])
-        page = data.get('page', 1)
-        per_page = data.get('per_page', 10)
-
-        # 验证分页参数
-        if page < 1:
-            page = 1
-        if per_page < 1 or per_page > 100:
-            per_page = 10
+        filters = parse_filter_body(data)
+        page, per_page = normalize_paging(data.get('page', 1), data.get('per_page', 10))
+        try:
+            deadline = Deadline.for_endpoint('search', normalize_timeout(data.get('timeout')))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
         # 执行搜索
-        result = search_api.search_products(
-            search_query=search_query,
-            suppliers=suppliers,
-            min_height=min_height,
-            max_height=max_height,
-            min_price=min_price,
-            max_price=max_price,
-            category=category,
-            subcategories=subcategories,
-            page=page,
-            per_page=per_page
-        )
+        result = search_api.search_products(page=page, per_page=per_page, deadline=deadline,
+                                            allow_partial=bool(data.get('partial')), **filters)
 
         return jsonify(result)
 
+    except QueryTimeout as e:
+        return timeout_response(e)
+
     except Exception as e:
         logger.error(f"搜索产品时出错: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/products/search/batch', methods=['POST'])
+def search_products_batch():
+    """批量搜索接口
+
+    请求体: {"queries": [<与POST搜索相同的查询对象>, ...], "parallel": false}，也可直接传查询数组。
+    所有查询共享一个时限和候选集缓存；顺序执行时共用一个数据库连接，
+    parallel 为真时由最多 BATCH_MAX_WORKERS 个线程各自持有连接并行执行。
+    结果按请求顺序返回，单个查询失败或超时只影响对应位置的结果。
+    """
+    try:
+        data = request.get_json()
+        if isinstance(data, list):
+            data = {"queries": data}
+        if not data or not isinstance(data.get('queries'), list):
+            return jsonify({"error": "A 'queries' array is required"}), 400
+
+        queries = data['queries']
+        if len(queries) > BATCH_MAX_QUERIES:
+            return jsonify({"error": f"At most {BATCH_MAX_QUERIES} queries per batch"}), 400
+
+        try:
+            deadline = Deadline.for_endpoint('batch', normalize_timeout(data.get('timeout')))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        candidate_cache = {}
+        result_cache = {}
+        local = threading.local()
+        connections = []
+        connections_lock = threading.Lock()
+
+        def get_connection():
+            # 每个执行线程复用同一个连接（结束后由请求线程统一归还）
+            if not hasattr(local, 'conn'):
+                local.conn = search_api.acquire(deadline)
+                with connections_lock:
+                    connections.append(local.conn)
+            return local.conn
+
+        def run_query(query):
+            if not isinstance(query, dict):
+                return {"error": "Each query must be a JSON object"}
+
+            # 完全相同的查询只执行一次
+            cache_key = json.dumps(query, sort_keys=True)
+            if cache_key in result_cache:
+                return result_cache[cache_key]
+
+            page, per_page = normalize_paging(query.get('page', 1), query.get('per_page', 10))
+            try:
+                result = search_api.search_products(
+                    page=page, per_page=per_page, deadline=deadline,
+                    conn=get_connection(), candidate_cache=candidate_cache,
+                    **parse_filter_body(query)
+                )
+            except QueryTimeout as e:
+                return {"error": "Query timed out", "detail": str(e)}
+
+            result_cache[cache_key] = result
+            return result
+
+        try:
+            if data.get('parallel') and len(queries) > 1:
+                with ThreadPoolExecutor(max_workers=min(BATCH_MAX_WORKERS, len(queries))) as executor:
+                    results = list(executor.map(run_query, queries))
+            else:
+                results = [run_query(query) for query in queries]
+        finally:
+            for conn in connections:
+                search_api.release(conn)
+
+        return jsonify({"results": results})
+
+    except Exception as e:
+        logger.error(f"批量搜索时出错: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/stock/adjust', methods=['POST'])
+def adjust_stock():
+    """库存调整接口（POS售出/退货）
+
+    请求体: {"items": [{"sku": "A55310637", "qty": 2}, ...], "allow_negative": false}
+    qty 为售出数量（负数为退货），同一请求内的所有调整要么全部生效要么全部不生效。
+    请求进入单写线程的队列，与其他请求合并提交；返回每个SKU调整后的 stock 和 sold。
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        items = parse_adjustments(data.get('items'))
+        if not items:
+            return jsonify({"results": []})
+
+        future = stock_writer.submit(items, allow_negative=bool(data.get('allow_negative')))
+        seconds = QUERY_TIMEOUTS.get('stock') or None
+        try:
+            results = future.result(timeout=seconds)
+        except FutureTimeout:
+            # 请求仍在队列中，稍后可能生效；客户端应以查询结果为准再决定是否重试
+            return timeout_response(QueryTimeout(f"stock adjustment not committed within {seconds}s"))
+
+        return jsonify({"results": results})
+
+    except StockAdjustmentError as e:
+        response = jsonify({"error": str(e)})
+        response.status_code = e.status
+        if e.status == 503:
+            response.headers["Retry-After"] = "1"
+        return response
+    except Exception as e:
+        logger.error(f"调整库存时出错: {e}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/products/suggestions', methods=['GET'])
 def get_search_suggestions():
     """获取搜索建议"""
@@ -407,7 +1292,8 @@ def get_search_suggestions():
         if len(query) < 2:
             return jsonify({"suggestions": []})
 
-        conn = search_api.connect()
+        deadline = Deadline.for_endpoint('suggestions', request.args.get('timeout', type=float))
+        conn = search_api.acquire(deadline)
 
         # 获取SKU建议
         sku_query = """
@@ -433,20 +1319,29 @@ def get_search_suggestions():
         like_pattern = f'%{query}%'
 
         suggestions = []
+        partial = False
 
-        # 获取建议
-        for q in [sku_query, desc_query, subcat_query]:
-            cursor = conn.cursor()
-            cursor.execute(q, (like_pattern,))
-            results = [row[0] for row in cursor.fetchall()]
-            suggestions.extend(results)
+        # 获取建议（超时则返回已获取的部分建议）
+        try:
+            for q in [sku_query, desc_query, subcat_query]:
+                cursor = conn.cursor()
+                cursor.execute(q, (like_pattern,))
+                results = [row[0] for row in cursor.fetchall()]
+                suggestions.extend(results)
+        except sqlite3.OperationalError:
+            if not deadline.expired():
+                raise
+            partial = True
+        finally:
+            search_api.release(conn)
 
         # 去重并限制数量
         unique_suggestions = list(set(suggestions))[:10]
 
-        conn.close()
-
-        return jsonify({"suggestions": unique_suggestions})
+        response = {"suggestions": unique_suggestions}
+        if partial:
+            response["partial"] = True
+        return jsonify(response)
 
     except Exception as e:
         logger.error(f"获取搜索建议时出错: {e}")
@@ -465,5 +1360,7 @@ if __name__ == '__main__':
         logger.error(f"数据库文件不存在: {DB_PATH}")
         print(f"错误: 数据库文件不存在: {DB_PATH}")
     else:
-        logger.info("启动产品检索API服务...")
+        logger.info(f"启动产品检索API服务 (数据库模式: {DB_MODE})...")
+        if search_api.replica is not None:
+            search_api.start_replica()
         app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
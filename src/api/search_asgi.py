@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+产品检索API 的 ASGI 版本
+与 search_api.py 提供完全相同的接口和JSON格式（直接复用其中的 Flask 视图），
+适合门店终端的大量空闲长连接和慢客户端：
+
+- 普通接口：Flask 视图在有界线程池中执行，响应在事件循环中异步发送，慢客户端不占用线程
+- 流式接口（导出）：每次只在线程池中取下一块数据，等待客户端接收期间不占用线程
+- 变更推送 (SSE)：在事件循环中等待总线事件，空闲的推送连接不占用线程
+- 空闲的 keep-alive 连接由 ASGI 服务器在事件循环中维护，不对应任何线程
+- 不提供 WebSocket 接口，WebSocket 握手直接被拒绝（服务器返回403）
+- 需要 uvicorn（requirements.txt）；以单进程运行，每个进程都有自己的库存写线程
+
+用法: cd src && uvicorn search_asgi:app --app-dir api --host 0.0.0.0 --port 5000
+"""
+
+import os
+import io
+import sys
+import json
+import asyncio
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+from werkzeug.datastructures import Headers, MultiDict
+
+from search_api import (
+    app as flask_app, search_api, change_bus, open_change_stream, StreamRejected, format_sse,
+    SSE_HEADERS, STREAM_HEARTBEAT
+)
+from serve import start_snapshot_refresh
+
+logger = logging.getLogger(__name__)
+
+# 执行数据库查询和 Flask 视图的线程数
+ASGI_THREADS = int(os.environ.get("IMS_ASGI_THREADS", 16))
+
+# 请求体大小上限（字节）
+MAX_BODY_SIZE = 1024 * 1024
+
+executor = ThreadPoolExecutor(max_workers=ASGI_THREADS, thread_name_prefix="asgi-worker")
+
+
+def build_environ(scope, body: bytes) -> dict:
+    """由 ASGI scope 构造 WSGI environ"""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for raw_name, raw_value in scope["headers"]:
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        value = raw_value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif name == "CONTENT_LENGTH":
+            environ["CONTENT_LENGTH"] = value
+        else:
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+async def read_body(receive) -> bytes:
+    """读取完整请求体；超过 MAX_BODY_SIZE 时返回None"""
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return b""
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY_SIZE:
+            return None
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+def watch_disconnect(receive, *events: asyncio.Event) -> asyncio.Event:
+    """后台等待客户端断开，断开后设置返回的事件（以及额外传入的事件）"""
+    disconnected = asyncio.Event()
+
+    async def watch():
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                disconnected.set()
+                for event in events:
+                    event.set()
+                return
+
+    disconnected.task = asyncio.ensure_future(watch())
+    return disconnected
+
+
+async def send_json(send, status: int, body, headers=None):
+    payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+    response_headers = [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode())]
+    response_headers += [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                         for name, value in (headers or {}).items()]
+    await send({"type": "http.response.start", "status": status, "headers": response_headers})
+    await send({"type": "http.response.body", "body": payload})
+
+
+async def call_flask(scope, receive, send):
+    """在线程池中执行 Flask 视图
+
+    带 Content-Length 的普通响应在同一次线程池调用中读完；流式响应（导出）每次在线程池中取一块，
+    客户端断开后停止读取并关闭生成器（同时关闭数据库游标）。
+    所有调用都在同一个 contextvars 上下文中执行，流式视图的请求上下文在各块之间保持有效。
+    """
+    body = await read_body(receive)
+    if body is None:
+        await send_json(send, 413, {"error": "Request body too large"})
+        return
+
+    environ = build_environ(scope, body)
+    context = contextvars.copy_context()
+    loop = asyncio.get_running_loop()
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"] = int(status.split(" ", 1)[0])
+        started["headers"] = headers
+        return lambda data: None
+
+    def begin():
+        result = flask_app(environ, start_response)
+        if any(name.lower() == "content-length" for name, _ in started["headers"]):
+            try:
+                return b"".join(result), None
+            finally:
+                if hasattr(result, "close"):
+                    result.close()
+        return None, result
+
+    payload, result = await loop.run_in_executor(executor, context.run, begin)
+    headers = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in started["headers"]]
+    await send({"type": "http.response.start", "status": started["status"], "headers": headers})
+
+    if result is None:
+        await send({"type": "http.response.body", "body": payload})
+        return
+
+    disconnected = watch_disconnect(receive)
+    iterator = iter(result)
+    try:
+        while not disconnected.is_set():
+            chunk = await loop.run_in_executor(executor, context.run, next, iterator, None)
+            if chunk is None:
+                break
+            if chunk:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        if not disconnected.is_set():
+            await send({"type": "http.response.body", "body": b""})
+    finally:
+        disconnected.task.cancel()
+        if hasattr(result, "close"):
+            await loop.run_in_executor(executor, context.run, result.close)
+
+
+async def stream_changes(scope, receive, send):
+    """变更推送 (SSE)：与 Flask 版本相同的参数和事件，在事件循环中等待事件"""
+    await read_body(receive)
+    args = MultiDict(parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True))
+    headers = Headers([(name.decode("latin-1"), value.decode("latin-1")) for name, value in scope["headers"]])
+    loop = asyncio.get_running_loop()
+
+    try:
+        stream = await loop.run_in_executor(executor, open_change_stream, args, headers)
+    except StreamRejected as e:
+        await send_json(send, e.status, e.body, e.headers)
+        return
+
+    wakeup = asyncio.Event()
+    stream.subscription.listener = lambda: loop.call_soon_threadsafe(wakeup.set)
+    disconnected = watch_disconnect(receive, wakeup)
+
+    async def send_text(text: str):
+        await send({"type": "http.response.body", "body": text.encode("utf-8"), "more_body": True})
+
+    try:
+        # 与 Flask 应用的 CORS(app) 默认配置一致
+        response_headers = [(b"content-type", b"text/event-stream; charset=utf-8"),
+                            (b"access-control-allow-origin", b"*")]
+        response_headers += [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                             for name, value in SSE_HEADERS.items()]
+        await send({"type": "http.response.start", "status": 200, "headers": response_headers})
+        await send_text("retry: 3000\n\n")
+        for event in stream.replay:
+            await send_text(format_sse(event))
+
+        while not disconnected.is_set():
+            wakeup.clear()
+            try:
+                event = stream.subscription.get(timeout=0)
+            except EOFError:
+                break  # 按 disconnect 策略断开，客户端会带着 Last-Event-ID 重连
+            if event is None:
+                try:
+                    await asyncio.wait_for(wakeup.wait(), STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    await send_text(": keepalive\n\n")
+            elif stream.should_send(event):
+                await send_text(format_sse(event))
+
+        if not disconnected.is_set():
+            await send({"type": "http.response.body", "body": b""})
+    finally:
+        stream.subscription.listener = None
+        disconnected.task.cancel()
+        stream.close()
+
+
+async def lifespan(scope, receive, send):
+    """启动时加载内存副本（memory 模式）和候选集快照"""
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            try:
+                loop = asyncio.get_running_loop()
+                if search_api.replica is not None:
+                    await loop.run_in_executor(executor, search_api.start_replica)
+                await loop.run_in_executor(executor, search_api.load_snapshot)
+                start_snapshot_refresh()
+            except Exception as e:
+                logger.error(f"ASGI服务启动失败: {e}")
+                await send({"type": "lifespan.startup.failed", "message": str(e)})
+                return
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            change_bus.close_all()  # 结束推送连接，服务器不必等待它们超时
+            executor.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def reject_websocket(receive, send):
+    """WebSocket 连接在握手时关闭（ASGI 规定此时服务器以403响应）"""
+    message = await receive()
+    if message["type"] == "websocket.connect":
+        await send({"type": "websocket.close", "code": 1008})
+
+
+async def app(scope, receive, send):
+    """ASGI 入口"""
+    if scope["type"] == "lifespan":
+        await lifespan(scope, receive, send)
+    elif scope["type"] == "http":
+        if scope["path"] == "/api/stream/changes" and scope["method"] == "GET":
+            await stream_changes(scope, receive, send)
+        else:
+            await call_flask(scope, receive, send)
+    elif scope["type"] == "websocket":
+        await reject_websocket(receive, send)
+    else:
+        logger.warning(f"忽略不支持的连接类型: {scope['type']}")
+
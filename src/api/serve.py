@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+产品检索API 多进程服务
+用于生产环境，替代 search_api.py 自带的 Flask 开发服务器：
+
+- 主进程创建监听端口并加载候选集快照 (CatalogSnapshot)，然后 fork 出 IMS_WORKERS 个工作进程，
+  快照通过写时复制在所有工作进程间共享，每个工作进程内部再用线程处理并发请求
+- 主进程定期检查数据库：文件被替换（重建）时立即平滑重载；仅有库存写入时至多每
+  IMS_RELOAD_MIN_INTERVAL 秒重载一次。重载时先加载新快照并启动新一批工作进程，再让旧进程处理完
+  正在进行的请求后退出（SIGHUP 可手动触发重载）
+- 库存调整由主进程 fork 出的唯一写进程执行：工作进程把 /api/stock/adjust 的请求经本地套接字转发给它，
+  整个服务只有一个写线程合并提交（见 stock_writer.py），写进程不随重载重启
+- 工作进程和写进程意外退出时自动补齐
+- 不支持 fork 的平台（Windows）或 IMS_WORKERS=1 时以单进程多线程运行，快照在后台线程中刷新
+
+用法: cd src && IMS_WORKERS=4 python api/serve.py
+"""
+
+import os
+import sys
+import time
+import signal
+import socket
+import sqlite3
+import tempfile
+import threading
+import logging
+from multiprocessing.connection import Listener
+
+from werkzeug.serving import make_server
+from werkzeug.wsgi import ClosingIterator
+
+from search_api import app, search_api, change_bus, use_stock_writer, DB_PATH, DB_MODE
+from stock_writer import RemoteStockWriter, StockWriter, serve_writer_requests
+
+logger = logging.getLogger(__name__)
+
+HOST = os.environ.get("IMS_HOST", "0.0.0.0")
+PORT = int(os.environ.get("IMS_PORT", 5000))
+
+# 工作进程数，默认为CPU核数
+WORKERS = int(os.environ.get("IMS_WORKERS", os.cpu_count() or 1))
+
+# 检查数据库变化的间隔（秒）
+RELOAD_CHECK_INTERVAL = float(os.environ.get("IMS_RELOAD_CHECK_INTERVAL", 5))
+
+# 只有库存写入（文件未被替换）时两次重载的最小间隔（秒），避免收银高峰时频繁重载
+RELOAD_MIN_INTERVAL = float(os.environ.get("IMS_RELOAD_MIN_INTERVAL", 30))
+
+# 工作进程退出前等待进行中请求完成的最长时间（秒）
+GRACEFUL_TIMEOUT = float(os.environ.get("IMS_GRACEFUL_TIMEOUT", 30))
+
+# 工作进程检查主进程是否存活的间隔（秒）
+PARENT_CHECK_INTERVAL = 1
+
+
+class RequestCounter:
+    """统计进行中请求数的WSGI中间件（流式响应在传输结束后才计为完成）"""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self.active = 0
+        self._lock = threading.Lock()
+
+    def _done(self):
+        with self._lock:
+            self.active -= 1
+
+    def __call__(self, environ, start_response):
+        with self._lock:
+            self.active += 1
+        try:
+            result = self.wsgi_app(environ, start_response)
+        except Exception:
+            self._done()
+            raise
+        return ClosingIterator(result, self._done)
+
+
+def read_stamp():
+    """用临时连接读取数据库当前版本（不在主进程中保留任何SQLite连接）"""
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        return search_api.data_stamp(conn)
+    finally:
+        conn.close()
+
+
+def watch_parent(on_exit):
+    """主进程被强制结束时子进程也退出，否则会继续占用端口，重新启动的服务无法监听"""
+    master_pid = os.getppid()
+
+    def watch():
+        while os.getppid() == master_pid:
+            time.sleep(PARENT_CHECK_INTERVAL)
+        logger.warning(f"主进程 {master_pid} 已退出，进程 {os.getpid()} 停止")
+        on_exit()
+
+    threading.Thread(target=watch, name="parent-watch", daemon=True).start()
+
+
+def run_writer(listener: Listener):
+    """写进程：运行整个服务唯一的 StockWriter，处理工作进程转发的库存调整；
+    收到 SIGTERM 后等待已接收的请求提交完再退出"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    watch_parent(stopping.set)
+
+    writer = StockWriter(DB_PATH)
+    writer.start()
+    threading.Thread(target=serve_writer_requests, args=(listener, writer),
+                     name="stock-writer-accept", daemon=True).start()
+    logger.info(f"写进程 {os.getpid()} 已启动")
+    while not stopping.wait(1):
+        pass
+
+    done = writer.wait_idle(GRACEFUL_TIMEOUT)
+    logger.info(f"写进程 {os.getpid()} 退出 (未完成请求: {'无' if done else writer.queue.unfinished_tasks})")
+
+
+def run_worker(sock: socket.socket, writer_address: str = None, writer_authkey: bytes = None):
+    """工作进程：在继承的监听端口上处理请求，收到 SIGTERM 后停止接受新请求并等待进行中的请求完成
+
+    给出写进程地址时，库存调整转发给写进程执行。
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C 由主进程统一处理
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+    if writer_address is not None:
+        use_stock_writer(RemoteStockWriter(writer_address, writer_authkey))
+    if search_api.replica is not None:
+        search_api.start_replica()  # 内存副本不能跨 fork 共享，每个工作进程各自加载
+
+    counter = RequestCounter(app)
+    server = make_server(HOST, PORT, counter, threaded=True, fd=sock.fileno())
+
+    def drain(signum, frame):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+        change_bus.close_all()
+
+    signal.signal(signal.SIGTERM, drain)
+    watch_parent(lambda: drain(None, None))
+    logger.info(f"工作进程 {os.getpid()} 已启动")
+    server.serve_forever()
+
+    deadline = time.monotonic() + GRACEFUL_TIMEOUT
+    while counter.active > 0 and time.monotonic() < deadline:
+        time.sleep(0.1)
+    logger.info(f"工作进程 {os.getpid()} 退出 (未完成请求: {counter.active})")
+
+
+class Master:
+    """主进程：管理工作进程，检测数据变化并平滑重载"""
+
+    def __init__(self, sock: socket.socket, workers: int):
+        self.sock = sock
+        self.workers = workers
+        self.current = set()   # 当前一批工作进程
+        self.retiring = set()  # 正在退出的旧工作进程
+        self.stopping = False
+        self.reload_requested = False
+        self.last_reload = 0.0
+        # 写进程及其本地套接字（fork 之前创建，工作进程连接时写进程一定已在监听）
+        self.writer_pid = None
+        self.writer_address = os.path.join(tempfile.gettempdir(), f"ims-stock-writer-{os.getpid()}.sock")
+        self.writer_authkey = os.urandom(32)
+        self.writer_listener = None
+
+    def warm(self):
+        """在 fork 之前加载快照，工作进程继承后即为 warm 状态"""
+        search_api.load_snapshot()
+        self.last_reload = time.monotonic()
+
+    def fork(self, target, *args) -> int:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                target(*args)
+            except Exception as e:
+                logger.error(f"子进程异常退出: {e}")
+                code = 1
+            finally:
+                os._exit(code)
+        return pid
+
+    def spawn(self):
+        self.current.add(self.fork(run_worker, self.sock, self.writer_address, self.writer_authkey))
+
+    def spawn_writer(self):
+        if self.writer_listener is None:
+            if os.path.exists(self.writer_address):
+                os.remove(self.writer_address)
+            self.writer_listener = Listener(self.writer_address, family="AF_UNIX", backlog=128,
+                                            authkey=self.writer_authkey)
+        self.writer_pid = self.fork(run_writer, self.writer_listener)
+
+    def reload(self):
+        """加载新快照，启动新一批工作进程后让旧进程平滑退出"""
+        logger.info("数据已变化，重载工作进程...")
+        self.warm()
+        old = self.current
+        self.current = set()
+        for _ in range(self.workers):
+            self.spawn()
+        for pid in old:
+            self.signal_worker(pid, signal.SIGTERM)
+        self.retiring |= old
+
+    def signal_worker(self, pid: int, signum: int):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def reap(self):
+        """回收已退出的工作进程，意外退出的进程会被补齐"""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if pid == self.writer_pid:
+                self.writer_pid = None
+                if not self.stopping:
+                    logger.warning(f"写进程 {pid} 意外退出 (状态 {status})，正在重启")
+                    time.sleep(1)
+                    self.spawn_writer()
+            elif pid in self.retiring:
+                self.retiring.discard(pid)
+            elif pid in self.current:
+                self.current.discard(pid)
+                if not self.stopping:
+                    logger.warning(f"工作进程 {pid} 意外退出 (状态 {status})，正在重启")
+                    time.sleep(1)
+                    self.spawn()
+
+    def data_changed(self) -> bool:
+        """数据库是否变化到需要重载"""
+        snapshot = search_api.snapshot
+        stamp = read_stamp()
+        if snapshot is None or stamp == snapshot.stamp:
+            return False
+        if stamp[0] != snapshot.stamp[0]:
+            return True  # 文件被替换（重建）
+        return time.monotonic() - self.last_reload >= RELOAD_MIN_INTERVAL
+
+    def run(self):
+        signal.signal(signal.SIGHUP, lambda signum, frame: setattr(self, 'reload_requested', True))
+        signal.signal(signal.SIGTERM, lambda signum, frame: setattr(self, 'stopping', True))
+        signal.signal(signal.SIGINT, lambda signum, frame: setattr(self, 'stopping', True))
+
+        self.spawn_writer()
+        self.warm()
+        for _ in range(self.workers):
+            self.spawn()
+        logger.info(f"主进程 {os.getpid()} 已启动 {self.workers} 个工作进程和写进程: http://{HOST}:{PORT}")
+
+        next_check = time.monotonic() + RELOAD_CHECK_INTERVAL
+        while not self.stopping:
+            time.sleep(0.5)
+            self.reap()
+            if self.reload_requested:
+                self.reload_requested = False
+                self.reload()
+            elif time.monotonic() >= next_check:
+                next_check = time.monotonic() + RELOAD_CHECK_INTERVAL
+                try:
+                    if self.data_changed():
+                        self.reload()
+                except Exception as e:
+                    logger.error(f"检查数据库变化失败: {e}")
+
+        self.shutdown()
+
+    def stop(self, pids: set):
+        """向子进程发送 SIGTERM 并等待退出，超时后强制结束"""
+        for pid in pids:
+            self.signal_worker(pid, signal.SIGTERM)
+        deadline = time.monotonic() + GRACEFUL_TIMEOUT + 5
+        while pids and time.monotonic() < deadline:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                time.sleep(0.1)
+            else:
+                pids.discard(pid)
+        for pid in pids:
+            self.signal_worker(pid, signal.SIGKILL)
+
+    def shutdown(self):
+        # 先停止工作进程，不再有新的库存调整转发过来，再让写进程提交完已接收的请求
+        logger.info("正在停止工作进程...")
+        self.stop(self.current | self.retiring)
+        if self.writer_pid is not None:
+            logger.info("正在停止写进程...")
+            self.stop({self.writer_pid})
+        if self.writer_listener is not None:
+            self.writer_listener.close()
+
+
+def start_snapshot_refresh():
+    """后台线程按与多进程模式相同的规则刷新本进程的快照（单进程部署使用）"""
+
+    def refresh():
+        last_reload = time.monotonic()
+        while True:
+            time.sleep(RELOAD_CHECK_INTERVAL)
+            try:
+                snapshot = search_api.snapshot
+                stamp = read_stamp()
+                if snapshot is None or (stamp != snapshot.stamp and (
+                        stamp[0] != snapshot.stamp[0] or time.monotonic() - last_reload >= RELOAD_MIN_INTERVAL)):
+                    search_api.load_snapshot()
+                    last_reload = time.monotonic()
+            except Exception as e:
+                logger.error(f"刷新快照失败: {e}")
+
+    threading.Thread(target=refresh, name="snapshot-refresh", daemon=True).start()
+
+
+def serve_single():
+    """单进程多线程运行"""
+    if search_api.replica is not None:
+        search_api.start_replica()
+    search_api.load_snapshot()
+    start_snapshot_refresh()
+
+    server = make_server(HOST, PORT, app, threaded=True)
+    logger.info(f"单进程模式启动: http://{HOST}:{PORT}")
+    server.serve_forever()
+
+
+def main():
+    if not DB_PATH.exists():
+        logger.error(f"数据库文件不存在: {DB_PATH}")
+        print(f"错误: 数据库文件不存在: {DB_PATH}")
+        sys.exit(1)
+
+    logger.info(f"启动产品检索API服务 (数据库模式: {DB_MODE}, 工作进程: {WORKERS})...")
+    if WORKERS <= 1 or not hasattr(os, "fork"):
+        serve_single()
+        return
+
+    sock = socket.create_server((HOST, PORT), backlog=128)
+    sock.set_inheritable(True)
+    Master(sock, WORKERS).run()
+
+
+if __name__ == '__main__':
+    main()
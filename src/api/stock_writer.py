@@ -0,0 +1,330 @@
+"""
+库存写入
+POS 等客户端的库存调整（扣减 Stock、增加 Sold）统一交给单个写线程执行：
+请求先进入有界队列，写线程一次取出一批，在同一个事务中逐个应用（每个请求一个 SAVEPOINT，
+单个请求失败只回滚自身），最后一次提交（group commit）。
+
+数据库切换为 WAL 模式，写事务不会阻塞检索的读连接；写连接的 busy_timeout 有上限，
+遇到其他进程（如重建脚本）持有写锁时整批失败而不是无限等待。
+
+库存从正数变为 0 或负数时，StockStatus 由 instock 改为 outofstock；退货使库存重新大于 0 时
+由 outofstock 改回 instock（onbackorder 和未设置状态的记录不变，见 stock_status_after）。
+
+每次修改都会为记录分配新的变更序号 (change_seq)，增量同步接口据此返回变化的记录；
+目录统计表 catalog_stats 在同一事务中增量更新，状态变化的记录从旧分组移到新分组。
+
+多进程部署（api/serve.py）时整个服务只有一个写进程运行 StockWriter（serve_writer_requests），
+各工作进程用 RemoteStockWriter 把调整请求转发给它，仍然是单写线程和合并提交，
+不会出现多个进程的写线程争用写锁。
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+from pathlib import Path
+from typing import Dict, List
+
+from db_replica import file_identity
+from catalog_stats import apply_stock_change, has_catalog_stats, refresh_groups
+
+logger = logging.getLogger(__name__)
+
+# 写连接等待其他写锁的上限（毫秒）
+WRITE_BUSY_TIMEOUT_MS = int(os.environ.get("IMS_WRITE_BUSY_TIMEOUT_MS", 2000))
+
+# 写队列长度上限，队列满时新的请求直接拒绝
+WRITE_QUEUE_SIZE = int(os.environ.get("IMS_WRITE_QUEUE_SIZE", 1000))
+
+# 每次提交最多合并的请求数
+WRITE_BATCH_MAX = 200
+
+# 取到第一个请求后，再等待多久收集同一批的其他请求（秒）
+WRITE_BATCH_WINDOW = 0.002
+
+# 单个请求最多调整的SKU数
+ADJUST_MAX_ITEMS = 500
+
+# 工作进程同时转发给写进程的请求数上限
+REMOTE_WRITE_THREADS = 32
+
+
+class StockAdjustmentError(Exception):
+    """库存调整请求无法执行；status 为对应的HTTP状态码"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_adjustments(items) -> List[Dict]:
+    """校验并规范化调整项: [{"sku": str, "qty": int}, ...]，同一SKU的数量合并
+
+    qty 为售出数量：正数扣减 Stock 并增加 Sold，负数表示退货。
+    """
+    if not isinstance(items, list) or not items:
+        raise StockAdjustmentError("A non-empty 'items' array is required")
+    if len(items) > ADJUST_MAX_ITEMS:
+        raise StockAdjustmentError(f"At most {ADJUST_MAX_ITEMS} items per request")
+
+    merged = {}
+    for item in items:
+        if not isinstance(item, dict):
+            raise StockAdjustmentError("Each item must be a JSON object")
+        sku = item.get('sku')
+        qty = item.get('qty')
+        if not isinstance(sku, str) or not sku:
+            raise StockAdjustmentError("Each item needs a 'sku'")
+        if isinstance(qty, bool) or not isinstance(qty, int):
+            raise StockAdjustmentError(f"Invalid qty for {sku}: must be an integer")
+        merged[sku] = merged.get(sku, 0) + qty
+
+    return [{"sku": sku, "qty": qty} for sku, qty in merged.items() if qty != 0]
+
+
+def stock_status_after(stock_status, old_stock: int, new_stock: int):
+    """库存调整后的 StockStatus：只在库存跨过 0 时切换 instock/outofstock，其他状态保持不变"""
+    if stock_status == 'instock' and old_stock > 0 >= new_stock:
+        return 'outofstock'
+    if stock_status == 'outofstock' and old_stock <= 0 < new_stock:
+        return 'instock'
+    return stock_status
+
+
+class _WriteRequest:
+    def __init__(self, items: List[Dict], allow_negative: bool):
+        self.items = items
+        self.allow_negative = allow_negative
+        self.future = Future()
+
+
+class StockWriter:
+    """单写线程 + 有界队列的库存写入器"""
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+        self._conn = None
+        self._identity = None
+        self._track_changes = False
+        self._track_stats = False
+        self.listeners = []  # 每批提交成功后调用（如通知变更总线）
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """启动写线程（重复调用无影响）"""
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stock-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, items: List[Dict], allow_negative: bool = False) -> Future:
+        """提交一个调整请求，返回的 Future 在提交后给出每个SKU调整后的库存"""
+        self.start()
+        request = _WriteRequest(items, allow_negative)
+        try:
+            self.queue.put_nowait(request)
+        except queue.Full:
+            raise StockAdjustmentError("Stock writer is busy", status=503)
+        return request.future
+
+    def _connect(self):
+        """打开（或在数据库文件被替换后重新打开）写连接"""
+        identity = file_identity(self.db_path)
+        if self._conn is not None and identity and self._identity and identity[:2] == self._identity[:2]:
+            return self._conn
+
+        if self._conn is not None:
+            self._conn.close()
+        conn = sqlite3.connect(self.db_path, timeout=WRITE_BUSY_TIMEOUT_MS / 1000,
+                               isolation_level=None, check_same_thread=False)
+        conn.execute(f"PRAGMA busy_timeout = {WRITE_BUSY_TIMEOUT_MS}")
+        mode = conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+        if mode.lower() != 'wal':
+            logger.warning(f"无法切换到WAL模式，当前为 {mode}")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        # 旧版本 database_setup 构建的数据库没有变更跟踪表
+        self._track_changes = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sync_state'"
+        ).fetchone() is not None
+        self._track_stats = has_catalog_stats(conn)
+        self._conn, self._identity = conn, identity
+        return conn
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            try:
+                while len(batch) < WRITE_BATCH_MAX:
+                    batch.append(self.queue.get(timeout=WRITE_BATCH_WINDOW))
+            except queue.Empty:
+                pass
+            self._commit_batch(batch)
+            for _ in batch:
+                self.queue.task_done()
+
+    def wait_idle(self, timeout: float) -> bool:
+        """等待已提交的请求全部处理完（写进程退出前调用），返回是否全部完成"""
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return not self.queue.unfinished_tasks
+
+    def _commit_batch(self, batch: List[_WriteRequest]):
+        """在一个事务中应用一批请求并提交"""
+        results = []
+        try:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            # 拿到写锁后确认文件没有在此期间被重建脚本替换，否则写入会落到旧文件
+            identity = file_identity(self.db_path)
+            if identity is None or identity[:2] != self._identity[:2]:
+                conn.execute("ROLLBACK")
+                conn = self._connect()
+                conn.execute("BEGIN IMMEDIATE")
+
+            for request in batch:
+                conn.execute("SAVEPOINT adjust")
+                try:
+                    result = self._apply(conn, request)
+                    conn.execute("RELEASE adjust")
+                    results.append((request, result, None))
+                except StockAdjustmentError as e:
+                    conn.execute("ROLLBACK TO adjust")
+                    conn.execute("RELEASE adjust")
+                    results.append((request, None, e))
+
+            conn.execute("COMMIT")
+        except Exception as e:
+            logger.error(f"库存写入批次失败 ({len(batch)} 个请求): {e}")
+            if self._conn is not None and self._conn.in_transaction:
+                self._conn.execute("ROLLBACK")
+            if isinstance(e, sqlite3.OperationalError):
+                e = StockAdjustmentError(f"Database is busy: {e}", status=503)
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        for request, result, error in results:
+            if error is not None:
+                request.future.set_exception(error)
+            else:
+                request.future.set_result(result)
+
+        for listener in self.listeners:
+            try:
+                listener()
+            except Exception as e:
+                logger.error(f"库存提交通知失败: {e}")
+
+    def _apply(self, conn: sqlite3.Connection, request: _WriteRequest) -> List[Dict]:
+        updated = []
+        for item in request.items:
+            row = conn.execute(
+                "SELECT Stock, StockStatus, nCategory FROM products WHERE SKU = ?", (item['sku'],)
+            ).fetchone()
+            if row is None:
+                raise StockAdjustmentError(f"Unknown SKU: {item['sku']}", status=404)
+            old_stock, old_status, category = row[0] or 0, row[1], row[2]
+            new_stock = old_stock - item['qty']
+            if new_stock < 0 and not request.allow_negative:
+                raise StockAdjustmentError(f"Insufficient stock for {item['sku']}", status=409)
+            new_status = stock_status_after(old_status, old_stock, new_stock)
+
+            conn.execute(
+                """
+                UPDATE products
+                SET Stock = ?, Sold = Sold + ?, StockStatus = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE SKU = ?
+                """,
+                (new_stock, item['qty'], new_status, item['sku'])
+            )
+            if self._track_changes:
+                # 分配新的变更序号；row_hash 置空，下次重建时该记录一定视为已变化
+                conn.execute("UPDATE sync_state SET change_seq = change_seq + 1 WHERE id = 1")
+                conn.execute(
+                    """
+                    UPDATE products
+                    SET change_seq = (SELECT change_seq FROM sync_state WHERE id = 1), row_hash = NULL
+                    WHERE SKU = ?
+                    """,
+                    (item['sku'],)
+                )
+            if self._track_stats:
+                if new_status != old_status:
+                    refresh_groups(conn, [(old_status, category), (new_status, category)])
+                else:
+                    apply_stock_change(conn, old_status, category, old_stock, new_stock)
+            sold = conn.execute("SELECT Sold FROM products WHERE SKU = ?", (item['sku'],)).fetchone()[0]
+            updated.append({"sku": item['sku'], "stock": new_stock, "sold": sold,
+                            "stock_status": new_status})
+        return updated
+
+
+def serve_writer_requests(listener, writer: StockWriter):
+    """写进程：接收工作进程转发的调整请求 (items, allow_negative)，交给本进程唯一的写线程，
+    回复 ("ok", 结果) 或 ("error", 信息, 状态码)；每个连接一个线程，监听端口关闭后返回
+    """
+
+    def handle(conn):
+        try:
+            items, allow_negative = conn.recv()
+            try:
+                reply = ("ok", writer.submit(items, allow_negative).result())
+            except StockAdjustmentError as e:
+                reply = ("error", str(e), e.status)
+            except Exception as e:
+                logger.error(f"库存写入失败: {e}")
+                reply = ("error", str(e), 500)
+            conn.send(reply)
+        except (EOFError, OSError):
+            pass  # 工作进程已放弃等待
+        finally:
+            conn.close()
+
+    while True:
+        try:
+            conn = listener.accept()
+        except AuthenticationError as e:
+            logger.warning(f"拒绝未通过认证的写入连接: {e}")
+            continue
+        except OSError:
+            return
+        threading.Thread(target=handle, args=(conn,), name="stock-writer-request", daemon=True).start()
+
+
+class RemoteStockWriter:
+    """工作进程中代替 StockWriter：把调整请求转发给写进程（接口与 StockWriter 相同）"""
+
+    def __init__(self, address: str, authkey: bytes):
+        self.address = address
+        self.authkey = authkey
+        self.listeners = []  # 收到写进程的提交结果后调用
+        self._executor = ThreadPoolExecutor(max_workers=REMOTE_WRITE_THREADS, thread_name_prefix="stock-forward")
+
+    def submit(self, items: List[Dict], allow_negative: bool = False) -> Future:
+        """转发一个调整请求，返回的 Future 在写进程提交后给出每个SKU调整后的库存"""
+        return self._executor.submit(self._forward, items, allow_negative)
+
+    def _forward(self, items: List[Dict], allow_negative: bool) -> List[Dict]:
+        try:
+            with Client(self.address, authkey=self.authkey) as conn:
+                conn.send((items, allow_negative))
+                reply = conn.recv()
+        except (EOFError, OSError, AuthenticationError) as e:
+            raise StockAdjustmentError(f"Stock writer unavailable: {e}", status=503)
+        if reply[0] == "error":
+            raise StockAdjustmentError(reply[1], status=reply[2])
+
+        for listener in self.listeners:
+            try:
+                listener()
+            except Exception as e:
+                logger.error(f"库存提交通知失败: {e}")
+        return reply[1]
@@ -3,6 +3,8 @@ import pandas as pd
 import os
 from pathlib import Path
 
+from csv_cache import CsvCache, source_key
+
 # 设置页面配置
 st.set_page_config(
     page_title="库存管理系统",
@@ -26,15 +28,19 @@ def load_csv_files():
             csv_files.append(file.name)
     return csv_files
 
-def read_csv_file(filename):
-    """读取指定的 CSV 文件"""
+def open_csv_file(filename):
+    """打开指定 CSV 文件的列式缓存（首次打开或文件变化后解析一次，之后按需读取列和行）"""
     try:
-        file_path = DATA_RAW_PATH / filename
-        df = pd.read_csv(file_path, encoding='utf-8')
-        return df, None
+        return CsvCache(DATA_RAW_PATH / filename), None
     except Exception as e:
         return None, str(e)
 
+@st.cache_data(max_entries=1, show_spinner=False)
+def read_file_bytes(path, key):
+    """原文件内容（供下载按钮使用）；key 为文件的大小-修改时间，文件不变时重新运行不再读取文件"""
+    with open(path, 'rb') as f:
+        return f.read()
+
 # 侧边栏 - 文件选择
 st.sidebar.header("📁 文件选择")
 
@@ -56,8 +62,8 @@ else:
         if selected_file:
             st.sidebar.success(f"已选择: {selected_file}")
 
-            # 读取文件
-            df, error = read_csv_file(selected_file)
+            # 打开文件缓存
+            cache, error = open_csv_file(selected_file)
 
             if error:
                 st.error(f"读取文件失败: {error}")
@@ -67,39 +73,50 @@ else:
 
                 col1, col2, col3 = st.columns(3)
                 with col1:
-                    st.metric("行数", len(df))
+                    st.metric("行数", cache.rows)
                 with col2:
-                    st.metric("列数", len(df.columns))
+                    st.metric("列数", len(cache.columns))
                 with col3:
                     st.metric("文件大小", f"{os.path.getsize(DATA_RAW_PATH / selected_file)} bytes")
 
-                # 显示数据预览
-                st.subheader("数据预览")
-
-                # 显示列信息
+                # 显示列信息（逐列统计，结果写入缓存，只在需要时计算）
                 st.subheader("📋 列信息")
-                col_info = pd.DataFrame({
-                    '列名': df.columns,
-                    '数据类型': df.dtypes.astype(str),
-                    '非空值数量': df.count(),
-                    '空值数量': df.isnull().sum()
-                })
-                st.dataframe(col_info, use_container_width=True)
-
-                # 显示数据内容
+                if st.checkbox("显示列统计", key="show_column_stats"):
+                    stats = cache.column_stats()
+                    col_info = pd.DataFrame({
+                        '列名': [item['column'] for item in stats],
+                        '数据类型': [item['dtype'] for item in stats],
+                        '非空值数量': [item['non_null'] for item in stats],
+                        '空值数量': [item['null'] for item in stats]
+                    })
+                    st.dataframe(col_info, use_container_width=True)
+
+                # 显示数据内容（只读取选中的列和当前页的行）
                 st.subheader("📄 数据内容")
 
-                # 添加显示行数选择
-                show_rows = st.selectbox("显示行数", [10, 50, 100, "全部"], key="show_rows")
+                selected_columns = st.multiselect(
+                    "显示列", cache.columns, default=cache.columns, key=f"columns_{selected_file}"
+                )
 
+                col1, col2 = st.columns(2)
+                with col1:
+                    show_rows = st.selectbox("显示行数", [10, 50, 100, "全部"], key="show_rows")
                 if show_rows == "全部":
-                    st.dataframe(df, use_container_width=True)
+                    start, stop = 0, cache.rows
                 else:
-                    st.dataframe(df.head(show_rows), use_container_width=True)
+                    total_pages = max(1, (cache.rows + show_rows - 1) // show_rows)
+                    with col2:
+                        page = st.number_input("页码", min_value=1, max_value=total_pages, value=1,
+                                               key=f"page_{selected_file}")
+                    start = (page - 1) * show_rows
+                    stop = start + show_rows
+
+                st.dataframe(cache.read(selected_columns, start, stop), use_container_width=True)
 
-                # 下载功能
+                # 下载功能（原文件内容，无需重新生成CSV）
                 st.subheader("⬇️ 下载处理后的数据")
-                csv = df.to_csv(index=False)
+                file_path = DATA_RAW_PATH / selected_file
+                csv = read_file_bytes(str(file_path), source_key(file_path))
                 st.download_button(
                     label="下载 CSV 文件",
                     data=csv,
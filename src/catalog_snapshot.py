@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+产品目录列式快照
+导入完成后把 products 表导出为按 nCategory/SU 分区的列式快照（默认 data/snapshot，可用 IMS_SNAPSHOT_DIR 指定），
+分析脚本通过 read_products 只读取所需的列和分区，不再每次用 pd.read_sql_query 拉取整张表。
+
+- 每个分区存为一个 Parquet 文件（需要 pyarrow），可用 pandas/pyarrow/DuckDB 等标准工具直接读取
+- 每次导出写入以数据库版本 (generation-change_seq) 命名的新目录，再原子替换 manifest.json 指向它；
+  保留最近 KEEP_VERSIONS 个版本，正在读取旧版本的脚本不受影响
+- manifest.json 记录数据库版本、列和类型、全部分区（分区值、目录、记录数）
+- 快照对应最近一次导入：库存接口的写入（Stock/Sold/StockStatus）不会使其过期，分析得到的是导入时的库存；
+  重新导入（generation 变化）或 products 表的列变化后快照过期，read_products 改为直接查询数据库，重新导出后恢复。
+  需要包含库存写入的快照时再运行一次导出（change_seq 变化时导出新版本）
+
+用法:
+    python catalog_snapshot.py          # 导出快照
+    python catalog_snapshot.py --info   # 查看当前快照
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import time
+from typing import Dict, List, Optional
+from urllib.parse import quote
+
+from csv_cache import write_json
+
+DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'inventory.db')
+SNAPSHOT_DIR = os.environ.get('IMS_SNAPSHOT_DIR', os.path.join(os.path.dirname(__file__), '..', 'data', 'snapshot'))
+
+# 分区字段（依次为目录层级）
+PARTITION_COLUMNS = ['nCategory', 'SU']
+
+# 保留的快照版本数
+KEEP_VERSIONS = 2
+
+MANIFEST_FILE = 'manifest.json'
+PARQUET_FILE = 'data.parquet'
+
+
+def database_version(conn: sqlite3.Connection) -> Optional[Dict]:
+    """数据库版本 {generation, change_seq}；没有变更跟踪信息的旧数据库为 None"""
+    try:
+        row = conn.execute("SELECT generation, change_seq FROM sync_state WHERE id = 1").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return {"generation": row[0], "change_seq": row[1]} if row else None
+
+
+def partition_path(values: Dict[str, str]) -> str:
+    """分区目录，如 nCategory=Artificial%20Flowers/SU=AB"""
+    return '/'.join(f"{column}={quote(values[column], safe='')}" for column in PARTITION_COLUMNS)
+
+
+def load_manifest(snapshot_dir: str = SNAPSHOT_DIR) -> Optional[Dict]:
+    try:
+        with open(os.path.join(snapshot_dir, MANIFEST_FILE), 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def snapshot_is_current(manifest: Optional[Dict], db_path: str = DB_PATH, exact: bool = False) -> bool:
+    """快照是否由该数据库的当前导入 (generation) 导出且 products 表的列一致
+
+    exact 为 True 时还要求 change_seq 相同（即包含之后的库存写入），导出时据此判断是否需要重新导出。
+    """
+    if not manifest or not manifest.get("version") or manifest.get("format") != "parquet":
+        return False
+    if not os.path.exists(db_path) or manifest.get("source") != os.path.realpath(db_path):
+        return False
+    conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+    try:
+        version = database_version(conn)
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(products)")]
+    finally:
+        conn.close()
+    if version is None or columns != manifest.get("columns"):
+        return False
+    if exact:
+        return version == manifest["version"]
+    return version["generation"] == manifest["version"]["generation"]
+
+
+def write_partition(df, path: str):
+    os.makedirs(path)
+    df.to_parquet(os.path.join(path, PARQUET_FILE), index=False)
+
+
+def read_partition(path: str, columns: List[str]):
+    import pandas as pd
+
+    return pd.read_parquet(os.path.join(path, PARQUET_FILE), columns=columns)
+
+
+def export_snapshot(db_path: str = DB_PATH, snapshot_dir: str = SNAPSHOT_DIR) -> Dict:
+    """导出 products 表的分区快照，返回 manifest；数据库版本 (generation, change_seq) 与当前快照相同时不重新导出"""
+    import pandas as pd
+
+    started = time.monotonic()
+    conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+    try:
+        version = database_version(conn)
+        current = load_manifest(snapshot_dir)
+        if version and snapshot_is_current(current, db_path, exact=True):
+            return current
+        df = pd.read_sql_query("SELECT * FROM products", conn)
+    finally:
+        conn.close()
+
+    name = f"{version['generation']}-{version['change_seq']}" if version else f"unversioned-{int(time.time())}"
+    version_dir = os.path.join(snapshot_dir, name)
+    tmp_dir = f"{version_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    partitions = []
+    keys = df[PARTITION_COLUMNS].fillna('').astype(str)
+    for values, part in df.groupby([keys[column] for column in PARTITION_COLUMNS], sort=True):
+        values = dict(zip(PARTITION_COLUMNS, values))
+        path = partition_path(values)
+        write_partition(part, os.path.join(tmp_dir, path))
+        partitions.append({"values": values, "path": path, "rows": len(part)})
+
+    shutil.rmtree(version_dir, ignore_errors=True)
+    os.replace(tmp_dir, version_dir)
+
+    manifest = {
+        "version": version,
+        "created_at": time.strftime('%Y-%m-%d %H:%M:%S'),
+        "source": os.path.realpath(db_path),
+        "path": name,
+        "format": "parquet",
+        "rows": len(df),
+        "columns": [str(column) for column in df.columns],
+        "dtypes": [str(dtype) for dtype in df.dtypes],
+        "partition_by": PARTITION_COLUMNS,
+        "partitions": partitions,
+        "elapsed": round(time.monotonic() - started, 2),
+    }
+    write_json(os.path.join(snapshot_dir, MANIFEST_FILE), manifest)
+    remove_old_versions(snapshot_dir, name)
+    return manifest
+
+
+def remove_old_versions(snapshot_dir: str, current: str):
+    """只保留最近 KEEP_VERSIONS 个版本目录（按修改时间）"""
+    entries = [entry for entry in os.listdir(snapshot_dir)
+               if os.path.isdir(os.path.join(snapshot_dir, entry)) and '.tmp-' not in entry]
+    entries.sort(key=lambda entry: os.path.getmtime(os.path.join(snapshot_dir, entry)), reverse=True)
+    kept = [current] + [entry for entry in entries if entry != current][:KEEP_VERSIONS - 1]
+    for entry in entries:
+        if entry not in kept:
+            shutil.rmtree(os.path.join(snapshot_dir, entry), ignore_errors=True)
+
+
+def read_snapshot(columns: List[str] = None, filters: Dict[str, List[str]] = None,
+                  snapshot_dir: str = SNAPSHOT_DIR, manifest: Dict = None):
+    """从快照读取指定列；filters 为 {分区字段: 取值列表}，只读取匹配的分区"""
+    import pandas as pd
+
+    manifest = manifest or load_manifest(snapshot_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"没有快照: {snapshot_dir}")
+    columns = list(columns) if columns is not None else manifest["columns"]
+    unknown = [column for column in (filters or {}) if column not in manifest["partition_by"]]
+    if unknown:
+        raise ValueError(f"只能按分区字段筛选: {', '.join(unknown)}")
+    wanted = {column: {str(value) for value in values} for column, values in (filters or {}).items()}
+
+    base = os.path.join(snapshot_dir, manifest["path"])
+    frames = [
+        read_partition(os.path.join(base, partition["path"]), columns)
+        for partition in manifest["partitions"]
+        if all(partition["values"][column] in values for column, values in wanted.items())
+    ]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
+
+
+def read_products(columns: List[str] = None, filters: Dict[str, List[str]] = None,
+                  db_path: str = DB_PATH, snapshot_dir: str = SNAPSHOT_DIR):
+    """分析脚本读取产品数据的入口：快照对应数据库的当前导入时读取快照，否则直接查询数据库
+
+    filters 只能使用分区字段；快照中的记录按分区排列，数据库查询按 id 排列。
+    """
+    import pandas as pd
+
+    unknown = [column for column in (filters or {}) if column not in PARTITION_COLUMNS]
+    if unknown:
+        raise ValueError(f"只能按分区字段筛选: {', '.join(unknown)}")
+
+    manifest = load_manifest(snapshot_dir)
+    if snapshot_is_current(manifest, db_path):
+        return read_snapshot(columns, filters, snapshot_dir, manifest)
+
+    conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+    try:
+        selected = ', '.join(f'"{column}"' for column in columns) if columns else '*'
+        clauses, params = [], []
+        for column, values in (filters or {}).items():
+            clauses.append(f"COALESCE(\"{column}\", '') IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps([str(value) for value in values]))
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return pd.read_sql_query(f"SELECT {selected} FROM products{where} ORDER BY id", conn, params=params)
+    finally:
+        conn.close()
+
+
+def print_manifest(manifest: Optional[Dict], db_path: str = DB_PATH):
+    if manifest is None:
+        print("没有快照，运行 python catalog_snapshot.py 导出")
+        return
+    print(f"快照版本: {manifest['version']}  ({manifest['created_at']}, {manifest['format']})")
+    print(f"记录数: {manifest['rows']}  列数: {len(manifest['columns'])}  分区数: {len(manifest['partitions'])}")
+    if snapshot_is_current(manifest, db_path, exact=True):
+        state = '是'
+    elif snapshot_is_current(manifest, db_path):
+        state = '是（不含导出后的库存写入）'
+    else:
+        state = '否（需要重新导出）'
+    print(f"与数据库一致: {state}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--info":
+        print_manifest(load_manifest())
+    else:
+        manifest = export_snapshot()
+        print(f"快照已导出: {os.path.join(SNAPSHOT_DIR, manifest['path'])}")
+        print_manifest(manifest)
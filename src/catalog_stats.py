@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+产品目录统计
+按 (StockStatus, nCategory) 分组的汇总表 catalog_stats：构建数据库时扫描一次 products 生成，
+库存写入时在同一事务中增量更新（库存状态随之变化时重新计算新旧两个分组）。
+统计报表和 /api/stats 只读取这张几十行的小表，不再对 products 执行多次全表聚合。
+
+没有 catalog_stats 表的旧数据库，按同样的分组扫描一次 products 得到相同的结果。
+"""
+
+import sqlite3
+from typing import Dict, List, Optional
+
+STATS_TABLE_SQL = """
+CREATE TABLE catalog_stats (
+    StockStatus TEXT,
+    nCategory TEXT,
+    product_count INTEGER NOT NULL,
+    stock_count INTEGER NOT NULL,     -- Stock 不为空的记录数（平均库存的分母）
+    stock_sum INTEGER,
+    stock_min INTEGER,
+    stock_max INTEGER,
+    in_stock_count INTEGER NOT NULL,  -- Stock > 0 的记录数
+    price_count INTEGER NOT NULL,     -- Price > 0 的记录数
+    price_sum REAL,
+    price_min REAL,
+    price_max REAL
+)
+"""
+
+# 一次扫描按分组计算全部汇总值
+GROUP_STATS_SELECT = """
+SELECT
+    StockStatus,
+    nCategory,
+    COUNT(*) AS product_count,
+    COUNT(Stock) AS stock_count,
+    SUM(Stock) AS stock_sum,
+    MIN(Stock) AS stock_min,
+    MAX(Stock) AS stock_max,
+    SUM(CASE WHEN Stock > 0 THEN 1 ELSE 0 END) AS in_stock_count,
+    SUM(CASE WHEN Price > 0 THEN 1 ELSE 0 END) AS price_count,
+    SUM(CASE WHEN Price > 0 THEN Price END) AS price_sum,
+    MIN(CASE WHEN Price > 0 THEN Price END) AS price_min,
+    MAX(CASE WHEN Price > 0 THEN Price END) AS price_max
+FROM products
+"""
+
+GROUP_STATS_SQL = GROUP_STATS_SELECT + "GROUP BY StockStatus, nCategory"
+
+STATS_COLUMNS = ["StockStatus", "nCategory", "product_count", "stock_count", "stock_sum", "stock_min",
+                 "stock_max", "in_stock_count", "price_count", "price_sum", "price_min", "price_max"]
+
+
+def has_catalog_stats(conn: sqlite3.Connection) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'catalog_stats'"
+    ).fetchone() is not None
+
+
+def build_catalog_stats(conn: sqlite3.Connection):
+    """扫描 products 重新生成 catalog_stats（调用方负责提交）"""
+    conn.execute("DROP TABLE IF EXISTS catalog_stats")
+    conn.execute(STATS_TABLE_SQL)
+    conn.execute(f"INSERT INTO catalog_stats ({', '.join(STATS_COLUMNS)}) {GROUP_STATS_SQL}")
+
+
+def read_group_stats(conn: sqlite3.Connection) -> List[Dict]:
+    """读取分组汇总；没有 catalog_stats 表时扫描一次 products"""
+    if has_catalog_stats(conn):
+        sql = f"SELECT {', '.join(STATS_COLUMNS)} FROM catalog_stats"
+    else:
+        sql = GROUP_STATS_SQL
+    return [dict(zip(STATS_COLUMNS, row)) for row in conn.execute(sql)]
+
+
+def summarize(groups: List[Dict]) -> Dict:
+    """由分组汇总合并出报表的全部统计值"""
+    status_counts, category_counts = {}, {}
+    for group in groups:
+        status_counts[group["StockStatus"]] = status_counts.get(group["StockStatus"], 0) + group["product_count"]
+        if group["nCategory"]:
+            category_counts[group["nCategory"]] = category_counts.get(group["nCategory"], 0) + group["product_count"]
+
+    def total(column):
+        return sum(group[column] or 0 for group in groups)
+
+    def extreme(column, func):
+        values = [group[column] for group in groups if group[column] is not None]
+        return func(values) if values else None
+
+    stock_count, price_count = total("stock_count"), total("price_count")
+    return {
+        "total_products": total("product_count"),
+        "stock_status": dict(sorted(status_counts.items(), key=lambda item: item[1], reverse=True)),
+        "categories": dict(sorted(category_counts.items(), key=lambda item: item[1], reverse=True)),
+        "stock": {
+            "total": total("stock_sum") if stock_count else None,
+            "avg": total("stock_sum") / stock_count if stock_count else None,
+            "min": extreme("stock_min", min),
+            "max": extreme("stock_max", max),
+        },
+        "price": {
+            "avg": total("price_sum") / price_count if price_count else None,
+            "min": extreme("price_min", min),
+            "max": extreme("price_max", max),
+        },
+        "outofstock": status_counts.get("outofstock", 0),
+        "in_stock": total("in_stock_count"),
+    }
+
+
+def catalog_summary(conn: sqlite3.Connection) -> Dict:
+    """目录统计（报表和 /api/stats 共用）"""
+    return summarize(read_group_stats(conn))
+
+
+def apply_stock_change(conn: sqlite3.Connection, stock_status: Optional[str], category: Optional[str],
+                       old_stock: int, new_stock: int):
+    """库存写入后增量更新所在分组的汇总（在写事务内调用）
+
+    总量和有库存计数直接按差值更新；原值恰好是分组的最小/最大值且向内移动时，
+    该分组的最小/最大值需要重新计算，只扫描这一分组。
+    """
+    if old_stock == new_stock:
+        return
+    group = (stock_status, category)
+    conn.execute(
+        """
+        UPDATE catalog_stats
+        SET stock_sum = stock_sum + ?,
+            in_stock_count = in_stock_count + ?,
+            stock_min = MIN(stock_min, ?),
+            stock_max = MAX(stock_max, ?)
+        WHERE StockStatus IS ? AND nCategory IS ?
+        """,
+        (new_stock - old_stock, (new_stock > 0) - (old_stock > 0), new_stock, new_stock) + group
+    )
+
+    row = conn.execute(
+        "SELECT stock_min, stock_max FROM catalog_stats WHERE StockStatus IS ? AND nCategory IS ?", group
+    ).fetchone()
+    if row is None:
+        return
+    stock_min, stock_max = row
+    if (old_stock == stock_min and new_stock > old_stock) or (old_stock == stock_max and new_stock < old_stock):
+        conn.execute(
+            """
+            UPDATE catalog_stats
+            SET (stock_min, stock_max) = (
+                SELECT MIN(Stock), MAX(Stock) FROM products WHERE StockStatus IS ? AND nCategory IS ?
+            )
+            WHERE StockStatus IS ? AND nCategory IS ?
+            """,
+            group + group
+        )
+
+
+def refresh_groups(conn: sqlite3.Connection, groups):
+    """重新计算指定 (StockStatus, nCategory) 分组的汇总（在写事务内调用）
+
+    库存写入改变了记录的 StockStatus 时使用：记录从旧分组移到新分组，只扫描这两个分组；
+    没有记录的分组删除，新出现的分组插入。
+    """
+    for status, category in dict.fromkeys(groups):
+        conn.execute("DELETE FROM catalog_stats WHERE StockStatus IS ? AND nCategory IS ?", (status, category))
+        conn.execute(
+            f"INSERT INTO catalog_stats ({', '.join(STATS_COLUMNS)}) {GROUP_STATS_SELECT}"
+            "WHERE StockStatus IS ? AND nCategory IS ? GROUP BY StockStatus, nCategory",
+            (status, category)
+        )
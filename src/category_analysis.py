@@ -2,11 +2,33 @@
 # -*- coding: utf-8 -*-
 """
 分类系统分析脚本 - 验证新旧分类系统的对应关系
+
+用法:
+    python category_analysis.py                     # 分类统计报告
+    python category_analysis.py --diff [diff.json]  # 与分类表、映射表比对，输出JSON差异
+
+--diff 模式只扫描一次 products（按 CatCode、nCategory、nSubCategory 分组），
+与 product_categories 表（缺失时读取 data/raw/CSNEW.csv）和 data/category_mapping.csv
+做集合运算：
+- unknown_codes      产品使用但分类表中没有的 CatCode
+- orphaned_codes     分类表中没有任何产品使用的 CatCode
+- renames            产品的 nCategory/nSubCategory 与分类表中同一 CatCode 的名称不同
+- unmapped_codes     产品使用但映射表中没有的 CatCode
+- stale_mappings     映射表中与分类表不一致（CatCode 不存在或名称不同）的条目
+- invalid_codes      CatCode 为空或不是数字的产品
+CatCode 按数值比较（products 中的 CatCode 丢失了前导零，如 "8" 与 "008"），输出统一为3位。
 """
 
+import csv
+import json
 import sqlite3
-import pandas as pd
 import os
+import sys
+from typing import Dict, Optional, Set, Tuple
+
+DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'inventory.db')
+CATEGORIES_CSV = os.path.join(os.path.dirname(__file__), '..', 'data', 'raw', 'CSNEW.csv')
+MAPPING_CSV = os.path.join(os.path.dirname(__file__), '..', 'data', 'category_mapping.csv')
 
 def analyze_categories():
     """分析产品分类系统"""
@@ -128,5 +150,117 @@ def analyze_categories():
     finally:
         conn.close()
 
+def code_key(value) -> Optional[int]:
+    """CatCode 转换为整数，空值和非数字为 None"""
+    text = str(value or '').strip()
+    return int(text) if text.isdigit() else None
+
+
+def format_code(code: int) -> str:
+    return f"{code:03d}"
+
+
+def load_reference_categories(conn: sqlite3.Connection) -> Dict[int, Tuple[str, str]]:
+    """权威分类表 {CatCode: (nCategory, nSubCategory)}；数据库中没有 product_categories 时读取 CSNEW.csv"""
+    try:
+        rows = conn.execute("SELECT cat_code, ncategory, nsubcategory FROM product_categories").fetchall()
+    except sqlite3.OperationalError:
+        with open(CATEGORIES_CSV, 'r', encoding='utf-8') as file:
+            rows = [(row['CatCode'], row['nCategory'], row['nSubCategory']) for row in csv.DictReader(file)]
+    return {code_key(code): (category.strip(), subcategory.strip())
+            for code, category, subcategory in rows if code_key(code) is not None}
+
+
+def load_category_mapping(mapping_path: str = MAPPING_CSV) -> Set[Tuple[int, str, str]]:
+    """映射表 category_mapping.csv 的 (CatCode, nCategory, nSubCategory) 集合"""
+    with open(mapping_path, 'r', encoding='utf-8') as file:
+        return {(code_key(row['CatCode']), row['nCategory'].strip(), row['nSubCategory'].strip())
+                for row in csv.DictReader(file) if code_key(row['CatCode']) is not None}
+
+
+def scan_product_categories(conn: sqlite3.Connection) -> Dict[Tuple[str, str, str], int]:
+    """一次扫描 products，返回 {(CatCode, nCategory, nSubCategory): 产品数}"""
+    cursor = conn.execute("""
+        SELECT TRIM(COALESCE(CatCode, '')), TRIM(COALESCE(nCategory, '')), TRIM(COALESCE(nSubCategory, '')),
+               COUNT(*)
+        FROM products
+        GROUP BY 1, 2, 3
+    """)
+    return {(code, category, subcategory): count for code, category, subcategory, count in cursor}
+
+
+def category_diff(db_path: str = DB_PATH, mapping_path: str = MAPPING_CSV) -> Dict:
+    """比对产品分类与分类表、映射表，返回可序列化为JSON的差异"""
+    conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+    try:
+        groups = scan_product_categories(conn)
+        reference = load_reference_categories(conn)
+    finally:
+        conn.close()
+    mapping = load_category_mapping(mapping_path)
+
+    product_codes: Dict[int, int] = {}
+    invalid: Dict[str, int] = {}
+    for (raw_code, _, _), count in groups.items():
+        code = code_key(raw_code)
+        if code is None:
+            invalid[raw_code] = invalid.get(raw_code, 0) + count
+        else:
+            product_codes[code] = product_codes.get(code, 0) + count
+
+    used, known = set(product_codes), set(reference)
+    mapped = {code for code, _, _ in mapping}
+
+    renames = []
+    for (raw_code, category, subcategory), count in sorted(groups.items()):
+        code = code_key(raw_code)
+        if code in known and (category, subcategory) != reference[code]:
+            expected_category, expected_subcategory = reference[code]
+            renames.append({
+                "cat_code": format_code(code),
+                "field": "nSubCategory" if category == expected_category else "nCategory",
+                "expected": {"nCategory": expected_category, "nSubCategory": expected_subcategory},
+                "actual": {"nCategory": category, "nSubCategory": subcategory},
+                "products": count,
+            })
+
+    stale = []
+    for code, category, subcategory in sorted(mapping):
+        if reference.get(code) != (category, subcategory):
+            stale.append({
+                "cat_code": format_code(code),
+                "mapping": {"nCategory": category, "nSubCategory": subcategory},
+                "table": dict(zip(("nCategory", "nSubCategory"), reference[code])) if code in known else None,
+            })
+
+    diff = {
+        "products": sum(groups.values()),
+        "reference_codes": len(known),
+        "mapping_entries": len(mapping),
+        "unknown_codes": [{"cat_code": format_code(code), "products": product_codes[code]}
+                          for code in sorted(used - known)],
+        "orphaned_codes": [{"cat_code": format_code(code), "nCategory": reference[code][0],
+                            "nSubCategory": reference[code][1]} for code in sorted(known - used)],
+        "renames": renames,
+        "unmapped_codes": [{"cat_code": format_code(code), "products": product_codes[code]}
+                           for code in sorted(used - mapped)],
+        "stale_mappings": stale,
+        "invalid_codes": [{"CatCode": code, "products": count} for code, count in sorted(invalid.items())],
+    }
+    diff["summary"] = {key: len(value) for key, value in diff.items() if isinstance(value, list)}
+    return diff
+
+
 if __name__ == "__main__":
-    analyze_categories()
\ No newline at end of file
+    if len(sys.argv) > 1 and sys.argv[1] == "--diff":
+        diff = category_diff()
+        text = json.dumps(diff, ensure_ascii=False, indent=2)
+        if len(sys.argv) > 2:
+            with open(sys.argv[2], 'w', encoding='utf-8') as file:
+                file.write(text)
+            print(f"差异已写入: {sys.argv[2]}")
+            print(json.dumps(diff["summary"], ensure_ascii=False))
+        else:
+            print(text)
+    else:
+        analyze_categories()
\ No newline at end of file
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+整数分类键
+products 带有两个整数键（都有索引），构建数据库时生成：
+- cat_code：指向 product_categories.cat_code 的分类码，由 CatCode 字段得出（CatCode 为空时取SKU中的分类码），
+  用于按分类码关联分类表（校验、分类导入）
+- name_id：指向 category_names 的名称键，category_names 是产品自身 (nCategory, nSubCategory) 的全部组合
+
+按分类/子分类名称筛选时，名称先在几百行的 category_names 中解析为 name_id（不相关的 IN 子查询
+SQLite 只计算一次），products 上只比较整数，不再逐行比较 'Artificial Flower Arrangements' 这样的长文本。
+名称键取自产品记录本身显示的名称，筛选结果与按文本比较完全相同；产品名称与分类表不一致的记录
+（见 sku_validation.py、category_analysis.py --diff）仍按其自身的名称筛选和显示。
+没有 name_id 列的旧数据库仍按名称文本筛选，重新运行 database_setup.py 后改用名称键。
+"""
+
+import json
+import re
+import sqlite3
+from typing import List, Optional, Set, Tuple
+
+# CSNEW.csv 的字段与 product_categories 的列
+CATEGORY_CSV_COLUMNS = {'CatCode': 'cat_code', 'nCategory': 'ncategory', 'nSubCategory': 'nsubcategory'}
+
+# SKU = 供应商字母 + 3位分类码 + 5位型号码
+SKU_CAT_CODE = re.compile(r'^[A-Z](\d{3})\d{5}$')
+
+CATEGORY_NAMES_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS category_names (
+    name_id INTEGER PRIMARY KEY,
+    nCategory TEXT NOT NULL,
+    nSubCategory TEXT NOT NULL,
+    UNIQUE (nCategory, nSubCategory)
+)
+"""
+
+
+def has_category_keys(conn: sqlite3.Connection) -> bool:
+    """products 表是否带有整数名称键 name_id"""
+    return any(row[1] == 'name_id' for row in conn.execute("PRAGMA table_info(products)"))
+
+
+def product_cat_codes(cat_codes, skus, category_codes: Set[int]) -> List[Optional[int]]:
+    """每条产品的整数分类码：取 CatCode 字段（CSV中丢失了前导零），为空时取SKU中的分类码；
+    不在分类表中的为 None。构建数据库和导入分类表时共用"""
+    import pandas as pd
+
+    cat_codes = pd.Series(list(cat_codes), dtype=object)
+    codes = []
+    for value, text, sku in zip(pd.to_numeric(cat_codes, errors='coerce'),
+                                cat_codes.fillna('').astype(str), pd.Series(list(skus)).fillna('').astype(str)):
+        if not text.strip():
+            match = SKU_CAT_CODE.match(sku.strip())
+            value = int(match.group(1)) if match else None
+        code = int(value) if value is not None and value == value and value % 1 == 0 else None
+        codes.append(code if code in category_codes else None)
+    return codes
+
+
+def category_name_ids(categories, subcategories):
+    """为每条产品的 (nCategory, nSubCategory) 分配名称键
+
+    返回 (name_ids, names)：name_ids 与输入一一对应（从1开始），names 为 [(name_id, nCategory, nSubCategory), ...]，
+    按名称排序，可直接插入 category_names。
+    """
+    import pandas as pd
+
+    pairs = pd.MultiIndex.from_arrays([pd.Series(categories).fillna('').astype(str),
+                                       pd.Series(subcategories).fillna('').astype(str)])
+    codes, uniques = pd.factorize(pairs, sort=True)
+    names = [(name_id, category, subcategory) for name_id, (category, subcategory) in enumerate(uniques, start=1)]
+    return [int(code) + 1 for code in codes], names
+
+
+def category_filter(category: Optional[str], subcategories: Optional[List[str]],
+                    keyed: bool = True) -> Tuple[str, List]:
+    """分类/子分类筛选的WHERE片段（以 " AND" 开头）和参数，没有筛选条件时为 ("", [])
+
+    keyed 为真时名称解析为名称键后按 name_id 筛选，否则按 nCategory/nSubCategory 文本筛选，两者结果相同。
+    子分类列表作为一个JSON数组参数绑定，SQL文本与列表长度无关。
+    """
+    subcategories = list(subcategories or [])
+    conditions, params = [], []
+    if category:
+        conditions.append("nCategory = ?")
+        params.append(category)
+    if subcategories:
+        conditions.append("nSubCategory IN (SELECT value FROM json_each(?))")
+        params.append(json.dumps(subcategories))
+
+    if not conditions:
+        return "", []
+    if not keyed:
+        return "".join(f" AND {condition}" for condition in conditions), params
+    return (f" AND name_id IN (SELECT name_id FROM category_names WHERE {' AND '.join(conditions)})",
+            params)
+
+
+def list_categories(conn: sqlite3.Connection) -> List[str]:
+    """有产品使用的主分类名称"""
+    table = "category_names" if has_category_keys(conn) else "products"
+    query = f"SELECT DISTINCT nCategory FROM {table} WHERE nCategory IS NOT NULL AND nCategory != '' ORDER BY nCategory"
+    return [row[0] for row in conn.execute(query)]
+
+
+def list_subcategories(conn: sqlite3.Connection, category: str) -> List[str]:
+    """主分类下有产品使用的子分类名称"""
+    table = "category_names" if has_category_keys(conn) else "products"
+    query = f"""
+    SELECT DISTINCT nSubCategory FROM {table}
+    WHERE nCategory = ? AND nSubCategory IS NOT NULL AND nSubCategory != ''
+    ORDER BY nSubCategory
+    """
+    return [row[0] for row in conn.execute(query, (category,))]
+
+
+def read_category_csv(csv_path: str):
+    """读取并校验分类CSV（CSNEW.csv），返回 (有效记录, 无效记录) 两个 DataFrame
+
+    整列向量化校验：分类码必须是1-3位数字，名称不能为空，分类码重复时保留第一条。
+    有效记录的列为 cat_code (int)、ncategory、nsubcategory；无效记录附带原因 reason。
+    """
+    import pandas as pd
+
+    df = pd.read_csv(csv_path, dtype=str, keep_default_na=False)
+    df = df[list(CATEGORY_CSV_COLUMNS)].rename(columns=CATEGORY_CSV_COLUMNS)
+    for column in df.columns:
+        df[column] = df[column].str.strip()
+
+    reason = pd.Series('', index=df.index)
+    reason = reason.mask((reason == '') & ~df['cat_code'].str.fullmatch(r'\d{1,3}'), '分类码无效')
+    reason = reason.mask((reason == '') & ((df['ncategory'] == '') | (df['nsubcategory'] == '')), '名称为空')
+    checked = reason == ''
+    duplicated = pd.Series(False, index=df.index)
+    duplicated[checked] = df.loc[checked, 'cat_code'].astype('int64').duplicated()
+    reason = reason.mask(duplicated, '分类码重复')
+
+    valid = df[reason == ''].astype({'cat_code': 'int64'}).reset_index(drop=True)
+    invalid = df[reason != ''].assign(reason=reason[reason != ''])
+    return valid, invalid
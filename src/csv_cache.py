@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CSV列式缓存
+查看器第一次打开某个CSV时完整解析一次，按列写入缓存目录（默认 data/cache，可用 IMS_CSV_CACHE_DIR 指定），
+之后只读取界面上需要的列和行区间，不再在每次 Streamlit 重新运行时解析整个文件。
+
+- 缓存以源文件的大小和修改时间为键（如 LT.2873260-1729300000000000000/），文件变化后自动重建，旧版本删除
+- 存为 Parquet（需要 pyarrow），行组大小 BLOCK_ROWS，只读取所需列的所需行组
+- 列统计（类型、非空值、空值）按列首次请求时计算并写入缓存
+"""
+
+import json
+import os
+import re
+import shutil
+from typing import Dict, List, Optional
+
+CACHE_DIR = os.environ.get('IMS_CSV_CACHE_DIR', os.path.join(os.path.dirname(__file__), '..', 'data', 'cache'))
+
+# 每个行组的记录数
+BLOCK_ROWS = 50000
+
+META_FILE = 'meta.json'
+STATS_FILE = 'stats.json'
+PARQUET_FILE = 'data.parquet'
+
+
+def source_key(csv_path: str) -> str:
+    """源文件的缓存键：大小-修改时间(ns)"""
+    stat = os.stat(csv_path)
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+def write_json(path: str, data):
+    """先写临时文件再替换，其他会话不会读到写了一半的文件"""
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(data, file, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+class CsvCache:
+    """一个CSV文件的列式缓存，按需读取列和行区间"""
+
+    def __init__(self, csv_path: str, cache_dir: str = None):
+        self.csv_path = os.path.abspath(csv_path)
+        self.cache_dir = cache_dir or CACHE_DIR
+        self.name = os.path.splitext(os.path.basename(csv_path))[0]
+        self.path = os.path.join(self.cache_dir, f"{self.name}.{source_key(csv_path)}")
+        self.meta = self._load_meta() or self._build()
+
+    @property
+    def rows(self) -> int:
+        return self.meta["rows"]
+
+    @property
+    def columns(self) -> List[str]:
+        return self.meta["columns"]
+
+    @property
+    def dtypes(self) -> Dict[str, str]:
+        return dict(zip(self.meta["columns"], self.meta["dtypes"]))
+
+    def _load_meta(self) -> Optional[Dict]:
+        try:
+            with open(os.path.join(self.path, META_FILE), 'r', encoding='utf-8') as file:
+                meta = json.load(file)
+        except (OSError, ValueError):
+            return None
+        # 早期版本生成的其他格式的缓存视为不存在，重新生成
+        return meta if meta.get("format") == "parquet" else None
+
+    def _build(self) -> Dict:
+        """解析CSV并写入缓存目录（写到临时目录后整体改名）；删除同一文件的旧版本缓存"""
+        import pandas as pd
+
+        df = pd.read_csv(self.csv_path, encoding='utf-8', low_memory=False)
+        meta = {
+            "source": self.csv_path,
+            "rows": len(df),
+            "columns": [str(column) for column in df.columns],
+            "dtypes": [str(dtype) for dtype in df.dtypes],
+            "format": "parquet",
+            "block_rows": BLOCK_ROWS,
+        }
+        df.columns = meta["columns"]
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self.path}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        try:
+            df.to_parquet(os.path.join(tmp_path, PARQUET_FILE), index=False, row_group_size=BLOCK_ROWS)
+            write_json(os.path.join(tmp_path, META_FILE), meta)
+            if os.path.isdir(self.path) and self._load_meta() is None:
+                shutil.rmtree(self.path, ignore_errors=True)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            # 其他会话已经生成了同一版本的缓存
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            if self._load_meta() is None:
+                raise
+        self._remove_stale()
+        return meta
+
+    def _remove_stale(self):
+        pattern = re.compile(rf"^{re.escape(self.name)}\.\d+-\d+$")
+        current = os.path.basename(self.path)
+        for entry in os.listdir(self.cache_dir):
+            if pattern.match(entry) and entry != current:
+                shutil.rmtree(os.path.join(self.cache_dir, entry), ignore_errors=True)
+
+    def read(self, columns: List[str] = None, start: int = 0, stop: int = None):
+        """读取指定列的 [start, stop) 行，返回 DataFrame（行号从 start 开始）"""
+        import pandas as pd
+        import pyarrow.parquet as pq
+
+        columns = list(columns) if columns is not None else self.columns
+        stop = self.rows if stop is None else min(stop, self.rows)
+        start = max(0, min(start, stop))
+        block_rows = self.meta["block_rows"]
+        first_block, last_block = start // block_rows, max(start, stop - 1) // block_rows
+        offset = start - first_block * block_rows
+
+        parquet = pq.ParquetFile(os.path.join(self.path, PARQUET_FILE))
+        groups = list(range(first_block, min(last_block + 1, parquet.num_row_groups)))
+        df = parquet.read_row_groups(groups, columns=columns).to_pandas() if groups else \
+            pd.DataFrame(columns=columns)
+
+        df = df.iloc[offset:offset + (stop - start)]
+        df.index = range(start, start + len(df))
+        return df
+
+    def column_stats(self, columns: List[str] = None) -> List[Dict]:
+        """各列的 {column, dtype, non_null, null}；未计算过的列逐列读取计算后写入缓存"""
+        columns = list(columns) if columns is not None else self.columns
+        stats_path = os.path.join(self.path, STATS_FILE)
+        try:
+            with open(stats_path, 'r', encoding='utf-8') as file:
+                stats = json.load(file)
+        except (OSError, ValueError):
+            stats = {}
+
+        missing = [column for column in columns if column not in stats]
+        for column in missing:
+            values = self.read([column])[column]
+            non_null = int(values.count())
+            stats[column] = {"column": column, "dtype": self.dtypes[column],
+                             "non_null": non_null, "null": len(values) - non_null}
+        if missing:
+            write_json(stats_path, stats)
+        return [stats[column] for column in columns]
@@ -5,9 +5,10 @@
 """
 
 import sqlite3
-import pandas as pd
 import os
 
+from catalog_stats import catalog_summary
+
 def query_database():
     """查询数据库基本信息和统计"""
 
@@ -19,76 +20,42 @@ def query_database():
 
         print("=== 数据库统计信息 ===")
 
+        # 全部统计值来自目录统计表 catalog_stats（旧数据库没有该表时扫描一次 products）
+        stats = catalog_summary(conn)
+
         # 总记录数
-        cursor.execute("SELECT COUNT(*) FROM products;")
-        total_count = cursor.fetchone()[0]
-        print(f"总产品数量: {total_count}")
+        print(f"总产品数量: {stats['total_products']}")
 
         # 库存状态统计
-        cursor.execute("""
-            SELECT StockStatus, COUNT(*) as count
-            FROM products
-            GROUP BY StockStatus
-            ORDER BY count DESC;
-        """)
-        stock_status = cursor.fetchall()
         print("\n库存状态分布:")
-        for status, count in stock_status:
+        for status, count in stats['stock_status'].items():
             print(f"  {status}: {count}")
 
         # 分类统计
-        cursor.execute("""
-            SELECT nCategory, COUNT(*) as count
-            FROM products
-            WHERE nCategory != ''
-            GROUP BY nCategory
-            ORDER BY count DESC;
-        """)
-        categories = cursor.fetchall()
         print("\n产品分类分布:")
-        for category, count in categories:
+        for category, count in stats['categories'].items():
             print(f"  {category}: {count}")
 
         # 库存统计
-        cursor.execute("""
-            SELECT
-                SUM(Stock) as total_stock,
-                AVG(Stock) as avg_stock,
-                MIN(Stock) as min_stock,
-                MAX(Stock) as max_stock
-            FROM products;
-        """)
-        stock_stats = cursor.fetchone()
+        stock_stats = stats['stock']
         print(f"\n库存统计:")
-        print(f"  总库存: {stock_stats[0]}")
-        print(f"  平均库存: {stock_stats[1]:.1f}")
-        print(f"  最小库存: {stock_stats[2]}")
-        print(f"  最大库存: {stock_stats[3]}")
+        print(f"  总库存: {stock_stats['total']}")
+        print(f"  平均库存: {stock_stats['avg']:.1f}")
+        print(f"  最小库存: {stock_stats['min']}")
+        print(f"  最大库存: {stock_stats['max']}")
 
         # 价格统计
-        cursor.execute("""
-            SELECT
-                AVG(Price) as avg_price,
-                MIN(Price) as min_price,
-                MAX(Price) as max_price
-            FROM products
-            WHERE Price > 0;
-        """)
-        price_stats = cursor.fetchone()
+        price_stats = stats['price']
         print(f"\n价格统计:")
-        print(f"  平均价格: ${price_stats[0]:.2f}")
-        print(f"  最低价格: ${price_stats[1]:.2f}")
-        print(f"  最高价格: ${price_stats[2]:.2f}")
+        print(f"  平均价格: ${price_stats['avg']:.2f}")
+        print(f"  最低价格: ${price_stats['min']:.2f}")
+        print(f"  最高价格: ${price_stats['max']:.2f}")
 
         # 缺货产品
-        cursor.execute("SELECT COUNT(*) FROM products WHERE StockStatus = 'outofstock';")
-        outofstock = cursor.fetchone()[0]
-        print(f"\n缺货产品数量: {outofstock}")
+        print(f"\n缺货产品数量: {stats['outofstock']}")
 
         # 库存充足产品（Stock > 0）
-        cursor.execute("SELECT COUNT(*) FROM products WHERE Stock > 0;")
-        in_stock = cursor.fetchone()[0]
-        print(f"有库存产品数量: {in_stock}")
+        print(f"有库存产品数量: {stats['in_stock']}")
 
         # 显示一些示例产品
         print("\n=== 示例产品 ===")
@@ -3,30 +3,119 @@
 """
 库存管理系统数据库初始化脚本
 从CSV文件读取数据并创建SQLite数据库
+
+新数据库先构建到同目录下的临时文件中（导入、建索引、ANALYZE、校验），
+全部通过后再用 os.replace 原子替换 inventory.db；构建失败时现有数据库不受影响。
+正在运行的API/Streamlit应用在替换后新建的连接会打开新文件，旧连接读完后自然释放。
+
+每条产品记录带有变更序号 change_seq（单调递增，供 /api/products/changes 增量同步）：
+重建时与现有数据库逐行比较内容哈希，未变化的记录沿用原序号和 updated_at，
+变化和新增的记录分配新序号，被删除的SKU记入 deleted_products。
+
+分类表 product_categories 由 CSNEW.csv 生成（整数分类码），每条产品记录带有指向它的
+整数分类码 cat_code，以及指向 category_names（产品自身的分类/子分类名称组合）的名称键 name_id，
+分类筛选按 name_id 进行（见 category_keys.py）。
+
+导入时从 Description/Name/PNDesc 解析出以厘米为单位的宽/深/高/长，写入有索引的数值列
+dim_w、dim_d、dim_h、dim_l 供API按尺寸范围筛选，并输出解析覆盖率（见 dimensions.py）。
+
+替换完成后导出按 nCategory/SU 分区的列式快照供分析脚本读取（见 catalog_snapshot.py）。
 """
 
 import sqlite3
 import pandas as pd
 import os
+import json
+import time
+import hashlib
 from datetime import datetime
 
+from catalog_stats import build_catalog_stats
+from catalog_snapshot import export_snapshot
+from category_keys import CATEGORY_NAMES_TABLE_SQL, category_name_ids, product_cat_codes, read_category_csv
+from dimensions import DIMENSION_COLUMNS, coverage_report, parse_dimensions, print_coverage
+from validation_rules import NUMERIC_FIELDS
+
+# 体积较大的网站内容字段（HTML正文、图片列表、SEO文本等），单独存放在 product_content 表中，
+# 使 products 表只保留检索/筛选/列表展示所需的字段，提高扫描时每页缓存的行密度
+CONTENT_FIELDS = [
+    'PostTitle', 'PostSlug', 'PostContent', 'PostShortDesc', 'ProductCat', 'ProductTag',
+    'ProductStyle', 'FocusKW', 'MetaTitle', 'MetaDesc', 'ProductPage', 'Images'
+]
+
+CATEGORIES_CSV = os.path.join(os.path.dirname(__file__), '..', 'data', 'raw', 'CSNEW.csv')
+
+# 替换数据库时取得现有数据库写锁（并清空其WAL）的最多尝试次数
+SWAP_LOCK_ATTEMPTS = 10
+
+def quote_field(field_name):
+    """为保留关键字字段名加引号"""
+    if field_name == 'Index':
+        return f'"{field_name}"'
+    return field_name
+
+# 构建完成后在新数据库上执行的校验：(说明, SQL, 期望结果为0)
+VALIDATION_CHECKS = [
+    ("SKU为空", "SELECT COUNT(*) FROM products WHERE SKU IS NULL OR SKU = ''"),
+    ("缺少内容记录的产品", "SELECT COUNT(*) FROM products p LEFT JOIN product_content c ON c.product_id = p.id WHERE c.product_id IS NULL"),
+    ("没有对应产品的内容记录", "SELECT COUNT(*) FROM product_content c LEFT JOIN products p ON p.id = c.product_id WHERE p.id IS NULL"),
+    ("未分配变更序号的产品", "SELECT COUNT(*) FROM products WHERE change_seq = 0"),
+    ("目录统计与产品数不一致", "SELECT (SELECT COUNT(*) FROM products) - (SELECT COALESCE(SUM(product_count), 0) FROM catalog_stats)"),
+]
+
 def create_database():
-    """创建SQLite数据库并导入数据"""
+    """构建新数据库并原子替换现有数据库"""
 
     # 数据库文件路径
     db_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'inventory.db')
-    csv_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'raw', 'LT.csv')
-    readme_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'raw', 'LTreadme.csv')
+    build_path = f"{db_path}.build-{os.getpid()}"
 
     print("正在初始化数据库...")
     print(f"数据库路径: {db_path}")
-    print(f"数据文件: {csv_path}")
+    print(f"临时构建路径: {build_path}")
 
     # 创建数据目录（如果不存在）
     os.makedirs(os.path.dirname(db_path), exist_ok=True)
 
-    # 连接到SQLite数据库
+    remove_database_files(build_path)
+    try:
+        expected_count = build_database(build_path)
+        copy_preserved_objects(db_path, build_path)
+        live_state = assign_change_sequence(db_path, build_path)
+        finalize_database(build_path, expected_count)
+        swap_database(build_path, db_path, live_state)
+    except Exception:
+        print("构建失败，现有数据库保持不变")
+        remove_database_files(build_path)
+        raise
+
+    print(f"\n数据库已替换: {db_path}")
+
+    # 导出供分析脚本使用的列式快照；失败不影响数据库，分析脚本会改为直接查询数据库
+    try:
+        manifest = export_snapshot(db_path)
+        print(f"列式快照已导出: {manifest['rows']} 条记录，{len(manifest['partitions'])} 个分区 ({manifest['format']})")
+    except Exception as e:
+        print(f"警告: 导出列式快照失败: {e}")
+    return db_path
+
+def remove_database_files(path):
+    """删除数据库文件及其日志文件"""
+    for suffix in ('', '-journal', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+def build_database(db_path):
+    """在 db_path 创建数据库并从CSV导入数据，返回导入的记录数"""
+
+    csv_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'raw', 'LT.csv')
+    readme_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'raw', 'LTreadme.csv')
+
+    print(f"数据文件: {csv_path}")
+
+    # 连接到SQLite数据库（临时文件，构建失败直接删除，无需回滚日志的持久化保证）
     conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA synchronous = OFF")
     cursor = conn.cursor()
 
     try:
@@ -96,21 +185,27 @@ def create_database():
             'PC': 'TEXT'
         }
 
-        # 构建CREATE TABLE语句
-        create_table_sql = "CREATE TABLE IF NOT EXISTS products (\n"
-        create_table_sql += "    id INTEGER PRIMARY KEY AUTOINCREMENT,\n"
-
         fields_to_import = []
         for _, row in import_fields.iterrows():
             field_name = row['列名']
             if field_name in field_types:
                 fields_to_import.append(field_name)
-                # 处理保留关键字
-                if field_name == 'Index':
-                    create_table_sql += f"    \"{field_name}\" {field_types[field_name]},\n"
-                else:
-                    create_table_sql += f"    {field_name} {field_types[field_name]},\n"
 
+        # 拆分为热字段（products）和内容字段（product_content）
+        hot_fields = [f for f in fields_to_import if f not in CONTENT_FIELDS]
+        content_fields = [f for f in fields_to_import if f in CONTENT_FIELDS]
+
+        # 构建CREATE TABLE语句
+        create_table_sql = "CREATE TABLE IF NOT EXISTS products (\n"
+        create_table_sql += "    id INTEGER PRIMARY KEY AUTOINCREMENT,\n"
+        for field_name in hot_fields:
+            create_table_sql += f"    {quote_field(field_name)} {field_types[field_name]},\n"
+        create_table_sql += "    cat_code INTEGER REFERENCES product_categories(cat_code),\n"  # 整数分类码，由 CatCode/SKU 得出
+        create_table_sql += "    name_id INTEGER REFERENCES category_names(name_id),\n"  # 分类/子分类名称键
+        for column in DIMENSION_COLUMNS.values():
+            create_table_sql += f"    {column} REAL,\n"  # 从描述解析出的尺寸（厘米）
+        create_table_sql += "    row_hash TEXT,\n"  # 导入时的内容哈希，库存接口修改后置空
+        create_table_sql += "    change_seq INTEGER NOT NULL DEFAULT 0,\n"
         create_table_sql += "    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,\n"
         create_table_sql += "    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP\n"
         create_table_sql += ");"
@@ -118,6 +213,46 @@ def create_database():
         print(f"SQL建表语句:\n{create_table_sql}")
         cursor.execute(create_table_sql)
 
+        # 内容表与products一对一，按产品id关联，仅在详情页按需读取
+        create_content_sql = "CREATE TABLE IF NOT EXISTS product_content (\n"
+        create_content_sql += "    product_id INTEGER PRIMARY KEY REFERENCES products(id) ON DELETE CASCADE"
+        for field_name in content_fields:
+            create_content_sql += f",\n    {field_name} {field_types[field_name]}"
+        create_content_sql += "\n);"
+
+        print(f"SQL建表语句:\n{create_content_sql}")
+        cursor.execute(create_content_sql)
+
+        # 兼容视图：需要完整记录的临时查询可以使用 products_full
+        content_columns = ''.join(f", c.{field_name}" for field_name in content_fields)
+        cursor.execute(f"""
+            CREATE VIEW IF NOT EXISTS products_full AS
+            SELECT p.*{content_columns}
+            FROM products p
+            LEFT JOIN product_content c ON c.product_id = p.id;
+        """)
+
+        # 变更跟踪：当前代数和已分配的最大变更序号；被删除产品的记录
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS sync_state (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                generation INTEGER NOT NULL,
+                change_seq INTEGER NOT NULL
+            );
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS deleted_products (
+                SKU TEXT PRIMARY KEY,
+                change_seq INTEGER NOT NULL,
+                deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+
+        # 分类表（整数分类码），products.cat_code 指向它
+        print("正在导入分类表...")
+        category_codes = import_product_categories(conn)
+        print(f"分类表: {len(category_codes)} 个分类码")
+
         # 读取CSV数据
         print("正在读取CSV数据...")
         df = pd.read_csv(csv_path)
@@ -131,39 +266,58 @@ def create_database():
         # 处理缺失值
         import_data = import_data.fillna('')
 
-        # 处理数值字段
-        numeric_fields = ['NetCost', 'DiscRate', 'FinalCost', 'RefPrice', 'ListPrice',
-                         'RegularPrice', 'SalePrice', 'Qty', 'Stock', 'Sold', 'PostID',
-                         'Index', 'Price', 'PNLen', 'Per']
-
-        for field in numeric_fields:
+        # 处理数值字段（无法直接转换的值，如带 "$"、","、"%" 的金额和折扣，导入为 0）
+        for field in NUMERIC_FIELDS:
             if field in import_data.columns:
                 import_data[field] = pd.to_numeric(import_data[field], errors='coerce').fillna(0)
 
         print(f"准备导入 {len(import_data)} 条记录...")
 
+        # 显式分配产品id，使两张表的记录一一对应
+        ids = list(range(1, len(import_data) + 1))
+
+        # 整数分类码和名称键（不属于导入字段，不影响内容哈希）
+        cat_codes = product_cat_codes(import_data['CatCode'], import_data['SKU'], category_codes)
+        name_ids, category_names = category_name_ids(import_data['nCategory'], import_data['nSubCategory'])
+        cursor.execute(CATEGORY_NAMES_TABLE_SQL)
+        cursor.executemany("INSERT INTO category_names (name_id, nCategory, nSubCategory) VALUES (?, ?, ?)",
+                           category_names)
+        print(f"分类名称: {len(category_names)} 个分类/子分类组合")
+
+        # 解析尺寸（同样不影响内容哈希），未解析出的为 NULL
+        print("正在解析尺寸...")
+        dimensions = parse_dimensions(import_data)
+        print_coverage(coverage_report(import_data, dimensions))
+        dimension_values = dimensions[list(DIMENSION_COLUMNS.values())].astype(object)
+        dimension_values = [tuple(row) for row in dimension_values.where(dimension_values.notna(), None).values]
+
+        # 构建插入SQL
+        hot_columns = ', '.join(['id'] + [quote_field(f) for f in hot_fields] + ['cat_code', 'name_id']
+                                + list(DIMENSION_COLUMNS.values()) + ['row_hash'])
+        hot_placeholders = ', '.join(['?'] * (len(hot_fields) + len(DIMENSION_COLUMNS) + 4))
+        insert_sql = f"INSERT INTO products ({hot_columns}) VALUES ({hot_placeholders})"
+
+        content_columns = ', '.join(['product_id'] + content_fields)
+        content_placeholders = ', '.join(['?'] * (len(content_fields) + 1))
+        insert_content_sql = f"INSERT INTO product_content ({content_columns}) VALUES ({content_placeholders})"
+
         # 批量插入数据
         batch_size = 1000
         total_imported = 0
 
         for i in range(0, len(import_data), batch_size):
             batch = import_data.iloc[i:i+batch_size]
-
-            # 构建插入SQL，需要处理Index字段名
-            field_names_sql = []
-            for field in fields_to_import:
-                if field == 'Index':
-                    field_names_sql.append(f'"{field}"')
-                else:
-                    field_names_sql.append(field)
-
-            placeholders = ', '.join(['?' for _ in range(len(fields_to_import))])
-            insert_sql = f"INSERT INTO products ({', '.join(field_names_sql)}) VALUES ({placeholders})"
+            batch_ids = ids[i:i+batch_size]
 
             # 转换数据为tuple列表
-            data_tuples = [tuple(row) for row in batch.values]
-
-            cursor.executemany(insert_sql, data_tuples)
+            hashes = [row_hash(row) for row in batch[fields_to_import].values]
+            hot_tuples = [(pid,) + tuple(row) + (code, name_id) + dims + (h,) for pid, row, code, name_id, dims, h
+                          in zip(batch_ids, batch[hot_fields].values, cat_codes[i:i+batch_size],
+                                 name_ids[i:i+batch_size], dimension_values[i:i+batch_size], hashes)]
+            content_tuples = [(pid,) + tuple(row) for pid, row in zip(batch_ids, batch[content_fields].values)]
+
+            cursor.executemany(insert_sql, hot_tuples)
+            cursor.executemany(insert_content_sql, content_tuples)
             total_imported += len(batch)
 
             print(f"已导入 {total_imported}/{len(import_data)} 条记录...")
@@ -178,22 +332,33 @@ def create_database():
             "CREATE INDEX IF NOT EXISTS idx_code ON products(Code);",
             "CREATE INDEX IF NOT EXISTS idx_category ON products(Category);",
             "CREATE INDEX IF NOT EXISTS idx_subcat ON products(SubCat);",
-            "CREATE INDEX IF NOT EXISTS idx_stock_status ON products(StockStatus);"
+            "CREATE INDEX IF NOT EXISTS idx_stock_status ON products(StockStatus);",
+            "CREATE INDEX IF NOT EXISTS idx_products_cat_code ON products(cat_code);",
+            "CREATE INDEX IF NOT EXISTS idx_products_name_id ON products(name_id);",
+            "CREATE INDEX IF NOT EXISTS idx_dim_w ON products(dim_w);",
+            "CREATE INDEX IF NOT EXISTS idx_dim_d ON products(dim_d);",
+            "CREATE INDEX IF NOT EXISTS idx_dim_h ON products(dim_h);",
+            "CREATE INDEX IF NOT EXISTS idx_dim_l ON products(dim_l);",
+            "CREATE INDEX IF NOT EXISTS idx_change_seq ON products(change_seq);",
+            "CREATE INDEX IF NOT EXISTS idx_deleted_change_seq ON deleted_products(change_seq);"
         ]
 
         for index_sql in indexes:
             cursor.execute(index_sql)
 
+        # 目录统计汇总表（一次扫描生成，之后由库存写入增量更新）
+        print("正在生成目录统计...")
+        build_catalog_stats(conn)
+
         conn.commit()
 
         # 验证数据
         cursor.execute("SELECT COUNT(*) FROM products;")
         count = cursor.fetchone()[0]
 
-        print("\n数据库创建成功！")
-        print(f"数据库路径: {db_path}")
+        print("\n数据库构建成功！")
         print(f"总记录数: {count}")
-        print(f"字段数: {len(fields_to_import)}")
+        print(f"字段数: {len(fields_to_import)} (products: {len(hot_fields)}, product_content: {len(content_fields)})")
 
         # 显示前几条记录
         cursor.execute("SELECT SKU, Description, Category, Stock, Price FROM products LIMIT 5;")
@@ -212,7 +377,247 @@ def create_database():
     finally:
         conn.close()
 
-    return db_path
+    return len(import_data)
+
+def import_product_categories(conn):
+    """由 CSNEW.csv 创建分类表 product_categories，返回分类码集合"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS product_categories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cat_code INTEGER NOT NULL UNIQUE,
+            ncategory TEXT NOT NULL,
+            nsubcategory TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ncategory ON product_categories(ncategory);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_nsubcategory ON product_categories(nsubcategory);")
+
+    categories, invalid = read_category_csv(CATEGORIES_CSV)
+    if len(invalid):
+        print(f"分类表跳过 {len(invalid)} 条无效记录")
+    rows = [(int(code), category, subcategory) for code, category, subcategory in categories.values]
+    conn.executemany(
+        "INSERT INTO product_categories (cat_code, ncategory, nsubcategory) VALUES (?, ?, ?)", rows
+    )
+    return {code for code, _, _ in rows}
+
+def attach_live(conn, live_path):
+    """将现有数据库附加为 live（只从中读取）"""
+    conn.execute("ATTACH DATABASE ? AS live", (live_path,))
+
+def row_hash(values):
+    """一行导入数据的内容哈希"""
+    return hashlib.sha1(json.dumps(list(values), default=str).encode('utf-8')).hexdigest()
+
+def live_change_state(conn):
+    """读取已附加的现有数据库(live)的变更跟踪状态，不存在时返回None"""
+    tables = {row[0] for row in conn.execute("SELECT name FROM live.sqlite_master WHERE type = 'table'")}
+    if not {'sync_state', 'deleted_products', 'products'} <= tables:
+        return None
+    columns = {row[1] for row in conn.execute("PRAGMA live.table_info(products)")}
+    if not {'row_hash', 'change_seq'} <= columns:
+        return None
+    return conn.execute("SELECT generation, change_seq FROM live.sync_state WHERE id = 1").fetchone()
+
+def assign_change_sequence(live_path, build_path):
+    """为新数据库分配变更序号
+
+    与现有数据库按SKU比较内容哈希：未变化的记录沿用原序号、created_at 和 updated_at；
+    变化或新增的记录按id顺序分配新序号；现有数据库中有而新数据中没有的SKU记入 deleted_products。
+    现有数据库没有变更跟踪信息时开始新的一代，客户端需要全量同步。
+
+    可以重复执行（先清除上一次分配的结果）；返回据以分配的现有数据库变更位置
+    (generation, change_seq)，没有时为 None，替换前据此判断构建期间现有数据库是否有新的写入。
+    """
+    conn = sqlite3.connect(build_path)
+    try:
+        conn.execute("""
+            UPDATE products SET change_seq = 0, created_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+            WHERE change_seq != 0
+        """)
+        conn.execute("DELETE FROM deleted_products")
+
+        state = None
+        if os.path.exists(live_path):
+            attach_live(conn, live_path)
+            state = live_change_state(conn)
+
+        if state is None:
+            generation, seq = int(time.time()), 0
+            print(f"开始新的变更序号代: {generation}")
+        else:
+            generation, seq = state
+            # 沿用未变化记录的序号
+            conn.execute("""
+                UPDATE products SET (change_seq, created_at, updated_at) = (
+                    SELECT l.change_seq, l.created_at, l.updated_at FROM live.products l
+                    WHERE l.SKU = products.SKU AND l.row_hash = products.row_hash
+                )
+                WHERE EXISTS (
+                    SELECT 1 FROM live.products l
+                    WHERE l.SKU = products.SKU AND l.row_hash = products.row_hash
+                )
+            """)
+            conn.execute("""
+                UPDATE products SET created_at = (SELECT l.created_at FROM live.products l WHERE l.SKU = products.SKU)
+                WHERE change_seq = 0 AND SKU IN (SELECT SKU FROM live.products)
+            """)
+            conn.execute("INSERT INTO deleted_products SELECT * FROM live.deleted_products")
+
+        changed_ids = [row[0] for row in conn.execute("SELECT id FROM products WHERE change_seq = 0 ORDER BY id")]
+        conn.executemany("UPDATE products SET change_seq = ? WHERE id = ?",
+                         [(seq + i, pid) for i, pid in enumerate(changed_ids, start=1)])
+        seq += len(changed_ids)
+
+        deleted_count = 0
+        if state is not None:
+            # 重新出现的SKU不再是删除状态；消失的SKU记录为删除
+            conn.execute("DELETE FROM deleted_products WHERE SKU IN (SELECT SKU FROM products)")
+            deleted_skus = [row[0] for row in conn.execute("""
+                SELECT SKU FROM live.products
+                WHERE SKU NOT IN (SELECT SKU FROM main.products)
+                ORDER BY id
+            """)]
+            conn.executemany("INSERT OR REPLACE INTO deleted_products (SKU, change_seq) VALUES (?, ?)",
+                             [(sku, seq + i) for i, sku in enumerate(deleted_skus, start=1)])
+            seq += len(deleted_skus)
+            deleted_count = len(deleted_skus)
+
+        conn.execute("INSERT OR REPLACE INTO sync_state (id, generation, change_seq) VALUES (1, ?, ?)",
+                     (generation, seq))
+        conn.commit()
+        print(f"变更序号: 第 {generation} 代，{len(changed_ids)} 条记录变化，{deleted_count} 条记录删除，当前序号 {seq}")
+        return tuple(state) if state is not None else None
+    finally:
+        conn.close()
+
+def copy_preserved_objects(live_path, build_path):
+    """将现有数据库中由其他脚本创建的表连同索引、视图、触发器复制到新数据库"""
+    if not os.path.exists(live_path):
+        return
+
+    conn = sqlite3.connect(build_path)
+    attach_live(conn, live_path)
+
+    try:
+        existing = {row[0] for row in conn.execute("SELECT name FROM main.sqlite_master")}
+        objects = conn.execute("""
+            SELECT type, name, tbl_name, sql FROM live.sqlite_master
+            WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'
+            ORDER BY CASE type WHEN 'table' THEN 0 WHEN 'index' THEN 1 ELSE 2 END
+        """).fetchall()
+
+        preserved_tables = []
+        for obj_type, name, tbl_name, sql in objects:
+            if name in existing:
+                continue
+            if obj_type != 'table' and tbl_name in existing:
+                continue  # 本脚本创建的表上的索引/触发器以新构建为准
+            conn.execute(sql)
+            if obj_type == 'table':
+                conn.execute(f'INSERT INTO main."{name}" SELECT * FROM live."{name}"')
+                preserved_tables.append(name)
+
+        conn.commit()
+        for name in preserved_tables:
+            count = conn.execute(f'SELECT COUNT(*) FROM main."{name}"').fetchone()[0]
+            print(f"已保留现有表 {name}: {count} 条记录")
+    finally:
+        conn.close()
+
+def finalize_database(db_path, expected_count):
+    """收集统计信息并校验新数据库，校验失败时抛出异常"""
+    conn = sqlite3.connect(db_path)
+    try:
+        print("正在收集统计信息 (ANALYZE)...")
+        conn.execute("ANALYZE")
+        conn.commit()
+
+        print("正在校验新数据库...")
+        errors = []
+
+        integrity = conn.execute("PRAGMA integrity_check").fetchone()[0]
+        if integrity != 'ok':
+            errors.append(f"完整性检查失败: {integrity}")
+
+        foreign_key_errors = conn.execute("PRAGMA foreign_key_check").fetchall()
+        if foreign_key_errors:
+            errors.append(f"外键检查失败: {len(foreign_key_errors)} 条")
+
+        count = conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+        if count != expected_count:
+            errors.append(f"记录数不一致: products {count} 条，CSV {expected_count} 条")
+
+        for description, sql in VALIDATION_CHECKS:
+            invalid_count = conn.execute(sql).fetchone()[0]
+            if invalid_count:
+                errors.append(f"{description}: {invalid_count} 条")
+
+        if errors:
+            raise ValueError("新数据库校验失败: " + "; ".join(errors))
+        print("校验通过")
+    finally:
+        conn.close()
+
+def lock_live_database(db_path):
+    """取得现有数据库的写锁，返回持有锁的连接
+
+    数据库处于WAL模式（库存写入接口会开启）时先将WAL内容写回并清空，拿到写锁后确认WAL仍为空
+    （写回与加锁之间有新的写入时重试），避免残留的 -wal 文件被替换后的新数据库误用。
+    """
+    wal_path = db_path + '-wal'
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    try:
+        for _ in range(SWAP_LOCK_ATTEMPTS):
+            if os.path.exists(wal_path):
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            conn.execute("BEGIN IMMEDIATE")
+            if not os.path.exists(wal_path) or os.path.getsize(wal_path) == 0:
+                return conn
+            conn.execute("ROLLBACK")
+    except Exception:
+        conn.close()
+        raise
+    conn.close()
+    raise RuntimeError(f"现有数据库持续有写入，{SWAP_LOCK_ATTEMPTS} 次尝试后仍无法清空WAL")
+
+def swap_database(build_path, db_path, live_state=None):
+    """用新构建的数据库原子替换现有数据库
+
+    从读取现有数据库的变更位置到替换完成之间写入的库存修改会随旧文件丢失，且其变更序号会在新数据库中
+    被重复使用。因此替换期间持有现有数据库的写锁，并在锁内重新读取变更位置：与分配变更序号时 (live_state)
+    不同则在锁内重新分配，使这些记录获得新的序号，增量同步的客户端能收到它们被新数据覆盖的变化。
+    写线程拿到写锁后会发现文件已被替换，转而写入新文件。
+    """
+
+    live_conn = lock_live_database(db_path) if os.path.exists(db_path) else None
+    try:
+        if live_conn is not None:
+            try:
+                row = live_conn.execute("SELECT generation, change_seq FROM sync_state WHERE id = 1").fetchone()
+            except sqlite3.OperationalError:
+                row = None
+            current = tuple(row) if row is not None else None
+            if current != live_state:
+                print(f"构建期间现有数据库有新的写入（变更位置 {live_state} -> {current}），重新分配变更序号")
+                assign_change_sequence(db_path, build_path)
+
+        with open(build_path, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(build_path, db_path)
+    finally:
+        if live_conn is not None:
+            live_conn.execute("ROLLBACK")
+            live_conn.close()
+
+    # 确保目录项的变更落盘
+    dir_fd = os.open(os.path.dirname(os.path.abspath(db_path)), os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
 
 if __name__ == "__main__":
     create_database()
\ No newline at end of file
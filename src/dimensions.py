@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+尺寸解析
+产品描述中的尺寸（如 "Hydrangea Stem 28*16*45cm"、"Fiddle Leaf Tree 93cmh"、"Rose Lola 46cml*7.5cmd"）
+解析为以厘米为单位的宽/深/高/长，导入时写入 products 的数值列 dim_w、dim_d、dim_h、dim_l（有索引），
+供API按尺寸范围筛选，不再对 HL 文本逐行做类型转换。
+
+规则（不区分大小写，单位 cm/mm/m 统一换算为厘米）：
+- 三个数 W*D*H：宽、深、高
+- 两个数 W*H：宽、高
+- 单个数带后缀：h 高、l 长、w 宽、d 深（直径也记为深）；不带后缀的单个数为高
+- 每个模式对整列做一次向量化匹配；先解析 Description，没有解析出任何尺寸的记录再依次解析 Name、PNDesc
+- 0 视为未知
+
+API 的尺寸范围筛选参数为 min_w/max_w、min_d/max_d、min_h/max_h、min_l/max_l（厘米，见 dimension_filter）。
+
+用法:
+    python dimensions.py                       # 解析 data/raw/LT.csv 并输出覆盖率报告
+    python dimensions.py ../data/inventory.db  # 数据库中已导入尺寸的覆盖率
+"""
+
+import os
+import re
+import sqlite3
+import sys
+from typing import Dict, List, Tuple
+
+# 数值列（宽、深、高、长）
+DIMENSION_COLUMNS = {'w': 'dim_w', 'd': 'dim_d', 'h': 'dim_h', 'l': 'dim_l'}
+
+# 依次尝试的来源字段
+SOURCE_FIELDS = ['Description', 'Name', 'PNDesc']
+
+# API筛选参数 -> (列, 比较运算符)
+DIMENSION_FILTERS = {
+    f"{bound}_{key}": (column, '>=' if bound == 'min' else '<=')
+    for key, column in DIMENSION_COLUMNS.items() for bound in ('min', 'max')
+}
+
+UNIT_FACTORS = {'cm': 1.0, 'mm': 0.1, 'm': 100.0}
+
+NUMBER = r'(\d+(?:\.\d+)?)'
+# 数字之间的分隔符：* 或 x（如 28*16*45cm、30x23x20cm）
+BY = r'\s*[*x]\s*'
+UNIT = r'\s*(cm|mm|m)'
+# 尺寸之后不能紧跟字母（x 是两个尺寸之间的分隔符，如 12cmhx18cmd）
+END = r'(?![a-wyz])'
+
+TRIPLE_PATTERN = re.compile(rf'(?<![\d.*]){NUMBER}{BY}{NUMBER}{BY}{NUMBER}{UNIT}[hldw]?{END}', re.IGNORECASE)
+PAIR_PATTERN = re.compile(rf'(?<![\d.*]){NUMBER}{BY}{NUMBER}{UNIT}{END}(?!\s*\*)', re.IGNORECASE)
+# 单个尺寸：前面可以是 "h*"（如 46cmh*60cmd），但不能是 "数字*"（三个数/两个数中的最后一个）；
+# 不带后缀时后面不能紧跟 "*数字"
+SINGLE_PATTERN = re.compile(rf'(?<![\d.])(?<!\d[*x]){NUMBER}{UNIT}(?:([hldw]){END}|{END}(?!{BY}\d))',
+                            re.IGNORECASE)
+
+DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'inventory.db')
+CSV_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'raw', 'LT.csv')
+
+
+def to_cm(values, units):
+    """数值列按单位列换算为厘米，0 为未知"""
+    import pandas as pd
+
+    factors = units.str.lower().map(UNIT_FACTORS)
+    result = pd.to_numeric(values, errors='coerce') * factors
+    return result.where(result > 0)
+
+
+def parse_text(texts):
+    """解析一列文本，返回 DataFrame (w, d, h, l)，与 texts 同索引，未解析出的为 NaN"""
+    import pandas as pd
+
+    texts = texts.fillna('').astype(str)
+    result = pd.DataFrame(index=texts.index, columns=list(DIMENSION_COLUMNS), dtype=float)
+
+    triple = texts.str.extract(TRIPLE_PATTERN)
+    for position, dimension in enumerate(['w', 'd', 'h']):
+        result[dimension] = to_cm(triple[position], triple[3])
+
+    pair = texts.str.extract(PAIR_PATTERN)
+    for position, dimension in enumerate(['w', 'h']):
+        result[dimension] = result[dimension].fillna(to_cm(pair[position], pair[2]))
+
+    singles = texts.str.extractall(SINGLE_PATTERN)
+    if len(singles):
+        singles['dimension'] = singles[2].fillna('').str.lower().replace('', 'h')
+        singles['value'] = to_cm(singles[0], singles[1])
+        singles = singles.dropna(subset=['value']).reset_index()
+        # 同一记录同一维度出现多次时取第一个
+        first = singles.drop_duplicates(['level_0', 'dimension']).pivot(index='level_0', columns='dimension',
+                                                                         values='value')
+        for dimension in first.columns:
+            result[dimension] = result[dimension].fillna(first[dimension].reindex(result.index))
+
+    return result
+
+
+def parse_dimensions(df):
+    """解析产品记录的尺寸
+
+    返回 DataFrame：dim_w、dim_d、dim_h、dim_l（厘米）以及 dim_source（解析出尺寸的字段，未解析出为 ''）。
+    """
+    import pandas as pd
+
+    result = pd.DataFrame(index=df.index, columns=list(DIMENSION_COLUMNS), dtype=float)
+    source = pd.Series('', index=df.index, dtype=object)
+    for field in SOURCE_FIELDS:
+        if field not in df.columns:
+            continue
+        pending = source == ''
+        if not pending.any():
+            break
+        parsed = parse_text(df.loc[pending, field])
+        found = parsed.notna().any(axis=1)
+        result.loc[found[found].index] = parsed[found]
+        source[found[found].index] = field
+
+    result = result.rename(columns=DIMENSION_COLUMNS).astype(float)
+    result['dim_source'] = source
+    return result
+
+
+def coverage_report(df, dimensions) -> Dict:
+    """解析覆盖率：各维度和各来源字段的记录数，以及高/长与 HL 字段的一致情况"""
+    import pandas as pd
+
+    rows = len(dimensions)
+    parsed = dimensions[list(DIMENSION_COLUMNS.values())].notna().any(axis=1)
+    report = {
+        "rows": rows,
+        "parsed": int(parsed.sum()),
+        "dimensions": {column: int(dimensions[column].notna().sum()) for column in DIMENSION_COLUMNS.values()},
+    }
+    if 'dim_source' in dimensions.columns:
+        report["sources"] = {field: int((dimensions['dim_source'] == field).sum()) for field in SOURCE_FIELDS}
+    if 'HL' in df.columns:
+        hl = pd.to_numeric(df['HL'], errors='coerce')
+        hl = hl.where(hl > 0)
+        parsed_hl = dimensions['dim_h'].fillna(dimensions['dim_l'])
+        compared = hl.notna() & parsed_hl.notna()
+        matched = compared & ((hl - parsed_hl).abs() < 0.5)
+        report["hl_compared"] = int(compared.sum())
+        report["hl_matched"] = int(matched.sum())
+        report["hl_mismatches"] = [
+            {"SKU": sku, "text": text, "HL": value, "parsed": parsed}
+            for sku, text, value, parsed in zip(
+                df.loc[compared & ~matched, 'SKU'] if 'SKU' in df.columns else [''] * rows,
+                df.loc[compared & ~matched, 'Description'],
+                hl[compared & ~matched], parsed_hl[compared & ~matched]
+            )
+        ][:10]
+    report["unparsed_samples"] = df.loc[~parsed, 'Description'].head(10).tolist() \
+        if 'Description' in df.columns else []
+    return report
+
+
+def print_coverage(report: Dict):
+    rows = max(report["rows"], 1)
+    print(f"总记录数: {report['rows']}")
+    print(f"解析出尺寸: {report['parsed']} ({report['parsed'] / rows:.1%})")
+    for column, count in report["dimensions"].items():
+        print(f"  {column}: {count} ({count / rows:.1%})")
+    if "sources" in report:
+        print("来源字段:")
+        for field, count in report["sources"].items():
+            print(f"  {field}: {count}")
+    if "hl_compared" in report:
+        compared = max(report["hl_compared"], 1)
+        print(f"高/长与 HL 一致: {report['hl_matched']}/{report['hl_compared']} ({report['hl_matched'] / compared:.1%})")
+        for item in report["hl_mismatches"]:
+            print(f"    {item['SKU']}: {item['text']} -> {item['parsed']:g}，HL {item['HL']:g}")
+    if report["unparsed_samples"]:
+        print("未解析出尺寸的描述（样本）:")
+        for text in report["unparsed_samples"]:
+            print(f"    {text}")
+
+
+def has_dimension_columns(conn: sqlite3.Connection) -> bool:
+    """products 表是否带有尺寸列 dim_w、dim_d、dim_h、dim_l"""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(products)")}
+    return set(DIMENSION_COLUMNS.values()) <= columns
+
+
+def dimension_filter(ranges: Dict[str, float]) -> Tuple[str, List]:
+    """尺寸范围筛选的WHERE片段（以 " AND" 开头）和参数，没有筛选条件时为 ("", [])
+
+    ranges 为 {min_w: 10, max_h: 60, ...}，取值为 None 的条件忽略；尺寸未知（NULL）的记录不会匹配。
+    """
+    unknown = [name for name in ranges if name not in DIMENSION_FILTERS]
+    if unknown:
+        raise ValueError(f"未知的尺寸筛选参数: {', '.join(unknown)}")
+    clause, params = "", []
+    for name, (column, operator) in DIMENSION_FILTERS.items():
+        if ranges.get(name) is not None:
+            clause += f" AND {column} {operator} ?"
+            params.append(float(ranges[name]))
+    return clause, params
+
+
+def load_source(source: str):
+    """读取原始CSV并解析，或读取数据库中已导入的尺寸；返回 (记录, 尺寸)"""
+    import pandas as pd
+
+    if source.lower().endswith('.csv'):
+        df = pd.read_csv(source, dtype=str, keep_default_na=False)
+        return df, parse_dimensions(df)
+
+    conn = sqlite3.connect(f"file:{os.path.abspath(source)}?mode=ro", uri=True)
+    try:
+        df = pd.read_sql_query(
+            f"SELECT SKU, Description, HL, {', '.join(DIMENSION_COLUMNS.values())} FROM products", conn
+        )
+    finally:
+        conn.close()
+    # 数据库中不保存来源字段，报告中没有来源统计
+    return df, df[list(DIMENSION_COLUMNS.values())].astype(float)
+
+
+if __name__ == "__main__":
+    source = sys.argv[1] if len(sys.argv) > 1 else CSV_PATH
+    print(f"=== 尺寸解析覆盖率: {source} ===\n")
+    data, dims = load_source(source)
+    print_coverage(coverage_report(data, dims))
@@ -1,11 +1,14 @@
 import streamlit as st
 import pandas as pd
 import sqlite3
-import re
+import json
 import os
 from pathlib import Path
 from typing import List, Dict, Tuple, Optional
 
+from category_keys import category_filter, has_category_keys, list_categories, list_subcategories
+from search_query import compile_query
+
 # 设置页面配置
 st.set_page_config(
     page_title="产品检索系统",
@@ -40,123 +43,11 @@ class ProductSearchEngine:
 
     def get_categories(self) -> List[str]:
         """获取所有主分类列表"""
-        conn = self.connect()
-        query = "SELECT DISTINCT nCategory FROM products WHERE nCategory IS NOT NULL AND nCategory != '' ORDER BY nCategory"
-        cursor = conn.cursor()
-        cursor.execute(query)
-        return [row[0] for row in cursor.fetchall()]
+        return list_categories(self.connect())
 
     def get_subcategories(self, category: str) -> List[str]:
         """根据主分类获取子分类列表"""
-        conn = self.connect()
-        query = """
-        SELECT DISTINCT nSubCategory FROM products
-        WHERE nCategory = ? AND nSubCategory IS NOT NULL AND nSubCategory != ''
-        ORDER BY nSubCategory
-        """
-        cursor = conn.cursor()
-        cursor.execute(query, (category,))
-        return [row[0] for row in cursor.fetchall()]
-
-    def normalize_text(self, text: str) -> str:
-        """标准化文本：移除标点符号、空格，转为小写"""
-        if pd.isna(text) or text is None:
-            return ""
-        # 移除所有非字母数字字符，转为小写
-        return re.sub(r'[^\w]', '', str(text).lower())
-
-    def parse_search_query(self, query: str) -> Dict:
-        """解析搜索查询字符串"""
-        if not query or not query.strip():
-            return {"type": "simple", "terms": []}
-
-        query = query.strip()
-
-        # 检查 OR 操作符
-        if ' or ' in query.lower():
-            parts = re.split(r'\s+or\s+', query, flags=re.IGNORECASE)
-            return {
-                "type": "or",
-                "terms": [part.strip() for part in parts if part.strip()]
-            }
-
-        # 检查 AND 操作符 (+)
-        if '+' in query:
-            parts = query.split('+')
-            return {
-                "type": "and",
-                "terms": [part.strip() for part in parts if part.strip()]
-            }
-
-        # 检查 NOT 操作符 (-)
-        if '-' in query:
-            parts = query.split('-', 1)  # 只分割第一个-
-            include = parts[0].strip()
-            exclude = parts[1].strip() if len(parts) > 1 else ""
-            return {
-                "type": "not",
-                "include": include,
-                "exclude": exclude
-            }
-
-        # 简单搜索
-        return {
-            "type": "simple",
-            "terms": [query]
-        }
-
-    def matches_search_terms(self, product_data: Dict, search_info: Dict) -> bool:
-        """检查产品是否匹配搜索条件"""
-        # 要搜索的文本字段
-        searchable_fields = [
-            product_data.get('SKU', ''),
-            product_data.get('Code', ''),
-            product_data.get('Description', ''),
-            product_data.get('nSubCategory', '')
-        ]
-
-        # 将所有搜索文本合并为一个字符串
-        combined_text = ' '.join(searchable_fields)
-        normalized_text = self.normalize_text(combined_text)
-
-        search_type = search_info["type"]
-
-        if search_type == "simple":
-            # 简单搜索：任何匹配即可
-            for term in search_info["terms"]:
-                normalized_term = self.normalize_text(term)
-                if normalized_term and normalized_term in normalized_text:
-                    return True
-            return len(search_info["terms"]) == 0  # 如果没有搜索条件，返回True
-
-        elif search_type == "or":
-            # OR搜索：任何条件匹配即可
-            for term in search_info["terms"]:
-                normalized_term = self.normalize_text(term)
-                if normalized_term and normalized_term in normalized_text:
-                    return True
-            return False
-
-        elif search_type == "and":
-            # AND搜索：所有条件都必须匹配
-            for term in search_info["terms"]:
-                normalized_term = self.normalize_text(term)
-                if not normalized_term or normalized_term not in normalized_text:
-                    return False
-            return True
-
-        elif search_type == "not":
-            # NOT搜索：包含include但不包含exclude
-            include_term = self.normalize_text(search_info["include"])
-            exclude_term = self.normalize_text(search_info["exclude"])
-
-            if include_term and include_term in normalized_text:
-                if exclude_term and exclude_term in normalized_text:
-                    return False
-                return True
-            return False
-
-        return False
+        return list_subcategories(self.connect(), category)
 
     def search_products(self, search_query: str = "", suppliers: List[str] = None,
                        min_height: float = None, max_height: float = None,
@@ -179,9 +70,8 @@ class ProductSearchEngine:
 
         # 供应商筛选
         if suppliers and "ALL" not in suppliers:
-            placeholders = ','.join(['?' for _ in suppliers])
-            base_query += f" AND SU IN ({placeholders})"
-            params.extend(suppliers)
+            base_query += " AND SU IN (SELECT value FROM json_each(?))"
+            params.append(json.dumps(list(suppliers)))
 
         # 高度/长度筛选
         if min_height is not None:
@@ -201,15 +91,11 @@ class ProductSearchEngine:
             base_query += " AND ListPrice <= ?"
             params.append(max_price)
 
-        # 类别筛选
+        # 类别筛选（名称解析为整数名称键，子分类只在选择了主分类时生效）
         if category:
-            base_query += " AND nCategory = ?"
-            params.append(category)
-
-            if subcategories:
-                placeholders = ','.join(['?' for _ in subcategories])
-                base_query += f" AND nSubCategory IN ({placeholders})"
-                params.extend(subcategories)
+            category_clause, category_params = category_filter(category, subcategories, has_category_keys(conn))
+            base_query += category_clause
+            params.extend(category_params)
 
         # 执行查询获取所有匹配的记录
         try:
@@ -219,14 +105,9 @@ class ProductSearchEngine:
             return pd.DataFrame(), 0
 
         # 应用关键词搜索筛选
-        if search_query and search_query.strip():
-            search_info = self.parse_search_query(search_query)
-
-            def search_filter(row):
-                product_data = row.to_dict()
-                return self.matches_search_terms(product_data, search_info)
-
-            df = df[df.apply(search_filter, axis=1)]
+        compiled = compile_query(search_query or "")
+        if not compiled.is_empty:
+            df = df[compiled.mask(df)]
 
         # 计算总记录数
         total_count = len(df)
@@ -429,7 +310,7 @@ def main():
 
     else:
         # 显示搜索提示
-        st.info("👈 请在左侧设置搜索条件，然后点击"执行搜索"按钮")
+        st.info("👈 请在左侧设置搜索条件，然后点击“执行搜索”按钮")
 
 # 键盘快捷键处理
 def handle_keyboard_shortcuts():
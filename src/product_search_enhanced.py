@@ -1,11 +1,14 @@
 import streamlit as st
 import pandas as pd
 import sqlite3
-import re
+import json
 import os
 from pathlib import Path
 from typing import List, Dict, Tuple, Optional
 
+from category_keys import category_filter, has_category_keys, list_categories, list_subcategories
+from search_query import compile_query, register_functions
+
 # 设置页面配置
 st.set_page_config(
     page_title="产品检索系统",
@@ -153,6 +156,7 @@ class ProductSearchEngine:
         """连接数据库"""
         if self.conn is None:
             self.conn = sqlite3.connect(self.db_path)
+            register_functions(self.conn)
         return self.conn
 
     def get_suppliers(self) -> List[str]:
@@ -166,39 +170,11 @@ class ProductSearchEngine:
 
     def get_categories(self) -> List[str]:
         """获取所有主分类列表"""
-        conn = self.connect()
-        query = "SELECT DISTINCT nCategory FROM products WHERE nCategory IS NOT NULL AND nCategory != '' ORDER BY nCategory"
-        cursor = conn.cursor()
-        cursor.execute(query)
-        return [row[0] for row in cursor.fetchall()]
+        return list_categories(self.connect())
 
     def get_subcategories(self, category: str) -> List[str]:
         """根据主分类获取子分类列表"""
-        conn = self.connect()
-        query = """
-        SELECT DISTINCT nSubCategory
-        FROM products
-        WHERE nCategory = ? AND nSubCategory IS NOT NULL AND nSubCategory != ''
-        ORDER BY nSubCategory
-        """
-        cursor = conn.cursor()
-        cursor.execute(query, (category,))
-        return [row[0] for row in cursor.fetchall()]
-
-    def parse_search_query(self, query: str) -> Tuple[str, List[str], List[str]]:
-        """解析搜索查询语句"""
-        query = query.lower().strip()
-
-        # 提取包含的词汇（+ 开头的词）
-        include_words = re.findall(r'\+([^\s+]+)', query)
-
-        # 提排除的词汇（- 开头的词）
-        exclude_words = re.findall(r'-([^\s+]+)', query)
-
-        # 移除操作符，得到纯文本查询
-        clean_query = re.sub(r'[+-]', '', query).strip()
-
-        return clean_query, include_words, exclude_words
+        return list_subcategories(self.connect(), category)
 
     def search_products(self, search_query: str = "", suppliers: List[str] = None,
                        min_height: float = None, max_height: float = None,
@@ -221,9 +197,8 @@ class ProductSearchEngine:
 
         # 供应商筛选
         if suppliers and "ALL" not in suppliers:
-            placeholders = ','.join(['?' for _ in suppliers])
-            base_query += f" AND SU IN ({placeholders})"
-            params.extend(suppliers)
+            base_query += " AND SU IN (SELECT value FROM json_each(?))"
+            params.append(json.dumps(list(suppliers)))
 
         # 高度/长度筛选
         if min_height is not None:
@@ -243,42 +218,16 @@ class ProductSearchEngine:
             base_query += " AND CAST(COALESCE(NULLIF(Price, ''), '0') AS REAL) <= ?"
             params.append(max_price)
 
-        # 分类筛选
-        if category:
-            base_query += " AND nCategory = ?"
-            params.append(category)
-
-        # 子分类筛选
-        if subcategories:
-            placeholders = ','.join(['?' for _ in subcategories])
-            base_query += f" AND nSubCategory IN ({placeholders})"
-            params.extend(subcategories)
-
-        # 文本搜索
-        if search_query:
-            clean_query, include_words, exclude_words = self.parse_search_query(search_query)
-
-            # 构建搜索条件
-            search_conditions = []
-
-            if clean_query:
-                search_conditions.append("(LOWER(Description) LIKE ? OR LOWER(SKU) LIKE ? OR LOWER(Code) LIKE ?)")
-                search_term = f"%{clean_query}%"
-                params.extend([search_term, search_term, search_term])
-
-            # 包含词汇
-            for word in include_words:
-                search_conditions.append("LOWER(Description) LIKE ?")
-                params.append(f"%{word}%")
-
-            # 排除词汇
-            for word in exclude_words:
-                search_conditions.append("(LOWER(Description) NOT LIKE ? AND LOWER(SKU) NOT LIKE ? AND LOWER(Code) NOT LIKE ?)")
-                exclude_term = f"%{word}%"
-                params.extend([exclude_term, exclude_term, exclude_term])
+        # 分类、子分类筛选（名称解析为整数名称键）
+        category_clause, category_params = category_filter(category, subcategories, has_category_keys(conn))
+        base_query += category_clause
+        params.extend(category_params)
 
-            if search_conditions:
-                base_query += " AND " + " AND ".join(search_conditions)
+        # 文本搜索（编译为SQL条件）
+        compiled = compile_query(search_query or "")
+        if not compiled.is_empty:
+            base_query += f" AND ({compiled.sql})"
+            params.extend(compiled.sql_params)
 
         # 计算总数
         count_query = f"SELECT COUNT(*) FROM ({base_query})"
@@ -328,6 +277,8 @@ def main():
             - **排除搜索**：如 `-white`（不包含white）
             - **组合搜索**：如 `rose +red -white`
             - **或搜索**：如 `red or pink`
+            - **短语/分组**：如 `"white rose"`、`(big or large) +red`
+            - **字段前缀**：如 `sku:A553`、`sup:AB`
 
             ### 筛选条件：
             - **供应商**：选择特定供应商或"ALL"
@@ -0,0 +1,372 @@
+"""
+搜索语法解析与编译
+将关键词搜索字符串解析为语法树 (AST)，并编译为：
+- 逐行匹配函数（流式导出等逐行处理场景）
+- pandas 向量化布尔掩码（对候选集批量筛选）
+- SQL WHERE 片段（依赖 register_functions 注册的 ims_norm 函数）
+
+语法:
+    rose red            同时包含 rose 和 red（空格即 AND）
+    rose +red           同上，+ 为显式 AND
+    flower -white       包含 flower 但不包含 white（- 仅在词首时为 NOT，A553-10637 这类SKU保持原样）
+    red or blue         包含 red 或 blue（也可写作 OR 或 |）
+    "white rose"        短语，整体匹配
+    (big or large) +red 括号分组，可任意嵌套
+    sku:A553 sup:AB     字段前缀，只在指定字段中匹配
+
+编译结果按原始查询字符串缓存在 LRU 中，热门查询无需重复解析。
+"""
+
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+# 编译结果缓存大小
+PLAN_CACHE_SIZE = 512
+
+# 未指定字段前缀时参与匹配的字段
+DEFAULT_FIELDS = ("SKU", "Code", "Description", "nSubCategory")
+
+# 字段前缀 -> 数据库字段
+FIELD_PREFIXES = {
+    "sku": ("SKU",),
+    "code": ("Code",),
+    "desc": ("Description",),
+    "sub": ("nSubCategory",),
+    "cat": ("nCategory",),
+    "sup": ("SU",),
+}
+
+# 关键词匹配可能用到的全部字段
+SEARCHABLE_FIELDS = tuple(dict.fromkeys(
+    DEFAULT_FIELDS + tuple(field for fields in FIELD_PREFIXES.values() for field in fields)
+))
+
+# 这些字段前缀要求完全相等（标准化后），而不是包含
+EXACT_PREFIXES = {"sup"}
+
+# 多个字段标准化后拼接时使用的分隔符，不属于 \w，因此不会出现在标准化后的搜索词中，
+# 保证搜索词不会跨字段匹配
+FIELD_SEPARATOR = "\x1f"
+
+_NORMALIZE_PATTERN = re.compile(r"[^\w]")
+
+_TOKEN_PATTERN = re.compile(r'''
+    (?P<space>\s+)
+  | (?P<lparen>\()
+  | (?P<rparen>\))
+  | (?P<plus>\+)
+  | (?P<phrase>"[^"]*"?)
+  | (?P<word>[^\s()+"]+)
+''', re.VERBOSE)
+
+
+def normalize_text(text) -> str:
+    """标准化文本：移除标点符号、空格，转为小写"""
+    if text is None or text != text:  # None 或 NaN
+        return ""
+    return _NORMALIZE_PATTERN.sub("", str(text).lower())
+
+
+# ---------------------------------------------------------------------------
+# 语法树
+# ---------------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class Term:
+    """搜索词（已标准化）"""
+    value: str
+    prefix: Optional[str] = None
+
+    @property
+    def fields(self) -> Tuple[str, ...]:
+        return FIELD_PREFIXES[self.prefix] if self.prefix else DEFAULT_FIELDS
+
+    @property
+    def exact(self) -> bool:
+        return self.prefix in EXACT_PREFIXES
+
+
+@dataclass(frozen=True)
+class Not:
+    child: object
+
+
+@dataclass(frozen=True)
+class And:
+    children: Tuple[object, ...]
+
+
+@dataclass(frozen=True)
+class Or:
+    children: Tuple[object, ...]
+
+
+# ---------------------------------------------------------------------------
+# 词法分析与语法分析
+# ---------------------------------------------------------------------------
+
+def tokenize(query: str) -> List[Tuple[str, str]]:
+    """将查询字符串切分为 (类型, 值) 序列
+
+    类型: lparen, rparen, and, not, or, field, phrase, word
+    """
+    tokens = []
+    at_word_start = True
+    for match in _TOKEN_PATTERN.finditer(query):
+        kind = match.lastgroup
+        value = match.group()
+
+        if kind == "space":
+            at_word_start = True
+            continue
+
+        if kind == "plus":
+            tokens.append(("and", value))
+            at_word_start = True
+            continue
+
+        if kind == "phrase":
+            tokens.append(("phrase", value.strip('"')))
+        elif kind == "word":
+            # 词首的 - 表示 NOT；词中间的 - 是内容的一部分（如SKU）
+            while at_word_start and value.startswith("-"):
+                tokens.append(("not", "-"))
+                value = value[1:]
+            if not value:
+                continue
+
+            prefix, sep, rest = value.partition(":")
+            if sep and prefix.lower() in FIELD_PREFIXES:
+                tokens.append(("field", prefix.lower()))
+                if rest:
+                    tokens.append(("word", rest))
+            elif value.lower() == "or" or value == "|":
+                tokens.append(("or", value))
+            else:
+                tokens.append(("word", value))
+        else:
+            tokens.append((kind, value))
+
+        at_word_start = kind in ("lparen", "rparen", "phrase")
+
+    return tokens
+
+
+class _Parser:
+    """递归下降解析器
+
+    query   := or_expr
+    or_expr := and_expr (OR and_expr)*
+    and_expr:= unary (['+'] unary)*
+    unary   := '-' unary | primary
+    primary := '(' or_expr ')' | [field ':'] (word | phrase | '(' or_expr ')')
+
+    对用户输入保持宽容：缺失的右括号自动补齐，多余的右括号和悬空的操作符被忽略。
+    """
+
+    def __init__(self, tokens: List[Tuple[str, str]]):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.pos][0] if self.pos < len(self.tokens) else None
+
+    def advance(self) -> Tuple[str, str]:
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def parse(self):
+        nodes = []
+        while self.peek() is not None:
+            node = self.parse_or()
+            if node is not None:
+                nodes.append(node)
+            if self.peek() == "rparen":
+                self.advance()  # 多余的右括号
+        return _combine(And, nodes)
+
+    def parse_or(self, prefix: Optional[str] = None):
+        nodes = []
+        node = self.parse_and(prefix)
+        if node is not None:
+            nodes.append(node)
+        while self.peek() == "or":
+            self.advance()
+            node = self.parse_and(prefix)
+            if node is not None:
+                nodes.append(node)
+        return _combine(Or, nodes)
+
+    def parse_and(self, prefix: Optional[str] = None):
+        nodes = []
+        while self.peek() not in (None, "or", "rparen"):
+            if self.peek() == "and":
+                self.advance()
+                continue
+            node = self.parse_unary(prefix)
+            if node is not None:
+                nodes.append(node)
+        return _combine(And, nodes)
+
+    def parse_unary(self, prefix: Optional[str] = None):
+        if self.peek() == "not":
+            self.advance()
+            if self.peek() in (None, "or", "rparen", "and"):
+                return None  # 悬空的 -
+            child = self.parse_unary(prefix)
+            return Not(child) if child is not None else None
+        return self.parse_primary(prefix)
+
+    def parse_primary(self, prefix: Optional[str] = None):
+        kind, value = self.advance()
+
+        if kind == "lparen":
+            node = self.parse_or(prefix)
+            if self.peek() == "rparen":
+                self.advance()
+            return node
+
+        if kind == "field":
+            if self.peek() in ("word", "phrase", "lparen"):
+                return self.parse_primary(value)
+            return None
+
+        if kind in ("word", "phrase"):
+            term = normalize_text(value)
+            return Term(term, prefix) if term else None
+
+        return None
+
+
+def _combine(node_type, nodes):
+    """合并子节点：空则返回None，单个则直接返回"""
+    if not nodes:
+        return None
+    if len(nodes) == 1:
+        return nodes[0]
+    return node_type(tuple(nodes))
+
+
+def parse_query(query: str):
+    """解析查询字符串为语法树；空查询返回None"""
+    if not query or not query.strip():
+        return None
+    return _Parser(tokenize(query.strip())).parse()
+
+
+# ---------------------------------------------------------------------------
+# 编译
+# ---------------------------------------------------------------------------
+
+def _normalize_fields(values) -> str:
+    return FIELD_SEPARATOR.join(normalize_text(value) for value in values)
+
+
+def _match_row(node, normalized: Dict[Tuple[str, ...], str], row: Dict) -> bool:
+    if isinstance(node, Term):
+        text = normalized.get(node.fields)
+        if text is None:
+            text = normalized[node.fields] = _normalize_fields(row.get(field) for field in node.fields)
+        return text == node.value if node.exact else node.value in text
+    if isinstance(node, Not):
+        return not _match_row(node.child, normalized, row)
+    if isinstance(node, And):
+        return all(_match_row(child, normalized, row) for child in node.children)
+    return any(_match_row(child, normalized, row) for child in node.children)
+
+
+def _match_mask(node, normalized: Dict, df):
+    if isinstance(node, Term):
+        series = normalized.get(node.fields)
+        if series is None:
+            series = normalized[node.fields] = _normalize_series(df, node.fields)
+        if node.exact:
+            return series == node.value
+        return series.str.contains(node.value, regex=False)
+    if isinstance(node, Not):
+        return ~_match_mask(node.child, normalized, df)
+    masks = [_match_mask(child, normalized, df) for child in node.children]
+    result = masks[0]
+    for mask in masks[1:]:
+        result = (result & mask) if isinstance(node, And) else (result | mask)
+    return result
+
+
+def _normalize_series(df, fields: Tuple[str, ...]):
+    parts = [
+        df[field].fillna("").astype(str).str.lower().str.replace(_NORMALIZE_PATTERN, "", regex=True)
+        for field in fields
+    ]
+    series = parts[0]
+    for part in parts[1:]:
+        series = series + FIELD_SEPARATOR + part
+    return series
+
+
+def _to_sql(node) -> Tuple[str, List]:
+    if isinstance(node, Term):
+        expression = f"ims_norm({', '.join(node.fields)})"
+        if node.exact:
+            return f"{expression} = ?", [node.value]
+        return f"instr({expression}, ?) > 0", [node.value]
+    if isinstance(node, Not):
+        sql, params = _to_sql(node.child)
+        return f"NOT ({sql})", params
+    joiner = " AND " if isinstance(node, And) else " OR "
+    parts, params = [], []
+    for child in node.children:
+        sql, child_params = _to_sql(child)
+        parts.append(f"({sql})")
+        params.extend(child_params)
+    return joiner.join(parts), params
+
+
+class CompiledQuery:
+    """编译后的搜索查询"""
+
+    def __init__(self, raw: str, ast):
+        self.raw = raw
+        self.ast = ast
+        if ast is None:
+            self.sql, self.sql_params = "1=1", ()
+        else:
+            sql, params = _to_sql(ast)
+            self.sql, self.sql_params = sql, tuple(params)
+
+    @property
+    def is_empty(self) -> bool:
+        """空查询匹配所有记录"""
+        return self.ast is None
+
+    def matches(self, row: Dict) -> bool:
+        """判断单条记录（字段名 -> 值）是否匹配"""
+        if self.ast is None:
+            return True
+        return _match_row(self.ast, {}, row)
+
+    def mask(self, df, normalized: Dict = None):
+        """对DataFrame计算布尔掩码
+
+        normalized 可传入一个字典作为标准化字段的缓存，同一个DataFrame上执行多个查询时复用。
+        """
+        import pandas as pd
+
+        if self.ast is None:
+            return pd.Series(True, index=df.index)
+        if normalized is None:
+            normalized = {}
+        return _match_mask(self.ast, normalized, df)
+
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def compile_query(query: str) -> CompiledQuery:
+    """解析并编译查询字符串（按原始字符串缓存）"""
+    return CompiledQuery(query, parse_query(query))
+
+
+def register_functions(conn):
+    """在SQLite连接上注册 CompiledQuery.sql 所需的函数"""
+    conn.create_function("ims_norm", -1, lambda *values: _normalize_fields(values), deterministic=True)
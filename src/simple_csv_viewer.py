@@ -1,4 +1,5 @@
 import csv
+import itertools
 import os
 import json
 from pathlib import Path
@@ -23,23 +24,25 @@ class SimpleCSVViewer:
                 csv_files.append(file.name)
         return csv_files
 
-    def read_csv(self, filename):
-        """读取 CSV 文件"""
+    def read_csv(self, filename, preview_rows=5):
+        """读取 CSV 文件的前 preview_rows 行和总行数（逐行扫描计数，不把整个文件保存在内存中）"""
         try:
             file_path = self.data_raw_path / filename
             with open(file_path, 'r', encoding='utf-8') as file:
                 reader = csv.DictReader(file)
-                data = list(reader)
-                return data, None
+                data = list(itertools.islice(reader, preview_rows))
+                total = len(data) + sum(1 for _ in reader)
+                return (data, total), None
         except Exception as e:
             return None, str(e)
 
     def display_csv_info(self, filename):
         """显示 CSV 文件信息"""
-        data, error = self.read_csv(filename)
+        result, error = self.read_csv(filename)
         if error:
             print(f"读取文件失败: {error}")
             return
+        data, total = result
 
         if not data:
             print("文件为空")
@@ -47,7 +50,7 @@ class SimpleCSVViewer:
 
         print(f"\n文件: {filename}")
         print("=" * 50)
-        print(f"行数: {len(data)}")
+        print(f"行数: {total}")
 
         if data:
             print(f"列名: {', '.join(data[0].keys())}")
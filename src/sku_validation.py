@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SKU结构校验
+SKU = 供应商字母 + 3位 CatCode + 5位 ModelCode（见 data/raw/LTreadme.csv），如 A55310637。
+整列SKU用一个编译好的正则一次拆分，再与 SU、CatCode、ModelCode 字段及 product_categories 表
+（哈希连接）逐项核对，输出不一致的明细：
+
+- format        SKU 不符合 字母+8位数字 的格式
+- catcode       CatCode 字段与SKU中的分类码不一致（CSV中的CatCode会丢掉前导零，按数值比较）
+- modelcode     ModelCode 字段与SKU中的型号码不一致（同样按数值比较）
+- codes_missing CatCode 或 ModelCode 为空
+- supplier      SKU首字母与该供应商 (SU) 大多数SKU使用的字母不同
+- category      SKU中的分类码在 product_categories 中不存在，或 nCategory 与分类表不一致
+- subcategory   nSubCategory 与分类表的子分类名称不同（忽略空格和大小写）
+
+用法:
+    python sku_validation.py                                   # 校验 data/inventory.db
+    python sku_validation.py ../data/raw/LT.csv                # 校验原始CSV
+    python sku_validation.py ../data/raw/LT.csv mismatches.csv # 同时输出全部不一致明细
+"""
+
+import os
+import re
+import sys
+import time
+import sqlite3
+from typing import Dict
+
+from catalog_snapshot import read_products
+
+# 整列SKU以换行连接后用这一个正则扫描一遍，每行得到一个结果：符合格式时为SKU本身，否则为空
+SKU_PATTERN = re.compile(r'^(?:([A-Z]\d{8})$|.*$)', re.MULTILINE)
+
+SKU_FIELDS = ['SKU', 'SU', 'CatCode', 'ModelCode', 'nCategory', 'nSubCategory']
+
+# (检查名, 说明, 级别)
+CHECKS = [
+    ("format", "SKU格式不是 字母+3位CatCode+5位ModelCode", "error"),
+    ("catcode", "CatCode 与SKU不一致", "error"),
+    ("modelcode", "ModelCode 与SKU不一致", "error"),
+    ("codes_missing", "CatCode 或 ModelCode 为空", "warning"),
+    ("supplier", "SKU首字母与供应商的常用字母不同", "warning"),
+    ("category_unknown", "SKU中的分类码不在 product_categories 中", "error"),
+    ("category", "nCategory 与分类表不一致", "error"),
+    ("subcategory", "nSubCategory 与分类表不一致", "warning"),
+]
+
+# 每项检查在报告中显示的样本数
+SAMPLE_SIZE = 5
+
+DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'inventory.db')
+CATEGORIES_CSV = os.path.join(os.path.dirname(__file__), '..', 'data', 'raw', 'CSNEW.csv')
+
+
+def load_products(source: str):
+    """读取校验所需的字段（数据库或CSV），全部为文本，空值为 ''；数据库有当前版本的列式快照时读取快照"""
+    import pandas as pd
+
+    if source.lower().endswith('.csv'):
+        df = pd.read_csv(source, usecols=lambda column: column in SKU_FIELDS, dtype=str, keep_default_na=False)
+    else:
+        df = read_products(SKU_FIELDS, db_path=source)
+    for field in SKU_FIELDS:
+        df[field] = df[field].fillna('').astype(str).str.strip() if field in df.columns else ''
+    return df
+
+
+def load_categories(db_path: str = DB_PATH):
+    """分类表 (cat_code, ncategory, nsubcategory)；数据库中没有 product_categories 时读取 CSNEW.csv"""
+    import pandas as pd
+
+    try:
+        conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+        try:
+            categories = pd.read_sql_query(
+                "SELECT cat_code, ncategory, nsubcategory FROM product_categories", conn
+            )
+        finally:
+            conn.close()
+    except (sqlite3.OperationalError, pd.errors.DatabaseError):
+        categories = pd.read_csv(CATEGORIES_CSV, dtype=str, keep_default_na=False).rename(
+            columns={'CatCode': 'cat_code', 'nCategory': 'ncategory', 'nSubCategory': 'nsubcategory'}
+        )
+    categories['cat_code'] = categories['cat_code'].astype(str).str.strip().str.zfill(3)
+    return categories.drop_duplicates('cat_code')
+
+
+def decompose_skus(skus):
+    """拆分整列SKU，返回 (valid, letter, cat_code, model_code) 四个 numpy 数组
+
+    正则只扫描一次连接后的整列文本；符合格式的SKU是定长的，字母和数字按位置直接从
+    Unicode 码点数组中取出，不再逐行处理。
+    """
+    import numpy as np
+
+    values = skus.tolist()
+    found = SKU_PATTERN.findall("\n".join(values))
+    if len(found) != len(values):
+        # SKU 中含有换行符（必然不符合格式），替换后重新扫描以保持行对齐
+        found = SKU_PATTERN.findall("\n".join(value.replace("\n", " ") for value in values))
+
+    codepoints = np.array(found, dtype='U9').view(np.uint32).reshape(len(found), 9)
+    valid = codepoints[:, 0] != 0
+    digits = codepoints[:, 1:].astype(np.int64) - ord('0')
+    cat_code = digits[:, :3] @ np.array([100, 10, 1])
+    model_code = digits[:, 3:] @ np.array([10000, 1000, 100, 10, 1])
+    letter = np.where(valid, codepoints[:, 0], 0)
+    return valid, letter, cat_code, model_code
+
+
+def map_unique(series, func):
+    """对列中的不同值计算 func，再按编码映射回每一行（分类、供应商等低基数列只需计算少量值）"""
+    import pandas as pd
+
+    codes, uniques = pd.factorize(series)
+    return func(pd.Series(uniques)).to_numpy()[codes]
+
+
+def to_code(values):
+    """字段值转换为整数码（"8" 与 "008" 相同），空值和非数字为 NaN"""
+    import pandas as pd
+
+    return pd.to_numeric(values, errors='coerce')
+
+
+def normalize_name(names):
+    return names.str.replace(r'\s+', '', regex=True).str.casefold()
+
+
+def check_skus(products, categories) -> Dict:
+    """向量化核对全部SKU
+
+    返回 {"rows", "elapsed", "checks": [{"name", "description", "level", "count"}], "mismatches"}，
+    mismatches 为 DataFrame (SKU, check, expected, actual)，每个不一致一行。
+    """
+    import numpy as np
+    import pandas as pd
+
+    started = time.monotonic()
+    valid, letter, cat_code, model_code = decompose_skus(products['SKU'])
+
+    # 每个供应商最常用的SKU首字母
+    supplier_codes, suppliers = pd.factorize(products['SU'])
+    has_supplier = valid & (products['SU'].to_numpy() != '')
+    pairs = pd.DataFrame({'supplier': supplier_codes[has_supplier], 'letter': letter[has_supplier]})
+    majority = pairs.value_counts().reset_index().drop_duplicates('supplier').set_index('supplier')['letter']
+    expected_letter = majority.reindex(range(len(suppliers))).to_numpy()[supplier_codes]
+
+    # 按SKU中的分类码与分类表做哈希连接（左连接保持行顺序）
+    table = pd.DataFrame({
+        'cat_code': to_code(categories['cat_code']),
+        'ncategory': categories['ncategory'],
+        'nsubcategory': categories['nsubcategory'],
+        'normalized': normalize_name(categories['nsubcategory']),
+    }).dropna(subset=['cat_code']).astype({'cat_code': 'int64'})
+    joined = pd.DataFrame({'cat_code': np.where(valid, cat_code, -1)}).merge(table, how='left', on='cat_code')
+    known = joined['ncategory'].notna().to_numpy()
+
+    cat_field = map_unique(products['CatCode'], to_code)
+    model_field = map_unique(products['ModelCode'], to_code)
+    cat_blank = products['CatCode'].to_numpy() == ''
+    model_blank = products['ModelCode'].to_numpy() == ''
+    category = products['nCategory'].to_numpy(dtype=object)
+    subcategory = map_unique(products['nSubCategory'], normalize_name)
+
+    masks = {
+        "format": ~valid,
+        "catcode": valid & ~cat_blank & (cat_field != cat_code),
+        "modelcode": valid & ~model_blank & (model_field != model_code),
+        "codes_missing": valid & (cat_blank | model_blank),
+        "supplier": valid & ~np.isnan(expected_letter) & (letter != np.nan_to_num(expected_letter)),
+        "category_unknown": valid & ~known,
+        "category": known & (category != joined['ncategory'].to_numpy(dtype=object)),
+        "subcategory": known & (subcategory != joined['normalized'].to_numpy(dtype=object)),
+    }
+
+    # 只为不一致的行生成 应为/实际 文本
+    def letters(codes):
+        return [chr(int(code)) for code in codes]
+
+    def codes_text(cats, models):
+        return [f"{c:03d}/{m:05d}" for c, m in zip(cats, models)]
+
+    describe = {
+        "format": lambda rows: (['字母+8位数字'] * len(rows), products['SKU'].to_numpy()[rows]),
+        "catcode": lambda rows: ([f"{code:03d}" for code in cat_code[rows]], products['CatCode'].to_numpy()[rows]),
+        "modelcode": lambda rows: ([f"{code:05d}" for code in model_code[rows]], products['ModelCode'].to_numpy()[rows]),
+        "codes_missing": lambda rows: (codes_text(cat_code[rows], model_code[rows]),
+                                       products['CatCode'].to_numpy()[rows] + '/' + products['ModelCode'].to_numpy()[rows]),
+        "supplier": lambda rows: (letters(expected_letter[rows]), letters(letter[rows])),
+        "category_unknown": lambda rows: ([f"{code:03d}" for code in cat_code[rows]], [''] * len(rows)),
+        "category": lambda rows: (joined['ncategory'].to_numpy()[rows], category[rows]),
+        "subcategory": lambda rows: (joined['nsubcategory'].to_numpy()[rows], products['nSubCategory'].to_numpy()[rows]),
+    }
+
+    frames, checks = [], []
+    for name, description, level in CHECKS:
+        rows = np.flatnonzero(masks[name])
+        checks.append({"name": name, "description": description, "level": level, "count": len(rows)})
+        if len(rows):
+            expected, actual = describe[name](rows)
+            frames.append(pd.DataFrame({
+                "SKU": products['SKU'].to_numpy()[rows],
+                "check": name,
+                "expected": expected,
+                "actual": actual,
+            }))
+
+    mismatches = (pd.concat(frames, ignore_index=True) if frames
+                  else pd.DataFrame(columns=["SKU", "check", "expected", "actual"]))
+    return {
+        "rows": len(products),
+        "elapsed": round(time.monotonic() - started, 2),
+        "checks": checks,
+        "mismatches": mismatches,
+    }
+
+
+def print_report(result):
+    print(f"总记录数: {result['rows']}  (用时 {result['elapsed']}s)\n")
+    mismatches = result["mismatches"]
+    for check in result["checks"]:
+        label = "错误" if check["level"] == "error" else "警告"
+        if not check["count"]:
+            print(f"  {check['description']}: 通过")
+            continue
+        print(f"  {label}: {check['description']} - {check['count']} 条")
+        samples = mismatches[mismatches["check"] == check["name"]].head(SAMPLE_SIZE)
+        for row in samples.itertuples(index=False):
+            print(f"      {row.SKU}: 应为 {row.expected}，实际 {row.actual or '(空)'}")
+
+
+def validate_skus(source: str = None, output: str = None):
+    """校验SKU结构并打印报告；output 不为空时把全部不一致明细写入CSV"""
+    source = source or DB_PATH
+    print(f"=== SKU结构校验: {source} ===\n")
+    result = check_skus(load_products(source), load_categories())
+    print_report(result)
+    if output:
+        result["mismatches"].to_csv(output, index=False, encoding='utf-8-sig')
+        print(f"\n不一致明细已写入: {output} ({len(result['mismatches'])} 行)")
+    return result
+
+
+if __name__ == "__main__":
+    result = validate_skus(sys.argv[1] if len(sys.argv) > 1 else None,
+                           sys.argv[2] if len(sys.argv) > 2 else None)
+    errors = sum(check["count"] for check in result["checks"] if check["level"] == "error")
+    sys.exit(1 if errors else 0)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据校验规则引擎
+规则以声明方式定义（检查哪些字段、怎样算违规），数据源（数据库 products 表或原始 LT.csv）
+分块读取，每块用 pandas 对全部规则做一次向量化计算，只累计每条规则的违规数和前几个违规SKU，
+内存占用与数据量无关（唯一例外是重复SKU检查，需要记住已出现过的SKU）。
+
+CSV 中的金额和百分比带有 "$"、","、"%"（如 "$1,165.00"、"30%"），
+to_number 统一去掉这些符号后再转换为数字，导入数据库时使用同一个函数。
+"""
+
+import os
+import sqlite3
+import time
+from typing import Callable, Dict, Iterable, Iterator, List
+
+# 每块读取的记录数
+CHUNK_SIZE = 5000
+
+# 每条规则保留的违规SKU样本数
+SAMPLE_SIZE = 5
+
+# 数值字段（与 database_setup 导入时转换的字段相同）
+NUMERIC_FIELDS = ['NetCost', 'DiscRate', 'FinalCost', 'RefPrice', 'ListPrice',
+                  'RegularPrice', 'SalePrice', 'Qty', 'Stock', 'Sold', 'PostID',
+                  'Index', 'Price', 'PNLen', 'Per']
+
+# 价格比较的容差
+PRICE_TOLERANCE = 0.005
+
+
+def to_number(series):
+    """将一列转换为浮点数：去掉货币符号、千位分隔符和百分号，空值和无法解析的值为 NaN"""
+    import pandas as pd
+
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype(float)
+    text = series.astype(str).str.replace(r'[$,%\s]', '', regex=True)
+    return pd.to_numeric(text.where(text != ''), errors='coerce')
+
+
+class ChunkView:
+    """一块数据的规则计算视图，按字段缓存文本和数值形式"""
+
+    def __init__(self, chunk):
+        self.chunk = chunk
+        self._text = {}
+        self._number = {}
+
+    def text(self, field: str):
+        """字段的文本形式，空值为 ''"""
+        if field not in self._text:
+            column = self.chunk[field]
+            self._text[field] = column.where(column.notna(), '').astype(str).str.strip()
+        return self._text[field]
+
+    def number(self, field: str):
+        """字段的数值形式，空值和无法解析的值为 NaN"""
+        if field not in self._number:
+            self._number[field] = to_number(self.chunk[field])
+        return self._number[field]
+
+
+class Rule:
+    """一条校验规则
+
+    check(view) 返回布尔 Series，True 表示该行违规；
+    level 为 error（数据错误）、warning（需要人工确认）或 info（仅统计）。
+    """
+
+    def __init__(self, name: str, description: str, columns: List[str],
+                 check: Callable[[ChunkView], "object"], level: str = "error"):
+        self.name = name
+        self.description = description
+        self.columns = columns
+        self.check = check
+        self.level = level
+
+
+def required(field: str) -> Rule:
+    return Rule(f"required:{field}", f"{field} 不能为空", [field],
+                lambda view: view.text(field) == '')
+
+
+def numeric(field: str) -> Rule:
+    return Rule(f"numeric:{field}", f"{field} 必须是数字", [field],
+                lambda view: (view.text(field) != '') & view.number(field).isna())
+
+
+def non_negative(field: str) -> Rule:
+    return Rule(f"non_negative:{field}", f"{field} 不能为负数", [field],
+                lambda view: view.number(field) < 0)
+
+
+def integer(field: str) -> Rule:
+    return Rule(f"integer:{field}", f"{field} 必须是整数", [field],
+                lambda view: view.number(field).notna() & (view.number(field) % 1 != 0))
+
+
+def at_most(field: str, limit: float) -> Rule:
+    return Rule(f"at_most:{field}", f"{field} 不能超过 {limit}", [field],
+                lambda view: view.number(field) > limit)
+
+
+def blank(field: str) -> Rule:
+    return Rule(f"blank:{field}", f"空{field}", [field],
+                lambda view: view.text(field) == '', level="info")
+
+
+RULES = [
+    required('SKU'),
+    required('Description'),
+    required('nCategory'),
+    *[numeric(field) for field in NUMERIC_FIELDS],
+    *[non_negative(field) for field in ['Stock', 'Qty', 'Sold', 'Price', 'ListPrice', 'NetCost', 'FinalCost']],
+    *[integer(field) for field in ['Stock', 'Qty', 'Sold']],
+    at_most('PNLen', 22),
+    Rule("consistent:PNLen", "PNLen 与 PNDesc 的长度一致", ['PNLen', 'PNDesc'],
+         lambda view: view.number('PNLen') != view.text('PNDesc').str.len(), level="warning"),
+    Rule("consistent:outofstock", "库存状态为 outofstock 但库存 > 0", ['StockStatus', 'Stock'],
+         lambda view: (view.text('StockStatus') == 'outofstock') & (view.number('Stock') > 0), level="warning"),
+    Rule("consistent:instock", "库存状态为 instock 但库存 <= 0", ['StockStatus', 'Stock'],
+         lambda view: (view.text('StockStatus') == 'instock') & (view.number('Stock') <= 0), level="warning"),
+    Rule("consistent:Price", "Price 与 ListPrice 一致", ['Price', 'ListPrice'],
+         lambda view: (view.number('Price') > 0) & (view.number('ListPrice') > 0)
+         & ((view.number('Price') - view.number('ListPrice')).abs() > PRICE_TOLERANCE), level="warning"),
+    *[blank(field) for field in ['Barcode', 'Location', 'Color', 'Image']],
+]
+
+
+def rule_columns(rules: Iterable[Rule]) -> List[str]:
+    """规则用到的全部字段（含 SKU，用于违规样本）"""
+    columns = ['SKU']
+    for rule in rules:
+        columns += [column for column in rule.columns if column not in columns]
+    return columns
+
+
+def iter_database_chunks(db_path: str, columns: List[str], chunk_size: int = CHUNK_SIZE) -> Iterator:
+    """分块读取 products 表（只读连接）；表中没有的字段不读取"""
+    import pandas as pd
+
+    conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+    try:
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(products)")}
+        selected = ', '.join(f'"{column}"' for column in columns if column in existing)
+        yield from pd.read_sql_query(f"SELECT {selected} FROM products", conn, chunksize=chunk_size)
+    finally:
+        conn.close()
+
+
+def iter_csv_chunks(csv_path: str, columns: List[str], chunk_size: int = CHUNK_SIZE) -> Iterator:
+    """分块读取CSV（全部按文本读取，保留原始格式以便检查数字格式）；文件中没有的字段不读取"""
+    import pandas as pd
+
+    wanted = set(columns)
+    yield from pd.read_csv(csv_path, usecols=lambda column: column in wanted, dtype=str,
+                           keep_default_na=False, chunksize=chunk_size)
+
+
+def validate(chunks: Iterable, rules: List[Rule] = None, sample_size: int = SAMPLE_SIZE) -> Dict:
+    """对数据块逐块计算全部规则
+
+    返回 {"rows", "elapsed", "rules": [{"name", "description", "level", "violations", "samples"}], "skipped"}；
+    数据源缺少字段的规则列入 skipped。
+    """
+    rules = RULES if rules is None else rules
+    started = time.monotonic()
+    results = {rule.name: {"name": rule.name, "description": rule.description, "level": rule.level,
+                           "violations": 0, "samples": []} for rule in rules}
+    duplicates = {"name": "unique:SKU", "description": "SKU 不能重复", "level": "error",
+                  "violations": 0, "samples": []}
+    seen_skus = set()
+    skipped = set()
+    rows = 0
+
+    for chunk in chunks:
+        view = ChunkView(chunk)
+        skus = view.text('SKU') if 'SKU' in chunk.columns else None
+        labels = skus.where(skus != '', [f"#{rows + i + 1}" for i in range(len(chunk))]) if skus is not None else None
+
+        for rule in rules:
+            if any(column not in chunk.columns for column in rule.columns):
+                skipped.add(rule.name)
+                continue
+            mask = rule.check(view).fillna(False).astype(bool)
+            result = results[rule.name]
+            result["violations"] += int(mask.sum())
+            if labels is not None and len(result["samples"]) < sample_size:
+                result["samples"] += labels[mask].head(sample_size - len(result["samples"])).tolist()
+
+        if skus is not None:
+            present = skus[skus != '']
+            repeated = present[present.duplicated() | present.isin(seen_skus)]
+            duplicates["violations"] += len(repeated)
+            if len(duplicates["samples"]) < sample_size:
+                duplicates["samples"] += repeated.head(sample_size - len(duplicates["samples"])).tolist()
+            seen_skus.update(present)
+
+        rows += len(chunk)
+
+    ordered = [results[rule.name] for rule in rules if rule.name not in skipped]
+    return {
+        "rows": rows,
+        "elapsed": round(time.monotonic() - started, 2),
+        "rules": [duplicates] + ordered,
+        "skipped": sorted(skipped),
+    }
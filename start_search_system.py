@@ -7,31 +7,43 @@
 
 import os
 import sys
+import importlib.util
 import subprocess
 import webbrowser
 import time
 from pathlib import Path
 
+# 服务端口
+STREAMLIT_PORT = 8501
+API_PORT = 5000
+
+# 等待服务就绪的最长时间（秒）
+READY_TIMEOUT = 60
+
+# 崩溃重启的退避时间：1, 2, 4 ... 秒，最长 RESTART_BACKOFF_MAX 秒
+RESTART_BACKOFF_BASE = 1
+RESTART_BACKOFF_MAX = 30
+
+# 连续重启失败多少次后放弃
+RESTART_MAX_ATTEMPTS = 5
+
+# 服务稳定运行多久后清零失败计数（秒）
+RESTART_RESET_AFTER = 60
+
 def check_requirements():
-    """检查必要的依赖包"""
+    """检查必要的依赖包（只查找模块，不导入，避免加载 streamlit、flask 等大型包）"""
     required_packages = [
         'streamlit',
         'flask',
         'flask_cors',
         'pandas',
+        'pyarrow',
         'sqlite3'
     ]
 
     missing_packages = []
     for package in required_packages:
-        try:
-            if package == 'sqlite3':
-                import sqlite3
-            elif package == 'flask_cors':
-                import flask_cors
-            else:
-                __import__(package)
-        except ImportError:
+        if importlib.util.find_spec(package) is None:
             missing_packages.append(package)
 
     return missing_packages
@@ -57,94 +69,201 @@ def check_database():
     print(f"✅ 数据库文件存在: {db_path}")
     return True
 
-def start_streamlit_app():
-    """启动Streamlit应用"""
-    print("\n🚀 启动Streamlit检索应用...")
+class ManagedService:
+    """启动器管理的一个子进程服务"""
+
+    def __init__(self, name, cmd, ready_urls, url, warm_up=None, cwd="src", env=None):
+        self.name = name
+        self.cmd = cmd
+        self.ready_urls = ready_urls  # 任一地址返回200即视为就绪
+        self.url = url
+        self.warm_up = warm_up  # 就绪后执行的预热函数
+        self.cwd = cwd
+        self.env = env
+        self.process = None
+        self.started_at = None
+        self.failures = 0
+        self.next_restart = None
+        self.recovering = False
+        self.given_up = False
+
+    def start(self):
+        env = dict(os.environ, **(self.env or {}))
+        self.process = subprocess.Popen(self.cmd, cwd=self.cwd, env=env)
+        self.started_at = time.monotonic()
+        self.next_restart = None
+
+    def is_running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def is_ready(self):
+        """请求健康检查地址，返回200即为就绪"""
+        import urllib.request
+        import urllib.error
+
+        for url in self.ready_urls:
+            try:
+                with urllib.request.urlopen(url, timeout=2) as response:
+                    if response.status == 200:
+                        return True
+            except (urllib.error.URLError, OSError):
+                continue
+        return False
 
-    # 切换到src目录
-    src_dir = Path("src")
-    if not src_dir.exists():
+    def stop(self, timeout=10):
+        if not self.is_running():
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+def create_streamlit_service():
+    # headless: 由启动器在预热完成后打开浏览器
+    cmd = [sys.executable, "-m", "streamlit", "run", "product_search_enhanced.py",
+           "--server.port", str(STREAMLIT_PORT), "--server.headless", "true"]
+    base = f"http://localhost:{STREAMLIT_PORT}"
+    # 新版本 Streamlit 的健康检查地址为 /_stcore/health，旧版本为 /healthz
+    # Streamlit 界面直接读取数据库，预热数据库文件
+    return ManagedService("Streamlit检索界面", cmd, [f"{base}/_stcore/health", f"{base}/healthz"], base,
+                          warm_up=lambda script: script.warm_up_database("data/inventory.db"))
+
+def create_api_service():
+    # 从src目录运行，数据库相对路径 ../data/inventory.db 才能正确解析
+    cmd = [sys.executable, "api/serve.py"]
+    base = f"http://localhost:{API_PORT}"
+    # /api/ready 在候选集快照加载完成后才返回200
+    return ManagedService("API服务器", cmd, [f"{base}/api/ready"], base,
+                          warm_up=lambda script: script.warm_up_api(base), env={"IMS_PORT": str(API_PORT)})
+
+def wait_until_ready(services, timeout=READY_TIMEOUT):
+    """并行轮询各服务的健康检查地址，全部就绪返回True；有服务退出或超时返回False"""
+    pending = list(services)
+    started = time.monotonic()
+    while pending:
+        for service in list(pending):
+            if not service.is_running():
+                print(f"❌ {service.name} 启动失败 (退出码 {service.process.returncode})")
+                return False
+            if service.is_ready():
+                print(f"✅ {service.name} 已就绪 ({time.monotonic() - started:.1f}s)")
+                pending.remove(service)
+        if pending:
+            if time.monotonic() - started > timeout:
+                print(f"❌ 等待超时: {', '.join(service.name for service in pending)} 在 {timeout} 秒内未就绪")
+                return False
+            time.sleep(0.5)
+    return True
+
+def warm_up(services):
+    """执行预热请求（scripts/warm_up.py），让首个用户请求不再承担冷启动开销"""
+    sys.path.insert(0, str(Path("scripts").resolve()))
+    try:
+        import warm_up as warm_up_script
+    except ImportError:
+        print("⚠️ 未找到预热脚本 scripts/warm_up.py，跳过预热")
+        return
+
+    for service in services:
+        if service.warm_up is None:
+            continue
+        print(f"🔥 正在预热{service.name}...")
+        try:
+            stats = service.warm_up(warm_up_script)
+        except Exception as e:
+            print(f"⚠️ {service.name} 预热失败: {e}")
+            continue
+        if "failures" in stats:
+            print(f"✅ 预热完成: {stats['requests']} 个请求, {stats['failures']} 个失败, 用时 {stats['elapsed']}s")
+
+def supervise(services):
+    """监视子进程，意外退出时按指数退避重启；Ctrl+C 停止全部服务"""
+    while True:
+        time.sleep(1)
+        now = time.monotonic()
+        for service in services:
+            if service.given_up:
+                continue
+
+            if service.is_running():
+                if service.recovering and service.is_ready():
+                    service.recovering = False
+                    print(f"✅ {service.name} 已恢复")
+                    warm_up([service])
+                if service.failures and now - service.started_at > RESTART_RESET_AFTER:
+                    service.failures = 0
+                continue
+
+            if service.next_restart is None:
+                service.failures += 1
+                if service.failures > RESTART_MAX_ATTEMPTS:
+                    print(f"❌ {service.name} 连续 {RESTART_MAX_ATTEMPTS} 次重启失败，已放弃")
+                    service.given_up = True
+                    continue
+                delay = min(RESTART_BACKOFF_BASE * 2 ** (service.failures - 1), RESTART_BACKOFF_MAX)
+                print(f"⚠️ {service.name} 意外退出 (退出码 {service.process.returncode})，{delay} 秒后重启")
+                service.next_restart = now + delay
+            elif now >= service.next_restart:
+                print(f"🔄 正在重启 {service.name} (第 {service.failures} 次)...")
+                service.start()
+                service.recovering = True
+
+        if all(service.given_up for service in services):
+            return
+
+def start_services(services, open_browser=None):
+    """并行启动服务，等待就绪并预热后打开浏览器，然后持续监视直到用户中断"""
+    if not Path("src").exists():
         print("❌ src目录不存在")
         return False
 
-    os.chdir(src_dir)
-
     try:
-        # 启动streamlit应用
-        cmd = [sys.executable, "-m", "streamlit", "run", "product_search_enhanced.py"]
-        print(f"执行命令: {' '.join(cmd)}")
-        print("⏳ 应用正在启动...")
+        for service in services:
+            print(f"\n🚀 启动{service.name}...")
+            print(f"执行命令: {' '.join(service.cmd)}")
+            service.start()
 
-        # 在新进程中启动
-        process = subprocess.Popen(cmd)
+        print("⏳ 正在等待服务就绪...")
+        if not wait_until_ready(services):
+            return False
 
-        # 等待几秒后自动打开浏览器
-        time.sleep(3)
-        webbrowser.open("http://localhost:8501")
+        warm_up(services)
 
-        print("✅ Streamlit应用已启动")
-        print("🌐 访问地址: http://localhost:8501")
-        print("💡 按 Ctrl+C 停止应用")
+        if open_browser:
+            webbrowser.open(open_browser)
 
-        # 等待进程结束
-        process.wait()
+        for service in services:
+            print(f"🌐 {service.name}: {service.url}")
+        print("💡 按 Ctrl+C 停止")
+
+        supervise(services)
         return True
 
     except KeyboardInterrupt:
-        print("\n👋 用户中断，正在停止应用...")
+        print("\n👋 用户中断，正在停止服务...")
         return True
     except Exception as e:
         print(f"❌ 启动失败: {e}")
         return False
+    finally:
+        for service in services:
+            service.stop()
+
+def start_streamlit_app():
+    """启动Streamlit应用"""
+    service = create_streamlit_service()
+    return start_services([service], open_browser=service.url)
 
 def start_api_server():
     """启动API服务器"""
-    print("\n🚀 启动API服务器...")
-
-    # 切换到api目录
-    api_dir = Path("src/api")
-    if not api_dir.exists():
-        print("❌ src/api目录不存在")
-        return False
-
-    os.chdir(api_dir)
-
-    try:
-        # 启动API服务器
-        cmd = [sys.executable, "search_api.py"]
-        print(f"执行命令: {' '.join(cmd)}")
-        print("⏳ 服务器正在启动...")
-
-        # 在新进程中启动
-        process = subprocess.Popen(cmd)
-
-        # 等待几秒后测试API
-        time.sleep(2)
+    return start_services([create_api_service()])
 
-        # 测试API是否正常运行
-        import requests
-        try:
-            response = requests.get("http://localhost:5000/api/health", timeout=5)
-            if response.status_code == 200:
-                print("✅ API服务器已启动")
-                print("🌐 API地址: http://localhost:5000")
-                print("📖 API文档: http://localhost:5000/api/health")
-                print("💡 按 Ctrl+C 停止服务器")
-            else:
-                print("⚠️ 服务器已启动但健康检查失败")
-        except requests.exceptions.RequestException:
-            print("⚠️ 无法连接到API服务器，但进程可能仍在启动中")
-
-        # 等待进程结束
-        process.wait()
-        return True
-
-    except KeyboardInterrupt:
-        print("\n👋 用户中断，正在停止服务器...")
-        return True
-    except Exception as e:
-        print(f"❌ 启动失败: {e}")
-        return False
+def start_all():
+    """同时启动API服务器和Streamlit应用"""
+    streamlit = create_streamlit_service()
+    return start_services([create_api_service(), streamlit], open_browser=streamlit.url)
 
 def show_menu():
     """显示主菜单"""
@@ -153,8 +272,9 @@ def show_menu():
     print("="*50)
     print("1. 启动Streamlit检索界面")
     print("2. 启动API服务器")
-    print("3. 检查系统环境")
-    print("4. 查看使用说明")
+    print("3. 同时启动API服务器和Streamlit界面")
+    print("4. 检查系统环境")
+    print("5. 查看使用说明")
     print("0. 退出")
     print("="*50)
 
@@ -198,10 +318,15 @@ def show_help():
 启动方式:
 1. Streamlit界面 - 提供图形化搜索界面
 2. API服务器 - 提供RESTful API接口
+3. 同时启动 - 两个服务并行启动
+
+启动器会等待服务的健康检查通过并执行预热请求（scripts/warm_up.py）后再打开浏览器，
+服务意外退出时按 1、2、4...秒（最长30秒）的间隔自动重启。
 
 文件结构:
 src/product_search_enhanced.py  - Streamlit应用主文件
 src/api/search_api.py          - API服务器
+scripts/warm_up.py             - 预热脚本
 docs/product_search_guide.md   - 详细使用说明
 data/inventory.db             - 产品数据库
 
@@ -222,7 +347,7 @@ def main():
         show_menu()
 
         try:
-            choice = input("\n请选择操作 (0-4): ").strip()
+            choice = input("\n请选择操作 (0-5): ").strip()
 
             if choice == "0":
                 print("👋 退出系统，再见！")
@@ -235,13 +360,16 @@ def main():
                 start_api_server()
 
             elif choice == "3":
-                check_environment()
+                start_all()
 
             elif choice == "4":
+                check_environment()
+
+            elif choice == "5":
                 show_help()
 
             else:
-                print("❌ 无效选择，请输入0-4之间的数字")
+                print("❌ 无效选择，请输入0-5之间的数字")
 
         except KeyboardInterrupt:
             print("\n👋 用户中断，退出系统")
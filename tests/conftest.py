@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+"""测试共用设置：src 和 src/api 中的模块以脚本目录为导入路径"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (os.path.join(ROOT, 'src'), os.path.join(ROOT, 'src', 'api')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""列式快照：Parquet 分区、按 generation 判断过期、过期后改为查询数据库"""
+
+import os
+import sqlite3
+
+import pytest
+
+from catalog_snapshot import export_snapshot, load_manifest, read_products, snapshot_is_current
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "inventory.db")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE products (id INTEGER PRIMARY KEY, SKU TEXT, nCategory TEXT, SU TEXT, Stock INTEGER);
+        CREATE TABLE sync_state (id INTEGER PRIMARY KEY, generation INTEGER, change_seq INTEGER);
+        INSERT INTO sync_state VALUES (1, 100, 3);
+        INSERT INTO products VALUES (1, 'A001', 'Flowers', 'AB', 5), (2, 'A002', 'Flowers', 'CD', 0),
+                                    (3, 'B001', 'Trees', 'AB', 2);
+    """)
+    conn.commit()
+    conn.close()
+    return path
+
+
+def execute(db_path, sql):
+    conn = sqlite3.connect(db_path)
+    conn.execute(sql)
+    conn.commit()
+    conn.close()
+
+
+def test_export_writes_parquet_partitions(db_path, tmp_path):
+    snapshot_dir = str(tmp_path / "snapshot")
+    manifest = export_snapshot(db_path, snapshot_dir)
+
+    assert manifest["format"] == "parquet"
+    assert manifest["path"] == "100-3"
+    assert [partition["path"] for partition in manifest["partitions"]] == [
+        "nCategory=Flowers/SU=AB", "nCategory=Flowers/SU=CD", "nCategory=Trees/SU=AB"]
+    assert os.path.exists(os.path.join(snapshot_dir, "100-3", "nCategory=Trees/SU=AB", "data.parquet"))
+
+    df = read_products(["SKU"], {"SU": ["AB"]}, db_path, snapshot_dir)
+    assert sorted(df["SKU"]) == ["A001", "B001"]
+
+
+def test_stock_writes_keep_snapshot_current(db_path, tmp_path):
+    snapshot_dir = str(tmp_path / "snapshot")
+    export_snapshot(db_path, snapshot_dir)
+    # 与库存接口相同：修改 Stock 并分配新的变更序号
+    execute(db_path, "UPDATE products SET Stock = 4 WHERE SKU = 'A001'")
+    execute(db_path, "UPDATE sync_state SET change_seq = change_seq + 1")
+
+    manifest = load_manifest(snapshot_dir)
+    assert snapshot_is_current(manifest, db_path)
+    assert not snapshot_is_current(manifest, db_path, exact=True)
+    # 快照对应导入时的数据
+    df = read_products(["SKU", "Stock"], {"nCategory": ["Flowers"], "SU": ["AB"]}, db_path, snapshot_dir)
+    assert df.to_dict("records") == [{"SKU": "A001", "Stock": 5}]
+
+    # 再次导出时写入包含库存写入的新版本
+    manifest = export_snapshot(db_path, snapshot_dir)
+    assert manifest["path"] == "100-4"
+    assert snapshot_is_current(manifest, db_path, exact=True)
+    df = read_products(["SKU", "Stock"], {"nCategory": ["Flowers"], "SU": ["AB"]}, db_path, snapshot_dir)
+    assert df.to_dict("records") == [{"SKU": "A001", "Stock": 4}]
+
+
+def test_new_import_falls_back_to_database(db_path, tmp_path):
+    snapshot_dir = str(tmp_path / "snapshot")
+    export_snapshot(db_path, snapshot_dir)
+    execute(db_path, "UPDATE products SET nCategory = 'Plants' WHERE SKU = 'B001'")
+    execute(db_path, "UPDATE sync_state SET generation = 101")
+
+    assert not snapshot_is_current(load_manifest(snapshot_dir), db_path)
+    df = read_products(["SKU"], {"nCategory": ["Plants"]}, db_path, snapshot_dir)
+    assert list(df["SKU"]) == ["B001"]
+
+
+def test_unknown_filter_column(db_path, tmp_path):
+    with pytest.raises(ValueError):
+        read_products(["SKU"], {"Stock": ["5"]}, db_path, str(tmp_path / "snapshot"))
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""整数分类键：按名称键筛选与按名称文本筛选的结果完全相同"""
+
+import json
+import sqlite3
+
+import pytest
+
+from category_keys import category_filter, category_name_ids, has_category_keys, list_categories, list_subcategories
+from database_setup import build_database
+
+
+@pytest.fixture(scope="module")
+def conn(tmp_path_factory):
+    path = tmp_path_factory.mktemp("db") / "inventory.db"
+    build_database(str(path))
+    conn = sqlite3.connect(path)
+    yield conn
+    conn.close()
+
+
+def count(conn, category, subcategories, keyed):
+    clause, params = category_filter(category, subcategories, keyed)
+    return conn.execute(f"SELECT COUNT(*) FROM products WHERE 1=1{clause}", params).fetchone()[0]
+
+
+def test_category_name_ids():
+    name_ids, names = category_name_ids(['B', 'A', 'B', None], ['x', 'y', 'x', 'z'])
+    assert names == [(1, '', 'z'), (2, 'A', 'y'), (3, 'B', 'x')]
+    assert name_ids == [3, 2, 3, 1]
+
+
+def test_text_filter_without_keys():
+    clause, params = category_filter('Flowers', ['Rose', 'Lily'], keyed=False)
+    assert clause == " AND nCategory = ? AND nSubCategory IN (SELECT value FROM json_each(?))"
+    assert params == ['Flowers', json.dumps(['Rose', 'Lily'])]
+    assert category_filter(None, None) == ("", [])
+
+
+def test_every_category_pair_matches_text_filter(conn):
+    assert has_category_keys(conn)
+    pairs = conn.execute("SELECT DISTINCT nCategory, nSubCategory FROM products").fetchall()
+    assert pairs
+    for category, subcategory in pairs:
+        expected = conn.execute("SELECT COUNT(*) FROM products WHERE nCategory = ? AND nSubCategory = ?",
+                                (category, subcategory)).fetchone()[0]
+        assert count(conn, category, [subcategory], keyed=True) == expected, (category, subcategory)
+
+
+def test_categories_and_subcategory_lists_match_text_filter(conn):
+    for category in list_categories(conn):
+        subcategories = list_subcategories(conn, category)
+        assert count(conn, category, None, True) == count(conn, category, None, False) > 0
+        assert count(conn, category, subcategories[:3], True) == count(conn, category, subcategories[:3], False)
+    # 不存在的名称不匹配任何记录
+    assert count(conn, 'No Such Category', None, True) == 0
+
+
+def test_lists_match_product_names(conn):
+    expected = [row[0] for row in conn.execute(
+        "SELECT DISTINCT nCategory FROM products WHERE nCategory IS NOT NULL AND nCategory != '' ORDER BY nCategory"
+    )]
+    assert list_categories(conn) == expected
+    for category in expected:
+        assert list_subcategories(conn, category) == [row[0] for row in conn.execute(
+            """
+            SELECT DISTINCT nSubCategory FROM products
+            WHERE nCategory = ? AND nSubCategory IS NOT NULL AND nSubCategory != ''
+            ORDER BY nSubCategory
+            """, (category,)
+        )]
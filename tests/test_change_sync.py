@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""增量同步：重建时的变更序号分配，以及按同步令牌读取变化和删除"""
+
+import os
+import sqlite3
+
+import pytest
+
+from database_setup import assign_change_sequence, row_hash, swap_database
+from search_api import ChangeTokenExpired, ProductSearchAPI, parse_change_token
+
+SCHEMA = [
+    """
+    CREATE TABLE products (
+        id INTEGER PRIMARY KEY, SKU TEXT, Stock INTEGER, row_hash TEXT,
+        change_seq INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE TABLE sync_state (id INTEGER PRIMARY KEY CHECK (id = 1), generation INTEGER NOT NULL, change_seq INTEGER NOT NULL)",
+    """
+    CREATE TABLE deleted_products (
+        SKU TEXT PRIMARY KEY, change_seq INTEGER NOT NULL, deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+]
+
+
+def build(path, rows):
+    """按 database_setup 的方式构建一个新库（rows 为 [(SKU, Stock), ...]）并分配变更序号"""
+    conn = sqlite3.connect(path)
+    for sql in SCHEMA:
+        conn.execute(sql)
+    conn.executemany("INSERT INTO products (id, SKU, Stock, row_hash) VALUES (?, ?, ?, ?)",
+                     [(pid, sku, stock, row_hash([sku, stock])) for pid, (sku, stock) in enumerate(rows, start=1)])
+    conn.commit()
+    conn.close()
+
+
+def rebuild(tmp_path, live, rows):
+    path = tmp_path / f"build-{len(list(tmp_path.iterdir()))}.db"
+    build(path, rows)
+    assign_change_sequence(str(live) if live else str(tmp_path / 'missing.db'), str(path))
+    return path
+
+
+def sequences(path):
+    conn = sqlite3.connect(path)
+    try:
+        products = dict(conn.execute("SELECT SKU, change_seq FROM products"))
+        deleted = dict(conn.execute("SELECT SKU, change_seq FROM deleted_products"))
+        state = conn.execute("SELECT generation, change_seq FROM sync_state").fetchone()
+        return products, deleted, state
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def generations(tmp_path):
+    first = rebuild(tmp_path, None, [('A1', 5), ('A2', 3), ('A3', 1)])
+    second = rebuild(tmp_path, first, [('A1', 5), ('A2', 2), ('A4', 7)])
+    return first, second
+
+
+def test_parse_change_token():
+    assert parse_change_token('') == (None, 0)
+    assert parse_change_token('17.42') == (17, 42)
+    with pytest.raises(ValueError):
+        parse_change_token('42')
+
+
+def test_rebuild_keeps_unchanged_sequences(generations):
+    first, second = generations
+    products, deleted, (generation, seq) = sequences(first)
+    assert products == {'A1': 1, 'A2': 2, 'A3': 3} and deleted == {} and seq == 3
+
+    products, deleted, state = sequences(second)
+    # A1 未变化沿用原序号；A2 变化、A4 新增按 id 顺序分配新序号；A3 记为删除
+    assert products == {'A1': 1, 'A2': 4, 'A4': 5}
+    assert deleted == {'A3': 6}
+    assert state == (generation, 6)
+
+
+def test_reappearing_sku_leaves_deleted(tmp_path, generations):
+    _, second = generations
+    third = rebuild(tmp_path, second, [('A1', 5), ('A2', 2), ('A3', 1), ('A4', 7)])
+    products, deleted, (_, seq) = sequences(third)
+    assert products['A3'] == 7 and deleted == {} and seq == 7
+
+
+def test_changes_since_token(generations):
+    first, second = generations
+    generation = sequences(first)[2][0]
+    api = ProductSearchAPI(second)
+
+    result = api.get_changes(generation, 3, 100, ['SKU', 'Stock'])
+    assert [row['SKU'] for row in result['changes']] == ['A2', 'A4']
+    assert [row['SKU'] for row in result['deleted']] == ['A3']
+    assert result['last_seq'] == 6 and not result['has_more']
+
+    # 分页：changes 与 deleted 合并后按序号截取，下一页从截断处继续
+    page = api.get_changes(generation, 3, 2, ['SKU'])
+    assert [row['SKU'] for row in page['changes']] == ['A2', 'A4'] and page['deleted'] == []
+    assert page['last_seq'] == 5 and page['has_more']
+    page = api.get_changes(generation, page['last_seq'], 2, ['SKU'])
+    assert page['changes'] == [] and [row['SKU'] for row in page['deleted']] == ['A3']
+    assert not page['has_more']
+
+    assert api.get_changes(generation, 6, 100, ['SKU'])['changes'] == []
+
+
+def test_stale_token_expires(generations):
+    _, second = generations
+    generation = sequences(second)[2][0]
+    api = ProductSearchAPI(second)
+    with pytest.raises(ChangeTokenExpired):
+        api.get_changes(generation + 1, 0, 10, ['SKU'])
+    with pytest.raises(ChangeTokenExpired):
+        api.get_changes(generation, 99, 10, ['SKU'])
+
+
+def test_stock_write_during_rebuild_gets_new_sequence(tmp_path, generations):
+    _, second = generations
+    live = tmp_path / "inventory.db"
+    second.rename(live)
+    generation = sequences(live)[2][0]
+
+    path = tmp_path / "next.db"
+    build(path, [('A1', 5), ('A2', 2), ('A4', 7)])
+    live_state = assign_change_sequence(str(live), str(path))
+    assert live_state == (generation, 6)
+
+    # 分配变更序号之后、替换之前，库存接口（WAL模式）提交了一次写入
+    conn = sqlite3.connect(live, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("UPDATE sync_state SET change_seq = change_seq + 1 WHERE id = 1")
+    conn.execute("UPDATE products SET Stock = 4, row_hash = NULL, change_seq = 7 WHERE SKU = 'A1'")
+    conn.close()
+
+    swap_database(str(path), str(live), live_state)
+
+    products, deleted, state = sequences(live)
+    # 被覆盖的写入分配了大于 7 的新序号，持有令牌 7 的客户端能收到 A1 恢复为导入值
+    assert products == {'A1': 8, 'A2': 4, 'A4': 5}
+    assert deleted == {'A3': 6}
+    assert state == (generation, 8)
+    changes = ProductSearchAPI(live).get_changes(generation, 7, 10, ['SKU', 'Stock'])['changes']
+    assert [(row['SKU'], row['Stock']) for row in changes] == [('A1', 5)]
+    assert not os.path.exists(f"{live}-wal") or os.path.getsize(f"{live}-wal") == 0
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""CSV列式缓存：按行组读取列和行区间，源文件变化后重建"""
+
+import json
+import os
+
+import csv_cache
+from csv_cache import CsvCache
+
+
+def write_csv(path, rows):
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write("SKU,Price,Note\n")
+        for index in range(rows):
+            file.write(f"A{index:04d},{index}.5,{'' if index % 3 else 'x'}\n")
+
+
+def test_read_window_across_row_groups(tmp_path, monkeypatch):
+    monkeypatch.setattr(csv_cache, "BLOCK_ROWS", 4)
+    source = tmp_path / "LT.csv"
+    write_csv(source, 10)
+    cache = CsvCache(str(source), str(tmp_path / "cache"))
+
+    assert cache.rows == 10
+    assert cache.columns == ["SKU", "Price", "Note"]
+    df = cache.read(["SKU"], 3, 9)
+    assert list(df.index) == list(range(3, 9))
+    assert list(df["SKU"]) == [f"A{index:04d}" for index in range(3, 9)]
+    assert len(cache.read(start=8, stop=100)) == 2
+    assert cache.read(["SKU"], 10, 20).empty
+
+    assert cache.column_stats(["Note"]) == [{"column": "Note", "dtype": cache.dtypes["Note"],
+                                             "non_null": 4, "null": 6}]
+
+
+def test_rebuild_when_source_changes(tmp_path):
+    source, cache_dir = tmp_path / "LT.csv", tmp_path / "cache"
+    write_csv(source, 3)
+    first = CsvCache(str(source), str(cache_dir))
+    write_csv(source, 5)
+    os.utime(source, ns=(1, 1))
+    second = CsvCache(str(source), str(cache_dir))
+
+    assert second.rows == 5
+    assert os.listdir(cache_dir) == [os.path.basename(second.path)]
+    assert not os.path.exists(first.path)
+
+
+def test_old_format_cache_is_rebuilt(tmp_path):
+    source, cache_dir = tmp_path / "LT.csv", tmp_path / "cache"
+    write_csv(source, 3)
+    cache = CsvCache(str(source), str(cache_dir))
+    with open(os.path.join(cache.path, csv_cache.META_FILE), 'w', encoding='utf-8') as file:
+        json.dump(dict(cache.meta, format="pickle"), file)
+
+    cache = CsvCache(str(source), str(cache_dir))
+    assert cache.meta["format"] == "parquet"
+    assert list(cache.read(["SKU"])["SKU"]) == ["A0000", "A0001", "A0002"]
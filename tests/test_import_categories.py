@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""分类表差异导入：文本分类码统一为整数，products.cat_code 在同一事务中重新关联"""
+
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+from import_categories import diff_categories, import_categories  # noqa: E402
+
+CSV = """CatCode,nCategory,nSubCategory
+008,Peripheral,Vase
+101,Artificial Flower Arrangements,Banksia Series
+102,Artificial Flower Arrangements,Cymbidium Series
+"""
+
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    """旧版本的数据库：分类码为 TEXT(3)，其中有重复和已移除的分类码"""
+    path = tmp_path / 'inventory.db'
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE product_categories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cat_code TEXT(3) NOT NULL,
+            ncategory TEXT NOT NULL,
+            nsubcategory TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.executemany(
+        "INSERT INTO product_categories (cat_code, ncategory, nsubcategory, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+        [('008', 'Peripheral', 'Vase', '2020-01-01', '2020-01-01'),
+         ('101', 'Artificial Flower Arrangements', 'Banksia', '2020-01-01', '2020-01-01'),
+         ('8', 'Peripheral', 'Vase', '2021-01-01', '2021-01-01'),
+         ('900', 'Artificial Trees', 'Other Trees', '2020-01-01', '2020-01-01')]
+    )
+    conn.execute("CREATE TABLE products (id INTEGER PRIMARY KEY, SKU TEXT, CatCode TEXT, cat_code INTEGER)")
+    conn.executemany("INSERT INTO products (SKU, CatCode, cat_code) VALUES (?, ?, ?)", [
+        ('A00800001', '8', None),      # 旧库中文本分类码与整数列不匹配
+        ('A10100001', '101', 101),
+        ('A10200001', '102', None),    # 新增的分类码
+        ('A90000001', '900', 900),     # 被移除的分类码
+        ('A10200002', '', None),       # CatCode 为空，取SKU中的分类码
+    ])
+    conn.commit()
+    conn.close()
+    csv_path = tmp_path / 'CSNEW.csv'
+    csv_path.write_text(CSV, encoding='utf-8')
+    return path, csv_path
+
+
+def test_diff_categories():
+    existing = {8: ('Peripheral', 'Vase'), 101: ('A', 'Old'), 900: ('T', 'Other')}
+    incoming = {8: ('Peripheral', 'Vase'), 101: ('A', 'New'), 102: ('A', 'Added')}
+    assert diff_categories(existing, incoming) == ([(102, 'A', 'Added')], [('A', 'New', 101)], [(900,)])
+
+
+def test_legacy_codes_normalized_and_products_relinked(legacy_db):
+    path, csv_path = legacy_db
+    assert import_categories(str(path), str(csv_path))
+
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute(
+            "SELECT cat_code, typeof(cat_code), nsubcategory, created_at FROM product_categories ORDER BY cat_code"
+        ).fetchall()
+        assert rows[0] == (8, 'integer', 'Vase', '2020-01-01')  # 保留原记录的 created_at
+        assert [row[:3] for row in rows] == [
+            (8, 'integer', 'Vase'), (101, 'integer', 'Banksia Series'), (102, 'integer', 'Cymbidium Series')
+        ]
+        declared = {row[1]: row[2] for row in conn.execute("PRAGMA table_info(product_categories)")}
+        assert declared['cat_code'] == 'INTEGER'
+        assert dict(conn.execute("SELECT SKU, cat_code FROM products")) == {
+            'A00800001': 8, 'A10100001': 101, 'A10200001': 102, 'A90000001': None, 'A10200002': 102,
+        }
+    finally:
+        conn.close()
+
+    # 再次导入没有任何变化
+    assert import_categories(str(path), str(csv_path))
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""检索接口的请求参数校验和就绪检查"""
+
+import os
+import sqlite3
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import search_api
+from search_api import ProductSearchAPI, normalize_timeout
+
+
+@pytest.fixture
+def client():
+    return search_api.app.test_client()
+
+
+def test_normalize_timeout():
+    assert normalize_timeout(None) is None
+    assert normalize_timeout(0) is None
+    assert normalize_timeout(-1) is None
+    assert normalize_timeout(2) == 2.0
+    assert normalize_timeout(0.5) == 0.5
+    for value in ("1", "abc", True, [1], {"s": 1}, float("inf"), float("nan")):
+        with pytest.raises(ValueError):
+            normalize_timeout(value)
+
+
+@pytest.mark.parametrize("timeout", ["abc", "1", True, [1]])
+def test_search_rejects_invalid_timeout(client, timeout):
+    response = client.post('/api/products/search', json={"q": "rose", "timeout": timeout})
+    assert response.status_code == 400
+    assert "timeout" in response.get_json()["error"]
+
+
+def test_batch_rejects_invalid_timeout(client):
+    response = client.post('/api/products/search/batch', json={"queries": [{"q": "rose"}], "timeout": "abc"})
+    assert response.status_code == 400
+
+
+def create_db(path, generation=100):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE sync_state (id INTEGER PRIMARY KEY, generation INTEGER, change_seq INTEGER)")
+    conn.execute("INSERT INTO sync_state VALUES (1, ?, 5)", (generation,))
+    conn.commit()
+    conn.close()
+
+
+def test_ready_stays_up_after_stock_writes(tmp_path, monkeypatch, client):
+    path = tmp_path / "inventory.db"
+    create_db(path)
+    api = ProductSearchAPI(path)
+    monkeypatch.setattr(search_api, "search_api", api)
+    assert client.get('/api/ready').status_code == 503
+
+    conn = sqlite3.connect(path)
+    api.snapshot = SimpleNamespace(stamp=api.data_stamp(conn), df=[], loaded_at=time.time())
+    conn.close()
+    response = client.get('/api/ready')
+    assert response.status_code == 200 and response.get_json()["status"] == "warm"
+
+    # 库存写入只推进变更序号：快照过期但仍可服务
+    conn = sqlite3.connect(path)
+    conn.execute("UPDATE sync_state SET change_seq = change_seq + 1")
+    conn.commit()
+    conn.close()
+    response = client.get('/api/ready')
+    assert response.status_code == 200 and response.get_json()["status"] == "stale"
+
+    # 数据库被重建（文件替换）
+    rebuilt = tmp_path / "rebuilt.db"
+    create_db(rebuilt, generation=101)
+    os.replace(rebuilt, path)
+    response = client.get('/api/ready')
+    assert response.status_code == 503 and response.get_json()["status"] == "cold"
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""ASGI 入口：WebSocket 被拒绝，lifespan 关闭时结束推送连接，不支持的连接类型不会使应用崩溃"""
+
+import asyncio
+
+import search_asgi
+
+
+def run(scope, messages):
+    """以给定的接收消息调用 ASGI 应用，返回发送的消息"""
+    incoming, sent = list(messages), []
+
+    async def receive():
+        return incoming.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(search_asgi.app(scope, receive, send))
+    return sent
+
+
+def test_websocket_is_closed_at_handshake():
+    sent = run({"type": "websocket", "path": "/api/stream/changes"}, [{"type": "websocket.connect"}])
+    assert sent == [{"type": "websocket.close", "code": 1008}]
+
+
+def test_unknown_scope_is_ignored():
+    assert run({"type": "custom"}, []) == []
+
+
+def test_lifespan_shutdown_closes_streams(monkeypatch):
+    closed = []
+    monkeypatch.setattr(search_asgi.change_bus, "close_all", lambda: closed.append(True))
+    monkeypatch.setattr(search_asgi.executor, "shutdown", lambda wait: None)
+    sent = run({"type": "lifespan"}, [{"type": "lifespan.shutdown"}])
+    assert sent == [{"type": "lifespan.shutdown.complete"}] and closed == [True]
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""库存写入：StockStatus 随库存跨过 0 切换，catalog_stats 与重新扫描的结果一致"""
+
+import sqlite3
+import threading
+from multiprocessing.connection import Listener
+
+import pytest
+
+from catalog_stats import GROUP_STATS_SQL, STATS_COLUMNS, build_catalog_stats, read_group_stats
+from stock_writer import RemoteStockWriter, StockAdjustmentError, StockWriter, serve_writer_requests, stock_status_after
+
+PRODUCTS = [
+    # SKU, Stock, Sold, StockStatus, nCategory, Price
+    ('A00100001', 1, 0, 'instock', 'Flowers', 5.0),
+    ('A00100002', 4, 0, 'instock', 'Flowers', 7.0),
+    ('A00100003', 0, 3, 'outofstock', 'Flowers', 9.0),
+    ('A00100004', 0, 0, 'onbackorder', 'Trees', 90.0),
+    ('A00100005', 2, 0, '', 'Trees', 50.0),
+]
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / 'inventory.db'
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE products (
+            id INTEGER PRIMARY KEY, SKU TEXT, Stock INTEGER, Sold INTEGER, StockStatus TEXT,
+            nCategory TEXT, Price REAL, row_hash TEXT, change_seq INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP
+        )
+    """)
+    conn.executemany("INSERT INTO products (SKU, Stock, Sold, StockStatus, nCategory, Price) VALUES (?, ?, ?, ?, ?, ?)",
+                     PRODUCTS)
+    conn.execute("CREATE TABLE sync_state (id INTEGER PRIMARY KEY, generation INTEGER, change_seq INTEGER)")
+    conn.execute("INSERT INTO sync_state VALUES (1, 1, 0)")
+    build_catalog_stats(conn)
+    conn.commit()
+    conn.close()
+    return path
+
+
+def adjust(path, items, allow_negative=False):
+    return StockWriter(path).submit(items, allow_negative).result(timeout=10)
+
+
+def scanned_groups(path):
+    conn = sqlite3.connect(path)
+    try:
+        key = lambda group: (group['StockStatus'], group['nCategory'])
+        stored = sorted(read_group_stats(conn), key=key)
+        scanned = sorted((dict(zip(STATS_COLUMNS, row)) for row in conn.execute(GROUP_STATS_SQL)), key=key)
+        return stored, scanned
+    finally:
+        conn.close()
+
+
+def product(path, sku):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT Stock, Sold, StockStatus, change_seq FROM products WHERE SKU = ?", (sku,)).fetchone()
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("status, old, new, expected", [
+    ('instock', 1, 0, 'outofstock'),
+    ('instock', 3, 1, 'instock'),
+    ('outofstock', 0, 2, 'instock'),
+    ('outofstock', 0, -1, 'outofstock'),
+    ('onbackorder', 0, -2, 'onbackorder'),
+    ('', 1, 0, ''),
+])
+def test_stock_status_after(status, old, new, expected):
+    assert stock_status_after(status, old, new) == expected
+
+
+def test_selling_last_unit_marks_out_of_stock(db_path):
+    result = adjust(db_path, [{"sku": 'A00100001', "qty": 1}])
+    assert result == [{"sku": 'A00100001', "stock": 0, "sold": 1, "stock_status": 'outofstock'}]
+    assert product(db_path, 'A00100001')[:3] == (0, 1, 'outofstock')
+    stored, scanned = scanned_groups(db_path)
+    assert stored == scanned
+
+
+def test_return_marks_in_stock(db_path):
+    adjust(db_path, [{"sku": 'A00100003', "qty": -2}])
+    assert product(db_path, 'A00100003')[:3] == (2, 1, 'instock')
+    stored, scanned = scanned_groups(db_path)
+    assert stored == scanned
+    # outofstock/Flowers 分组已没有记录
+    assert ('outofstock', 'Flowers') not in {(group['StockStatus'], group['nCategory']) for group in stored}
+
+
+def test_partial_sale_keeps_group_totals(db_path):
+    adjust(db_path, [{"sku": 'A00100002', "qty": 3}, {"sku": 'A00100005', "qty": 1}])
+    assert product(db_path, 'A00100002')[:3] == (1, 3, 'instock')
+    stored, scanned = scanned_groups(db_path)
+    assert stored == scanned
+
+
+def test_backorder_keeps_status(db_path):
+    adjust(db_path, [{"sku": 'A00100004', "qty": 2}], allow_negative=True)
+    assert product(db_path, 'A00100004')[:3] == (-2, 2, 'onbackorder')
+    stored, scanned = scanned_groups(db_path)
+    assert stored == scanned
+
+
+def test_failed_request_changes_nothing(db_path):
+    with pytest.raises(StockAdjustmentError) as error:
+        adjust(db_path, [{"sku": 'A00100002', "qty": 1}, {"sku": 'A00100001', "qty": 2}])
+    assert error.value.status == 409
+    assert product(db_path, 'A00100002') == (4, 0, 'instock', 0)
+    with pytest.raises(StockAdjustmentError) as error:
+        adjust(db_path, [{"sku": 'missing', "qty": 1}])
+    assert error.value.status == 404
+    stored, scanned = scanned_groups(db_path)
+    assert stored == scanned
+
+
+def test_each_change_gets_new_sequence(db_path):
+    adjust(db_path, [{"sku": 'A00100001', "qty": 1}])
+    adjust(db_path, [{"sku": 'A00100002', "qty": 1}])
+    assert product(db_path, 'A00100001')[3] == 1
+    assert product(db_path, 'A00100002')[3] == 2
+
+
+@pytest.fixture
+def remote(db_path, tmp_path):
+    """与多进程部署相同：写进程监听本地套接字，工作进程通过 RemoteStockWriter 转发"""
+    authkey = b'test-key'
+    listener = Listener(str(tmp_path / 'writer.sock'), family='AF_UNIX', backlog=16, authkey=authkey)
+    writer = StockWriter(db_path)
+    threading.Thread(target=serve_writer_requests, args=(listener, writer), daemon=True).start()
+    yield RemoteStockWriter(listener.address, authkey), writer
+    listener.close()
+
+
+def test_remote_writer_forwards_to_single_writer(db_path, remote):
+    client, writer = remote
+    notified = []
+    client.listeners.append(lambda: notified.append(True))
+
+    futures = [client.submit([{'sku': 'A00100002', 'qty': 1}]) for _ in range(3)]
+    results = [future.result(timeout=10) for future in futures]
+    assert sorted(result[0]['stock'] for result in results) == [1, 2, 3]
+    assert product(db_path, 'A00100002')[:3] == (1, 3, 'instock')
+    assert len(notified) == 3
+    assert writer._thread is not None and writer.wait_idle(5)
+
+
+def test_remote_writer_returns_errors_with_status(remote):
+    client, _ = remote
+    with pytest.raises(StockAdjustmentError) as error:
+        client.submit([{'sku': 'NOPE', 'qty': 1}]).result(timeout=10)
+    assert error.value.status == 404
+    with pytest.raises(StockAdjustmentError) as error:
+        client.submit([{'sku': 'A00100001', 'qty': 5}]).result(timeout=10)
+    assert error.value.status == 409
+
+
+def test_remote_writer_unavailable(tmp_path):
+    client = RemoteStockWriter(str(tmp_path / 'missing.sock'), b'test-key')
+    with pytest.raises(StockAdjustmentError) as error:
+        client.submit([{'sku': 'A00100001', 'qty': 1}]).result(timeout=10)
+    assert error.value.status == 503